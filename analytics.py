@@ -0,0 +1,153 @@
+import warnings
+import numpy as np
+import pandas as pd
+from config import FORM_WINDOW_DAYS, FORECAST_HALFLIFE_STAGES
+
+def _to_list(values, decimals=4):
+    """JSON-friendly list: NaN becomes None and floats are rounded."""
+    values = np.round(np.asarray(values, dtype=float), decimals)
+    # tolist() on an object array: iterating numpy scalars is several times slower
+    result = values.astype(object)
+    result[np.isnan(values)] = None
+    return result.tolist()
+
+class RiderTable:
+    """Columnar view of the cyclists: per-rider attribute arrays plus a riders x dates points matrix.
+
+    Built once per run; the metric helpers below are vectorised over all riders.
+    history is an optional (dates, matrix) pair aligned with cyclists, e.g. from
+    HistoryStore.rider_matrix, used instead of pivoting the pointHistory lists.
+    """
+
+    def __init__(self, cyclists, history=None):
+        self.names = [c['name'] for c in cyclists]
+        self.roles = np.array([c['role'] for c in cyclists], dtype=object)
+        self.cost = np.array([c['cost'] for c in cyclists], dtype=float)
+        self.points = np.array([c['points'] for c in cyclists], dtype=float)
+        self.ownership = np.array([c.get('ownership', 0.0) for c in cyclists], dtype=float)
+
+        if history is not None:
+            dates, observed = history
+            self.dates = list(dates)
+            self.observed = np.asarray(observed, dtype=float)
+            self.history = pd.DataFrame(self.observed).ffill(axis=1).to_numpy(dtype=float)
+            return
+
+        records = pd.DataFrame(
+            [(i, entry['date'], entry['points']) for i, c in enumerate(cyclists) for entry in c.get('pointHistory', [])],
+            columns=['rider', 'date', 'points'])
+        if records.empty:
+            matrix = pd.DataFrame(index=range(len(cyclists)), dtype=float)
+        else:
+            matrix = records.pivot_table(index='rider', columns='date', values='points', aggfunc='last')
+            matrix = matrix.reindex(index=range(len(cyclists)))
+        self.dates = [str(d) for d in matrix.columns]
+        # observed keeps the gaps (NaN) for riders missing a day; history carries the last value forward
+        self.observed = matrix.to_numpy(dtype=float)
+        self.history = matrix.ffill(axis=1).to_numpy(dtype=float)
+
+    def _last_column(self, values):
+        return values[:, -1] if values.shape[1] else np.full(values.shape[0], np.nan)
+
+    def daily_deltas(self):
+        deltas = np.full_like(self.history, np.nan)
+        deltas[:, 1:] = np.diff(self.history, axis=1)
+        return deltas
+
+    def pct_gains(self):
+        previous = np.full_like(self.history, np.nan)
+        previous[:, 1:] = self.history[:, :-1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(previous > 0, self.daily_deltas() / previous * 100, np.nan)
+
+    def form(self, window=FORM_WINDOW_DAYS):
+        """Mean daily delta over the last `window` days."""
+        recent = self.daily_deltas()[:, -window:]
+        counts = (~np.isnan(recent)).sum(axis=1)
+        totals = np.nansum(recent, axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(counts > 0, totals / counts, np.nan)
+
+    def scoring_days(self):
+        """Mask of the dates on which the field gained points, i.e. stages; rest days score nothing."""
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return np.nansum(np.clip(self.daily_deltas(), 0, None), axis=0) > 0
+
+    def forecast(self, horizon, halflife=FORECAST_HALFLIFE_STAGES, stages_done=None, withdrawn=None):
+        """Expected points per rider over the next `horizon` stages.
+
+        The per-stage rate is an exponentially weighted mean of the rider's gains on
+        scoring days, halving in weight every `halflife` stages back. Riders with no
+        scored stage in the history fall back to points / stages_done. withdrawn is
+        a boolean mask of riders that will not score again.
+        """
+        deltas = self.daily_deltas()[:, self.scoring_days()]
+        weights = 0.5 ** (np.arange(deltas.shape[1])[::-1] / halflife)
+        seen = ~np.isnan(deltas)
+        weight_sums = (seen * weights).sum(axis=1)
+        weighted = np.where(seen, deltas, 0.0) @ weights
+        season_rate = self.points / max(stages_done or deltas.shape[1], 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rates = np.where(weight_sums > 0, weighted / weight_sums, season_rate)
+        # Velogames totals never go down, so corrections can't project negative points
+        projected = np.clip(rates, 0, None) * horizon
+        if withdrawn is not None:
+            projected[np.asarray(withdrawn, dtype=bool)] = 0.0
+        return projected
+
+    def cost_per_point(self):
+        with np.errstate(divide='ignore'):
+            return np.where(self.points > 0, self.cost / np.where(self.points > 0, self.points, 1), np.inf)
+
+    def efficiency_ranks(self):
+        """1 for the best cost per point; riders without points are unranked."""
+        cpp = pd.Series(self.cost_per_point())
+        return cpp.where(self.points > 0).rank(method='min').to_numpy()
+
+    def last_two_points(self):
+        """Latest and previous recorded points per rider (NaN where a rider has fewer entries)."""
+        observed = np.column_stack([np.full(len(self.names), np.nan), self.observed])
+        mask = ~np.isnan(observed)
+        columns = np.arange(observed.shape[1])
+        # Column 0 is an all-NaN sentinel, so riders without entries index into it
+        last = np.where(mask, columns, 0).max(axis=1)
+        previous = np.where(mask & (columns < last[:, None]), columns, 0).max(axis=1)
+        rows = np.arange(len(self.names))
+        return observed[rows, last], observed[rows, previous]
+
+    def role_aggregates(self):
+        aggregates = {}
+        for role in sorted(set(self.roles)):
+            in_role = self.roles == role
+            aggregates[role] = {
+                'riders': int(in_role.sum()),
+                'total_points': float(self.points[in_role].sum()),
+                'mean_points': float(self.points[in_role].mean()),
+                'mean_cost': float(self.cost[in_role].mean()),
+                'daily_totals': _to_list(np.nansum(self.history[in_role], axis=0)),
+            }
+        return aggregates
+
+    def metrics(self):
+        """Precomputed per-rider metrics for the front end, stored column-wise aligned with `riders`.
+
+        The riders x dates delta matrix is left out: script.js never reads it,
+        and chart_data carries the per-roster series it plots.
+        """
+        deltas = self.daily_deltas()
+        with np.errstate(invalid='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)  # riders without any history
+            history_mean = np.nanmean(self.observed, axis=1)
+            history_std = np.nanstd(self.observed, axis=1)
+        return {
+            'dates': self.dates,
+            'riders': self.names,
+            'last_delta': _to_list(self._last_column(deltas)),
+            'last_pct_gain': _to_list(self._last_column(self.pct_gains())),
+            'form': _to_list(self.form()),
+            'efficiency_rank': _to_list(self.efficiency_ranks(), 0),
+            'history_mean': _to_list(history_mean),
+            'history_std': _to_list(history_std),
+            'roles': self.role_aggregates(),
+        }
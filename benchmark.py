@@ -0,0 +1,502 @@
+"""Offline benchmarks for the cyclist analyzer pipeline.
+
+Everything runs against recorded pages in fixtures/ (served by fixture_server.py)
+or synthetic data, never the live sites.
+
+Usage:
+    python benchmark.py [name ...]          run benchmarks (all when no name is given)
+    python benchmark.py --save-baseline     also store the timings in benchmark-baseline.json
+    python benchmark.py --check             exit 1 if any timing regressed past --tolerance
+                                            or an entry point broke its startup budget
+
+Baseline timings are machine specific; re-save them when switching machines.
+"""
+import io
+import os
+import sys
+import copy
+import json
+import time
+import random
+import shutil
+import argparse
+import itertools
+import subprocess
+import tempfile
+import contextlib
+from datetime import datetime, timedelta
+
+import cyclist_analyzer as ca
+import html_parsing
+import http_client
+import output_writer
+import scraping
+from analytics import RiderTable
+from chart_data import build_chart_data
+from fixture_server import FixtureSite, serve_fixtures, fixture_race, read_fixture, scale_riders_page
+from history_store import HistoryStore
+from league_simulation import simulate_league
+from ownership_analysis import analyze_ownership
+from races import resolve_race
+from replay import replay
+from roster_store import RosterStore
+from score_index import ScoreIndex
+from split_output import write_split_output
+from team_optimizer import TeamOptimizer, ROLE_MINIMUMS, role_group
+from transfers import recommend_transfers
+from config import HISTORY_RETENTION_DAYS, MAX_COST, TOTAL_CYCLISTS
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(ROOT, 'benchmark-baseline.json')
+
+# Entry points whose import must stay cheap: polling runs and race workers pay it every time
+STARTUP_MODULES = ('cyclist_analyzer', 'daemon')
+STARTUP_BUDGET_MS = 250  # cumulative import time per entry point, from python -X importtime
+STARTUP_DEFERRED = ('numpy', 'pandas', 'plotly', 'bs4', 'lxml', 'pulp')  # loaded only by the stages that use them
+
+ROLES = ['All Rounder', 'Climber', 'Sprinter', 'Unclassed']
+
+results = {}
+baseline = {}
+budget_failures = []
+
+def history_dates(days):
+    """`days` consecutive dates ending yesterday."""
+    start = datetime.now() - timedelta(days=days)
+    return [(start + timedelta(days=d)).strftime('%Y-%m-%d') for d in range(days)]
+
+def add_point_history(cyclists, days, seed=0):
+    """Give each cyclist `days` of ascending point history ending yesterday at its current points."""
+    rng = random.Random(seed)
+    dates = history_dates(days)
+    for c in cyclists:
+        gains = [rng.choice([0, 0, 1, 2, 5, 12]) for _ in dates]
+        total = sum(gains) or 1
+        points = 0.0
+        c['pointHistory'] = []
+        for date, gain in zip(dates, gains):
+            points += c['points'] * gain / total
+            c['pointHistory'].append({'date': date, 'points': round(points)})
+    return cyclists
+
+def synthetic_cyclists(n, days=HISTORY_RETENTION_DAYS, seed=0):
+    """Build n riders with `days` of ascending point history ending yesterday."""
+    rng = random.Random(seed)
+    dates = history_dates(days)
+    cyclists = []
+    for i in range(n):
+        points = 0.0
+        history = []
+        for date in dates:
+            points += rng.choice([0, 0, 10, 20, 50, 120])
+            history.append({'date': date, 'points': points})
+        cost = float(rng.randint(4, 26))
+        cyclists.append({
+            'name': f"Rider{i} Surname{i % 97}",
+            'team': f"Team {i % 23}",
+            'role': ROLES[i % len(ROLES)],
+            'cost': cost,
+            'ownership': round(rng.random() * 40, 1),
+            'points': points,
+            'cost_per_point': "Infinity" if points == 0 else cost / points,
+            'pointHistory': history
+        })
+    return cyclists
+
+def tied_transfer_market(n=45, teams=8, seed=0):
+    """Small rider market with few distinct (cost, value) pairs, and valid league rosters drawn from it."""
+    rng = random.Random(seed)
+    cyclists = [{'name': f"Rider{i}", 'role': (ROLES + ['Unclassed'])[i % 5], 'cost': rng.choice([4, 12]),
+                 'projected_points': float(rng.choice([0, 10])), 'isWithdrawn': rng.random() < 0.15}
+                for i in range(n)]
+    league = []
+    while len(league) < teams:
+        roster = rng.sample(cyclists, TOTAL_CYCLISTS)
+        if valid_roster(roster):
+            league.append({'name': f"Team {len(league)}", 'points': 0, 'roster': [c['name'] for c in roster]})
+    return cyclists, league
+
+def valid_roster(riders):
+    counts = {}
+    for c in riders:
+        counts[role_group(c['role'])] = counts.get(role_group(c['role']), 0) + 1
+    return (sum(c['cost'] for c in riders) <= MAX_COST
+            and all(counts.get(role, 0) >= minimum for role, minimum in ROLE_MINIMUMS.items()))
+
+def brute_force_gains(cyclists, roster, max_swaps):
+    """{transfers: best gain} over every sale and purchase, None where no swap is valid."""
+    by_name = {c['name']: c for c in cyclists}
+    owned = [by_name[name] for name in roster]
+    withdrawn = sum(c['isWithdrawn'] for c in owned)
+    market = [c for c in cyclists if c['name'] not in roster and not c['isWithdrawn']]
+    gains = {}
+    for k in range(1, max_swaps + 1):
+        best = None
+        for sold in itertools.combinations(owned, k):
+            if sum(c['isWithdrawn'] for c in sold) != min(withdrawn, k):
+                continue
+            kept = [c for c in owned if c not in sold]
+            lost = sum(c['projected_points'] for c in sold)
+            for bought in itertools.combinations(market, k):
+                if valid_roster(kept + list(bought)):
+                    gain = sum(c['projected_points'] for c in bought) - lost
+                    best = gain if best is None else max(best, gain)
+        gains[k] = best
+    return gains
+
+def league_index(pages):
+    """ScoreIndex built page by page, as fetch_twitter_league_data does for a paginated league."""
+    index = ScoreIndex()
+    for i, scores in enumerate(pages):
+        index.update_page(i, scores)
+    return index
+
+def record(label, best):
+    """Store a timing in seconds and print it with its ratio to the baseline."""
+    results[label] = best
+    line = f"{label:<60} {best * 1000:10.2f} ms"
+    if label in baseline:
+        line += f"  ({best / baseline[label]:.2f}x baseline)" if baseline[label] else ""
+    print(line)
+    return best
+
+def timed(label, func, setup=None, repeat=3):
+    """Report the best of `repeat` runs; setup() output is passed to func and not timed."""
+    best = float('inf')
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        # The pipeline functions log progress to stderr; keep the benchmark output readable
+        with contextlib.redirect_stderr(io.StringIO()):
+            start = time.perf_counter()
+            func(*args)
+            best = min(best, time.perf_counter() - start)
+    return record(label, best)
+
+def import_time(module):
+    """(cumulative seconds, top-level packages loaded) for importing `module` in a fresh interpreter."""
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                             cwd=ROOT, capture_output=True, text=True, check=True)
+    cumulative = {}
+    for line in process.stderr.splitlines():
+        fields = line.partition('import time:')[2].split('|')
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            cumulative[fields[2].strip()] = int(fields[1]) / 1e6
+    return cumulative[module], {name.split('.')[0] for name in cumulative}
+
+def bench_startup():
+    """Import time of the entry points (python -X importtime, best of 5) against STARTUP_BUDGET_MS."""
+    for module in STARTUP_MODULES:
+        measurements = [import_time(module) for _ in range(5)]
+        best = record(f"import {module} (startup)", min(seconds for seconds, _ in measurements))
+        deferred = sorted(set(STARTUP_DEFERRED) & measurements[0][1])
+        if best * 1000 > STARTUP_BUDGET_MS:
+            budget_failures.append(f"import {module} took {best * 1000:.1f} ms, budget {STARTUP_BUDGET_MS} ms")
+        if deferred:
+            budget_failures.append(f"import {module} loads {', '.join(deferred)}, which only the pipeline stages should")
+
+def season_snapshots(n, days, teams=50, seed=0):
+    """(date, content) daily output snapshots of a `days`-long season of n riders, as replay() reads them."""
+    cyclists = synthetic_cyclists(n, days, seed)
+    rng = random.Random(seed)
+    rosters = [rng.sample([c['name'] for c in cyclists], 9) for _ in range(teams)]
+    snapshots = []
+    for day, date in enumerate(history_dates(days)):
+        riders = [dict(c, points=c['pointHistory'][day]['points'], pointHistory=c['pointHistory'][:day + 1])
+                  for c in cyclists]
+        points = {c['name']: c['points'] for c in riders}
+        league = [{'name': f"Team {i}", 'points': sum(points[name] for name in roster), 'roster': roster}
+                  for i, roster in enumerate(rosters)]
+        data = {'cyclists': riders, 'league_scores': {'current': league, 'history': []}, 'last_update': date}
+        snapshots.append((date, output_writer.dumps(data)))
+    return snapshots
+
+def bench_history():
+    """update_historical_data on 200 / 2,000 / 20,000 riders (~5% churn), and replaying a 21-day season."""
+    for n in (200, 2000, 20000):
+        existing = {'cyclists': synthetic_cyclists(n), 'league_scores': {'current': [], 'history': []}}
+        new_cyclists = []
+        for c in synthetic_cyclists(n, days=1, seed=1)[n // 20:] + synthetic_cyclists(n // 20, days=1, seed=2):
+            c = dict(c)
+            c.pop('pointHistory')
+            new_cyclists.append(c)
+
+        timed(f"update_historical_data ({n} riders)", lambda data, new: ca.update_historical_data(data, new, []),
+              setup=lambda: (copy.deepcopy(existing), copy.deepcopy(new_cyclists)))
+
+    snapshots = season_snapshots(176, 21)
+    cache_dir = tempfile.mkdtemp(prefix='bench-replay-')
+    try:
+        timed("replay (176 riders, 21 days, cold cache)", lambda: replay(snapshots, processes=1, cache_dir=None),
+              repeat=1)
+        with contextlib.redirect_stderr(io.StringIO()):
+            replay(snapshots, processes=1, cache_dir=cache_dir)
+        timed("replay (176 riders, 21 days, warm cache)", lambda: replay(snapshots, processes=1, cache_dir=cache_dir))
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+def bench_parsers():
+    """analyze_cyclists per HTML backend on the riders fixture (1x and 10x); results must match, also from byte chunks."""
+    backends = ['bs4', 'stream'] + (['lxml'] if html_parsing.lxml_etree() is not None else [])
+    for factor in (1, 10):
+        html_content = scale_riders_page(read_fixture('riders.html'), factor)
+        expected = ca.analyze_cyclists(html_content, 'bs4')
+        for backend in backends:
+            result = ca.analyze_cyclists(html_content, backend)
+            if result != expected:
+                raise AssertionError(f"{backend} backend output differs from bs4 on {factor}x riders page")
+            timed(f"analyze_cyclists {backend} ({len(result)} riders)", lambda: ca.analyze_cyclists(html_content, backend))
+
+    # Byte chunks that split the riders' accented names must decode to the same rows
+    html_content = read_fixture('riders.html')
+    body = html_content.encode('utf-8')
+    chunks = [body[i:i + 7] for i in range(0, len(body), 7)]
+    if list(html_parsing.iter_table_rows(chunks, 'stream')) != list(html_parsing.iter_table_rows(html_content, 'stream')):
+        raise AssertionError("stream backend output differs when fed byte chunks")
+
+def bench_optimizer():
+    """Exact knapsack solver vs CBC on synthetic rider pools, transfers vs brute force; results must agree."""
+    for n in (176, 1760):
+        cyclists = synthetic_cyclists(n, days=1, seed=n)
+        league_riders = {c['name'] for c in cyclists[::3]}
+        totals = {}
+        for solver in ('dp', 'cbc'):
+            optimizer = TeamOptimizer(cyclists, solver)
+            timed(f"{solver} first solve ({n} riders)", lambda: optimizer.solve(), repeat=1)
+            timed(f"{solver} re-solve, league subset ({n} riders)", lambda: optimizer.solve(allowed=league_riders))
+            totals[solver] = (optimizer.solve()[1], optimizer.solve(allowed=league_riders)[1])
+        if totals['dp'] != totals['cbc']:
+            raise AssertionError(f"Solvers disagree on {n} riders: {totals}")
+
+    # Transfers against brute force on a market full of riders tied on cost and value
+    for seed in range(3):
+        cyclists, league = tied_transfer_market(seed=seed)
+        result = recommend_transfers(cyclists, league, max_swaps=2)
+        for team, recommended in zip(league, result['teams']):
+            listed = {option['transfers']: option['gain'] for option in recommended['options']}
+            expected = {k: round(gain, 1) for k, gain in brute_force_gains(cyclists, team['roster'], 2).items()
+                        if gain is not None and (gain > 0 or recommended['withdrawn'])}
+            if listed != expected:
+                raise AssertionError(f"Transfers differ from brute force for {team['name']} (seed {seed}): "
+                                     f"{listed} vs {expected}")
+
+@contextlib.contextmanager
+def fixture_pipeline(rider_factor, team_factor, latency=0.0):
+    """Serve scaled fixtures and yield the resolved race entry, with a throwaway HTTP cache."""
+    server, base_url = serve_fixtures(FixtureSite(rider_factor, team_factor), latency)
+    saved_cache_dir = http_client.HTTP_CACHE_DIR
+    http_client.HTTP_CACHE_DIR = tempfile.mkdtemp(prefix='bench-http-cache-')
+    try:
+        yield resolve_race(fixture_race(base_url))
+    finally:
+        shutil.rmtree(http_client.HTTP_CACHE_DIR, ignore_errors=True)
+        http_client.HTTP_CACHE_DIR = saved_cache_dir
+        http_client.close_session()
+        server.shutdown()
+
+def bench_pipeline():
+    """Every pipeline stage on fixtures scaled to 10x riders, 100x league teams and 100 days of history; concurrent roster fetch vs sequential."""
+    with fixture_pipeline(rider_factor=10, team_factor=100, latency=0.005) as race:
+        clear_cache = lambda: shutil.rmtree(http_client.HTTP_CACHE_DIR, ignore_errors=True) or ()
+        fetch_riders = lambda: ca.fetch_parsed(race['riders_url'], ca.parse_riders_page, 'riders')
+        fetch_league = lambda: ca.fetch_league_scores(race['league_url'])
+
+        timed("fetch riders page (10x, cold cache)", fetch_riders, setup=clear_cache)
+        timed("fetch riders page (10x, warm cache)", fetch_riders)
+        timed("fetch_league_scores (100x teams, cold cache)", fetch_league, setup=clear_cache, repeat=1)
+        timed("fetch_league_scores (100x teams, warm cache)", fetch_league, repeat=1)
+        roster_store = RosterStore()
+        rider_points = {c['name']: c['points'] for c in fetch_riders()}
+        with contextlib.redirect_stderr(io.StringIO()):
+            ca.fetch_league_scores(race['league_url'], roster_store, rider_points)
+        timed("fetch_league_scores (100x teams, roster store)",
+              lambda: ca.fetch_league_scores(race['league_url'], roster_store, rider_points))
+        # Points that still add up must not re-fetch any stored roster
+        log = io.StringIO()
+        with contextlib.redirect_stderr(log):
+            ca.fetch_league_scores(race['league_url'], roster_store, rider_points)
+        if "Fetched 0 of" not in log.getvalue():
+            raise AssertionError(f"Roster store re-fetched unchanged rosters: {log.getvalue().strip()}")
+        timed("fetch_twitter_league_data (cold cache)", lambda: ca.fetch_twitter_league_data(race['twitter_league_url']),
+              setup=clear_cache)
+        timed("fetch_withdrawals (cold cache)", lambda: ca.fetch_withdrawals(race['withdrawals_url']), setup=clear_cache)
+
+        with contextlib.redirect_stderr(io.StringIO()):
+            new_cyclists = fetch_riders()
+            league_scores = fetch_league()
+            withdrawals = ca.fetch_withdrawals(race['withdrawals_url'])
+
+    # Concurrent roster downloads against the sequential path on a slow server; the league must come out the same
+    with fixture_pipeline(rider_factor=1, team_factor=75, latency=0.02) as race:
+        leagues = {}
+        for workers in (1, scraping.FETCH_CONCURRENCY):
+            saved_workers, scraping.FETCH_CONCURRENCY = scraping.FETCH_CONCURRENCY, workers
+            try:
+                timed(f"fetch_league_scores (75x teams, 20 ms latency, {f'{workers} workers' if workers > 1 else 'sequential'})",
+                      lambda: leagues.__setitem__(workers, ca.fetch_league_scores(race['league_url'])),
+                      setup=lambda: shutil.rmtree(http_client.HTTP_CACHE_DIR, ignore_errors=True) or (), repeat=1)
+            finally:
+                scraping.FETCH_CONCURRENCY = saved_workers
+        if len(set(map(json.dumps, leagues.values()))) != 1:
+            raise AssertionError("Concurrent roster fetch differs from the sequential one")
+
+    n = len(new_cyclists)
+    existing = {'cyclists': add_point_history(copy.deepcopy(new_cyclists), 100),
+                'league_scores': {'current': [], 'history': []}, 'mvp_history': [], 'mip_history': []}
+    timed(f"update_historical_data ({n} riders, 100 days)",
+          lambda data, new: ca.update_historical_data(data, new, league_scores),
+          setup=lambda: (copy.deepcopy(existing), copy.deepcopy(new_cyclists)))
+
+    history_store = HistoryStore(tempfile.mkdtemp(prefix='bench-history-'))
+    history_store.import_history(existing['cyclists'], [], ca.normalize_name)
+    timed(f"update_historical_data, history store ({n} riders, 100 days)",
+          lambda data, new: ca.update_historical_data(data, new, league_scores, history_store),
+          setup=lambda: (copy.deepcopy(existing), copy.deepcopy(new_cyclists)))
+    timed(f"HistoryStore save + load ({n} riders, {len(history_store.dates)} days)",
+          lambda: HistoryStore(history_store.save() or history_store.directory))
+    shutil.rmtree(history_store.directory, ignore_errors=True)
+
+    data = ca.update_historical_data(copy.deepcopy(existing), copy.deepcopy(new_cyclists), league_scores)
+    cyclists = data['cyclists']
+    timed(f"RiderTable + metrics ({n} riders)", lambda: RiderTable(cyclists).metrics())
+    rider_table = RiderTable(cyclists)
+    league_history = [{'date': date, 'scores': [dict(team, points=team['points'] * k // 100) for team in league_scores]}
+                      for k, date in enumerate(history_dates(100), 1)]
+    timed(f"build_chart_data ({n} riders, {len(league_scores)} teams, 100 days)",
+          lambda: build_chart_data(rider_table, league_history, league_scores))
+    timed(f"create_top_50_efficiency_data ({n} riders)", lambda: ca.create_top_50_efficiency_data(cyclists, rider_table))
+    timed(f"forecast_points ({n} riders)", lambda: ca.forecast_points(cyclists, rider_table, withdrawals))
+    timed(f"select_dream_team_optimized ({n} riders)", lambda: ca.select_dream_team_optimized(cyclists))
+    all_star = ca.select_league_all_star_team(league_scores, cyclists)
+    twitter_scores = list(range(100, 20000, 15))
+    for processes in sorted({1, os.cpu_count() or 1}):
+        timed(f"simulate_league 100k, {processes} process(es) ({len(league_scores)} teams)",
+              lambda: simulate_league(rider_table, league_scores, 5, None, all_star, twitter_scores,
+                                      simulations=100000, seed=1, processes=processes), repeat=1)
+    big_league = [{'name': f"Team {i}", 'points': 0, 'roster': random.Random(i).sample(rider_table.names, 9)}
+                  for i in range(4000)]
+    timed(f"analyze_ownership ({len(league_scores)} teams)", lambda: analyze_ownership(rider_table, league_scores))
+    timed(f"analyze_ownership ({len(big_league)} teams)", lambda: analyze_ownership(rider_table, big_league), repeat=1)
+    # Real rosters keep the role and budget rules, which random samples mostly break
+    transfer_league = [dict(team, name=f"Team {i}") for i, team in
+                       enumerate(league_scores[i % len(league_scores)] for i in range(4000))]
+    timed(f"recommend_transfers ({len(league_scores)} teams)", lambda: recommend_transfers(cyclists, league_scores))
+    timed(f"recommend_transfers ({len(transfer_league)} teams)", lambda: recommend_transfers(cyclists, transfer_league),
+          repeat=1)
+    rng = random.Random(0)
+    field_pages = [[rng.randint(0, 5000) for _ in range(1000)] for _ in range(50)]
+    index = league_index(field_pages)
+    team_points = [team['points'] for team in league_scores]
+    timed(f"ScoreIndex rank ({len(team_points)} teams vs {len(index)} entries)", lambda: index.rank(team_points))
+    timed(f"ScoreIndex.update_page (1 of {len(field_pages)} pages changed)",
+          lambda index: index.update_page(0, [points + 1 for points in field_pages[0]]),
+          setup=lambda: (league_index(field_pages),))
+    timed(f"select_league_all_star_team ({len(league_scores)} teams)",
+          lambda: ca.select_league_all_star_team(league_scores, cyclists))
+    timed(f"calculate_mvp_mip ({n} riders)",
+          lambda: ca.calculate_mvp_mip(cyclists, {'mvp_history': [], 'mip_history': []}, rider_table))
+    timed(f"mark_withdrawn_cyclists ({n} riders, {len(withdrawals)} withdrawals)",
+          lambda: ca.mark_withdrawn_cyclists(cyclists, withdrawals))
+
+    data['withdrawals'] = withdrawals
+    timed(f"json.dump monolithic, indent=2 ({n} riders)",
+          lambda: json.dumps(data, default=ca.numpy_to_python, ensure_ascii=False, indent=2))
+    for encoder in sorted({'json', output_writer.resolve_encoder('auto')}):
+        timed(f"output_writer.dumps monolithic, {encoder} ({n} riders)",
+              lambda: output_writer.dumps(data, ca.numpy_to_python, indent=True, encoder=encoder))
+    timed(f"validate_output ({n} riders)", lambda: ca.validate_output(data))
+    output_dir = tempfile.mkdtemp(prefix='bench-output-')
+    try:
+        timed(f"write_split_output, fresh directory ({n} riders)",
+              lambda: write_split_output(data, output_dir, default=ca.numpy_to_python),
+              setup=lambda: shutil.rmtree(output_dir, ignore_errors=True) or ())
+        timed(f"write_split_output, unchanged ({n} riders)",
+              lambda: write_split_output(data, output_dir, default=ca.numpy_to_python))
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+def bench_race():
+    """run_race end to end on the fixtures with 10x league teams and 100ms latency, cold caches, fresh and seeded."""
+    saved_workers = ca.PIPELINE_IO_WORKERS
+    cwd = os.getcwd()
+    with fixture_pipeline(rider_factor=1, team_factor=10, latency=0.1) as race:
+        work = tempfile.mkdtemp(prefix='bench-race-')
+        os.chdir(work)
+
+        def fresh_run():
+            shutil.rmtree(http_client.HTTP_CACHE_DIR, ignore_errors=True)
+            for name in os.listdir(work):
+                shutil.rmtree(os.path.join(work, name), ignore_errors=True)
+            return ()
+
+        def seeded_run():
+            # The committed multi-day output, so history-dependent sections (league changes, top movers) are
+            # built and validated too
+            fresh_run()
+            os.makedirs(os.path.dirname(race['output_file']), exist_ok=True)
+            shutil.copy(os.path.join(ROOT, 'cyclist-data.json'), race['output_file'])
+            return ()
+
+        def run_race(io_workers):
+            ca.PIPELINE_IO_WORKERS = io_workers
+            with contextlib.redirect_stderr(io.StringIO()):
+                if ca.run_race(race) != 'ok':
+                    raise RuntimeError("benchmark race run failed")
+        try:
+            timed("run_race, stages in turn", lambda: run_race(0), setup=fresh_run, repeat=1)
+            timed(f"run_race, scheduled ({saved_workers} io workers)", lambda: run_race(saved_workers),
+                  setup=fresh_run, repeat=1)
+            timed(f"run_race, seeded from cyclist-data.json ({saved_workers} io workers)",
+                  lambda: run_race(saved_workers), setup=seeded_run, repeat=1)
+        finally:
+            ca.PIPELINE_IO_WORKERS = saved_workers
+            os.chdir(cwd)
+            shutil.rmtree(work, ignore_errors=True)
+
+BENCHMARKS = {
+    'startup': bench_startup,
+    'history': bench_history,
+    'parsers': bench_parsers,
+    'optimizer': bench_optimizer,
+    'pipeline': bench_pipeline,
+    'race': bench_race,
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for cyclist_analyzer.py")
+    parser.add_argument('names', nargs='*', help=f"benchmarks to run ({', '.join(BENCHMARKS)})")
+    parser.add_argument('--save-baseline', action='store_true', help=f"store timings in {os.path.basename(BASELINE_FILE)}")
+    parser.add_argument('--check', action='store_true', help="exit with status 1 when a timing regressed")
+    parser.add_argument('--tolerance', type=float, default=1.5, help="allowed slowdown factor for --check (default 1.5)")
+    args = parser.parse_args(argv)
+
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark {name!r}; choose from {', '.join(BENCHMARKS)}")
+
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, 'r', encoding='utf-8') as f:
+            baseline.update(json.load(f)['timings'])
+
+    for name in args.names or BENCHMARKS:
+        print(f"== {name}: {BENCHMARKS[name].__doc__}")
+        BENCHMARKS[name]()
+
+    if args.save_baseline:
+        saved = dict(baseline, **results)
+        with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+            json.dump({'python': sys.version.split()[0], 'timings': {k: round(v, 6) for k, v in sorted(saved.items())}}, f, indent=2)
+        print(f"Saved {len(results)} timings to {BASELINE_FILE}")
+
+    if args.check:
+        # Ignore sub-5ms differences, they are timer noise
+        regressions = [label for label, seconds in results.items()
+                       if label in baseline and seconds > baseline[label] * args.tolerance and seconds - baseline[label] > 0.005]
+        for label in regressions:
+            print(f"REGRESSION: {label}: {results[label] * 1000:.2f} ms vs baseline {baseline[label] * 1000:.2f} ms", file=sys.stderr)
+        for failure in budget_failures:
+            print(f"OVER BUDGET: {failure}", file=sys.stderr)
+        if regressions or budget_failures:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
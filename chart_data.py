@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+from analytics import _to_list
+from ownership_analysis import roster_indices
+from config import CHART_TOP_MOVERS
+
+def league_matrix(league_history):
+    """(dates, team names, teams x dates points with NaN gaps) from league_scores.history."""
+    dates = [entry['date'] for entry in league_history]
+    names = list(dict.fromkeys(team['name'] for entry in league_history for team in entry['scores']))
+    rows = {name: i for i, name in enumerate(names)}
+    points = np.full((len(names), len(dates)), np.nan)
+    for column, entry in enumerate(league_history):
+        for team in entry['scores']:
+            points[rows[team['name']], column] = team['points']
+    return dates, names, points
+
+def _previous_column(values):
+    previous = np.full_like(values, np.nan)
+    previous[:, 1:] = values[:, :-1]
+    return previous
+
+def league_series(league_history):
+    """Columnar per-team series: cumulative points, daily gains, ranks and rank changes.
+
+    Every matrix is teams x dates in the order of `teams`/`dates`, with None
+    where a team has no entry that day. Ranks are positions in the day's standings,
+    as in calculate_league_changes, and a positive rank change is a climb.
+    """
+    dates, names, points = league_matrix(league_history)
+    ranks = pd.DataFrame(points).rank(axis=0, method='first', ascending=False).to_numpy()
+    latest = points[:, -1] if dates else np.empty(0)
+    return {
+        'dates': dates,
+        'teams': names,
+        'points': _to_list(points, 0),
+        'gains': _to_list(points - _previous_column(points), 0),
+        'ranks': _to_list(ranks, 0),
+        'rank_changes': _to_list(_previous_column(ranks) - ranks, 0),
+        # Team indices by latest points, highest first; teams missing from the latest day come last
+        'standings': [int(i) for i in np.argsort(-np.nan_to_num(latest, nan=-np.inf), kind='stable')],
+    }
+
+def role_series(rider_table):
+    """Per-role daily point totals as one roles x dates matrix."""
+    aggregates = rider_table.role_aggregates()
+    roles = list(aggregates)
+    return {
+        'dates': rider_table.dates,
+        'roles': roles,
+        'riders': [aggregates[role]['riders'] for role in roles],
+        'daily_totals': [aggregates[role]['daily_totals'] for role in roles],
+    }
+
+def roster_series(rider_table, league_teams):
+    """Each league team's riders with their cumulative points per rider date (None before a rider's first entry)."""
+    indices = roster_indices([team.get('roster', []) for team in league_teams], rider_table.names)
+    padded = np.vstack([rider_table.observed, np.full((1, len(rider_table.dates)), np.nan)])
+    series = {}
+    for team, row in zip(league_teams, indices):
+        row = row[row < len(rider_table.names)]
+        series[team['name']] = {
+            'riders': [rider_table.names[i] for i in row],
+            'points': _to_list(padded[row], 0),
+        }
+    return {'dates': rider_table.dates, 'teams': series}
+
+def top_movers(rider_table, league, top=CHART_TOP_MOVERS):
+    """The riders and league teams that gained the most points on the latest date."""
+    deltas = rider_table.daily_deltas()
+    if deltas.shape[1]:
+        last = np.nan_to_num(deltas[:, -1], nan=-np.inf)
+        riders = [{'name': rider_table.names[i], 'role': rider_table.roles[i], 'points_delta': float(deltas[i, -1])}
+                  for i in np.argsort(-last, kind='stable')[:top] if np.isfinite(last[i])]
+    else:
+        riders = []
+
+    teams = []
+    if league['dates']:
+        gains = [(row[-1], name) for name, row in zip(league['teams'], league['gains']) if row[-1] is not None]
+        teams = [{'name': name, 'points_delta': gain}
+                 for gain, name in sorted(gains, key=lambda item: -item[0])[:top]]
+    return {
+        'rider_date': rider_table.dates[-1] if rider_table.dates else None,
+        'league_date': league['dates'][-1] if league['dates'] else None,
+        'riders': riders,
+        'teams': teams,
+    }
+
+def build_chart_data(rider_table, league_history, league_teams):
+    """Ready-to-plot aggregates for script.js, so the browser only fetches and draws."""
+    league = league_series(league_history)
+    return {
+        'league': league,
+        'roles': role_series(rider_table),
+        'rosters': roster_series(rider_table, league_teams),
+        'top_movers': top_movers(rider_table, league),
+    }
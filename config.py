@@ -1,5 +1,7 @@
 # config.py
 
+import os
+
 # URLs
 CYCLIST_URL = "https://www.velogames.com/spain/2024/riders.php"
 LEAGUE_SCORES_URL = "https://www.velogames.com/spain/2024/leaguescores.php?league=764413216"
@@ -22,4 +24,110 @@ MIN_CLIMBERS = 2
 MIN_UNCLASSED = 3
 
 # Historical data retention (in days)
-HISTORY_RETENTION_DAYS = 30
+HISTORY_RETENTION_DAYS = 30  # entries per history list in the JSON output
+HISTORY_STORE_RETENTION_DAYS = None  # dates kept in the binary history store; None keeps every season
+
+# HTTP fetching
+REQUEST_TIMEOUT = 15  # seconds per request
+REQUEST_RETRIES = 3
+REQUEST_BACKOFF = 0.5  # seconds, doubled on each retry
+FETCH_CONCURRENCY = 8  # parallel roster downloads
+
+# On-disk HTTP cache (set HTTP_CACHE_DIR to None to disable)
+HTTP_CACHE_DIR = ".http-cache"
+HTTP_CACHE_TTL_DAYS = 14  # evict entries not used for this long
+HTTP_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+# Withdrawal name matching
+WITHDRAWAL_MATCH_THRESHOLD = 0.70
+WITHDRAWAL_MAX_CANDIDATES = 5  # closest names by shared trigrams sent to the scorer
+
+# HTML parsing backend for the riders table: 'auto', 'lxml', 'stream' (stdlib) or 'bs4'
+HTML_PARSER_BACKEND = "auto"
+
+# Team optimizer: 'auto' uses the exact knapsack solver when all costs are whole numbers, else CBC
+TEAM_SOLVER = "auto"  # 'auto', 'dp' or 'cbc'
+
+# Dream team scenarios (written to dream_team_scenarios in the output)
+TOP_K_TEAMS = 5
+BUDGET_SWEEP = [90, 95, 100, 105, 110]
+SCENARIO_FORCE_INCLUDE = []  # rider names to force into a what-if team, one scenario each
+SCENARIO_FORCE_EXCLUDE = []  # rider names to leave out of a what-if team, one scenario each
+SCENARIO_PROCESSES = 1  # worker processes for the scenario batch; None uses every CPU
+
+# Output format: 'monolithic' (OUTPUT_FILE), 'split' (OUTPUT_DIR) or 'both'
+OUTPUT_MODE = "split"
+OUTPUT_DIR = "data"  # split output: current.json, history/<date>.json and manifest.json
+OUTPUT_GZIP = False  # also write pre-gzipped .json.gz copies of the split files
+JSON_ENCODER = "auto"  # 'orjson', 'json' (stdlib) or 'auto' (orjson when installed)
+
+# Rider analytics
+FORM_WINDOW_DAYS = 3  # days averaged for a rider's recent form
+
+# Points forecasting (projected_points per rider and the projected team)
+RACE_STAGES = 21  # stages in a grand tour; a RACES entry can override it with 'stages'
+FORECAST_HALFLIFE_STAGES = 4  # a stage's gains count half as much this many stages later
+FORECAST_HORIZON_STAGES = None  # stages to project; None projects the rest of the race
+TEAM_OBJECTIVE = "points"  # rider value the optimizer maximises: 'points' (actual) or 'projected_points'
+
+# League ownership analysis (ownership_analysis in the output)
+OWNERSHIP_TEMPLATE_THRESHOLD = 20.0  # riders owned by at least this % of velogames teams count as template picks
+OWNERSHIP_OVERLAP_MATRIX_MAX = 50  # leagues up to this many teams also get the full shared-riders matrix
+OWNERSHIP_OVERLAP_BLOCK = 256  # teams per block when counting shared riders
+
+# Transfer recommendations per league team (transfer_recommendations in the output)
+TRANSFER_MAX_SWAPS = 3  # best swaps are listed for 1 up to this many transfers
+TRANSFER_OBJECTIVE = "projected_points"  # rider value the swaps maximise: 'projected_points' or 'points'
+TRANSFER_CHUNK = 256  # league teams evaluated together
+
+# Precomputed chart series for script.js (chart_data in the output)
+CHART_TOP_MOVERS = 10  # riders and league teams listed as the latest day's top movers
+
+# Monte Carlo league simulation (league_simulation and all_star_simulation in the output)
+SIMULATIONS = 10000
+SIMULATION_CHUNK = 10000  # simulations per task; with a seed, results don't depend on the process count
+SIMULATION_SEED = None  # set an int for reproducible results
+SIMULATION_PROCESSES = 1  # worker processes for the chunks; None uses every CPU
+
+# Run instrumentation
+RUN_REPORT_FILE = "run-report.json"  # per-run timings; uploaded as a workflow artifact, not committed
+PROFILE_MODE = os.environ.get("CYCLIST_PROFILE")  # None, 'cprofile' or 'tracemalloc'
+PROFILE_FILE = "run-profile.prof"  # cProfile stats dump when PROFILE_MODE is 'cprofile'
+
+# Race/league registry: every entry is processed on each run (or only those named on the
+# command line). Required keys: 'id', the velogames game 'velogames_url' and the private
+# 'league_id'. Optional: 'stages' (defaults to RACE_STAGES), 'twitter_league_id' (public league the All-Star team is ranked in),
+# 'withdrawals_url' (race withdrawal page, lavuelta.es/letour.fr format) and the output
+# paths 'output_file', 'output_dir', 'run_report_file' and 'profile_file', which default
+# to files under RACE_OUTPUT_ROOT/<id>/, 'history_store_dir' (RACE_OUTPUT_ROOT/<id>/history-store)
+# 'roster_store_file' (ROSTER_STORE_DIR/<id>.json) and 'score_index_file' (SCORE_INDEX_DIR/<id>.npz).
+RACES = [
+    {
+        'id': 'vuelta-2024',
+        'velogames_url': "https://www.velogames.com/spain/2024/",
+        'league_id': LEAGUE_ID,
+        'twitter_league_id': TWITTER_LEAGUE_ID,
+        'withdrawals_url': WITHDRAWALS_URL,
+        'output_file': OUTPUT_FILE,
+        'output_dir': OUTPUT_DIR,
+        'run_report_file': RUN_REPORT_FILE,
+        'profile_file': PROFILE_FILE,
+        'history_store_dir': "history-store",
+    },
+]
+RACE_OUTPUT_ROOT = "races"
+ROSTER_STORE_DIR = ".roster-store"  # league team rosters kept between runs so only new teams are fetched
+ROSTER_STORE_MAX_AGE = 3 * 24 * 3600  # seconds before a stored roster is re-fetched anyway; swaps are normally caught by points
+SCORE_INDEX_DIR = ".score-index"  # sorted comparison-league scores kept between runs, refreshed page by page
+MAX_LEAGUE_PAGES = 500  # safety cap when following a paginated comparison league
+RACE_PROCESSES = None  # worker processes for independent races; None uses one per race up to the CPU count
+PIPELINE_IO_WORKERS = 4  # network stages of a race run at once (riders, league, comparison league, withdrawals); 0 runs every stage in turn
+
+# Daemon mode (daemon.py): poll the source pages and re-run only what their changes affect
+POLL_INTERVAL = 300  # seconds between checks
+POLL_STATUS_FILE = "poll-status.json"  # per-race freshness, rewritten after every check
+
+# Replay (replay.py): rebuild the day-by-day state from past snapshots of the output
+REPLAY_OUTPUT_FILE = "replay.json"
+REPLAY_CACHE_DIR = ".replay-cache"  # optimizer results per day, keyed by that day's riders and league
+REPLAY_PROCESSES = None  # worker processes solving the days' teams; None uses every CPU
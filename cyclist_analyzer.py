@@ -1,18 +1,29 @@
 import sys
 import json
 import traceback
-import requests
-from bs4 import BeautifulSoup
-import pandas as pd
-import plotly.express as px
-import numpy as np
-import pulp
-import io
-import contextlib
 import os
 from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
 from config import *
+from instrumentation import RunReport
+from pipeline import Stage, run_pipeline
+from races import select_races
+from roster_store import RosterStore
+from split_output import load_split_output, write_split_output
+from output_writer import dumps, write_if_changed
+from output_schema import validate as validate_output
+from team_optimizer import TeamOptimizer, run_scenarios, solver_stats
+from http_client import fetch_parsed, close_session, prune_cache, log_cache_stats, cache_stats
+from scraping import (fetch_html_content, parse_withdrawals, fetch_withdrawals, extract_numeric, iter_cyclists,
+                      analyze_cyclists, parse_riders_page, parse_team_roster, fetch_team_roster, fetch_league_scores,
+                      parse_league_points, parse_league_page, fetch_twitter_league_data, format_withdrawal_name)
 import difflib
+import bisect
+import unicodedata
+from collections import Counter, defaultdict
+
+# numpy, pandas and the modules built on them are imported by the functions and
+# stages that use them, so polling runs and race workers start without them.
 
 def normalize_name(name):
     return ' '.join(sorted(name.lower().split()))
@@ -21,92 +32,13 @@ def normalize_name(name):
 def calculate_name_similarity(name1, name2):
     return difflib.SequenceMatcher(None, name1.lower(), name2.lower()).ratio()
 
-def fetch_html_content(url):
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.text
-    except requests.RequestException as e:
-        print(f"Error fetching URL {url}: {e}", file=sys.stderr)
-        raise
-
-def fetch_withdrawals():
-    try:
-        response = requests.get(WITHDRAWALS_URL)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-
-        withdrawals = []
-
-        for stage_div in soup.find_all('div', class_='rankingTables__item'):
-            stage_number = stage_div.find('div', class_='rankingTables__caption').text.strip().split()[1]
-
-            table = stage_div.find('table', class_='rankingTable')
-            if table:
-                for row in table.find_all('tr')[1:]:  # Skip header row
-                    cells = row.find_all('td')
-                    if len(cells) >= 3:
-                        rider_name = format_withdrawal_name(cells[1].text.strip())
-                        team_name = cells[2].text.strip()
-                        withdrawals.append({
-                            'stage': int(stage_number),
-                            'rider': rider_name,
-                            'team': team_name
-                        })
-
-        return withdrawals
-    except requests.RequestException as e:
-        print(f"Error fetching withdrawals: {e}", file=sys.stderr)
-        return []
-        
-def extract_numeric(value):
-    import re
-    match = re.search(r'\d+(\.\d+)?', value)
-    if match:
-        return float(match.group())
-    else:
-        print(f"Error extracting numeric value from: {value}", file=sys.stderr)
-        return 0.0
-
-def analyze_cyclists(html_content):
-    soup = BeautifulSoup(html_content, 'html.parser')
-    cyclists = []
-
-    for row in soup.find_all('tr'):
-        cols = row.find_all('td')
-        if len(cols) >= 7:
-            try:
-                name = cols[1].text.strip()
-                team = cols[2].text.strip()
-                role = cols[3].text.strip()
-                cost = extract_numeric(cols[4].text)
-                ownership = extract_numeric(cols[5].text)
-                points = extract_numeric(cols[6].text)
-
-                cost_per_point = "Infinity" if points == 0 else cost / points
-
-                cyclists.append({
-                    'name': name,
-                    'team': team,
-                    'role': role,
-                    'cost': cost,
-                    'ownership': ownership,
-                    'points': points,
-                    'cost_per_point': cost_per_point
-                })
-            except Exception as e:
-                print(f"Error processing row: {e}", file=sys.stderr)
-
-    if not cyclists:
-        print("No cyclists data extracted. Check if the page structure has changed.", file=sys.stderr)
-
-    return cyclists
-
-def create_top_50_efficiency_data(cyclists):
-    top_50_efficiency = sorted(
-        [c for c in cyclists if c['cost_per_point'] != "Infinity"],
-        key=lambda x: x['cost_per_point']
-    )[:50]
+def create_top_50_efficiency_data(cyclists, rider_table=None):
+    import numpy as np
+    from analytics import RiderTable
+    rider_table = rider_table or RiderTable(cyclists)
+    # Stable sort keeps the original order between riders with equal cost per point
+    order = np.argsort(rider_table.cost_per_point(), kind='stable')
+    top_50_efficiency = [cyclists[i] for i in order if cyclists[i]['cost_per_point'] != "Infinity"][:50]
 
     return [{
         'name': c['name'],
@@ -116,72 +48,31 @@ def create_top_50_efficiency_data(cyclists):
         'cost': c['cost']
     } for c in top_50_efficiency]
 
-def fetch_team_roster(url):
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        riders = []
-        table = soup.find('table', class_='responsive')
-        if table:
-            for row in table.find_all('tr'):
-                name_cell = row.find('td')
-                if name_cell:
-                    name_link = name_cell.find('a')
-                    if name_link:
-                        rider_name = name_link.text.strip()
-                        riders.append(rider_name)
-
-        if not riders:
-            print(f"No riders found for URL: {url}", file=sys.stderr)
-
-        return riders
-    except requests.RequestException as e:
-        print(f"Error fetching team roster from URL {url}: {e}", file=sys.stderr)
-        return []
-
-def fetch_league_scores():
-    response = requests.get(LEAGUE_SCORES_URL)
-    soup = BeautifulSoup(response.content, 'html.parser')
-
-    teams = []
-    for li in soup.select('#users .list li'):
-        team_name = li.select_one('h3.name a').text.strip()
-        points = int(li.select_one('p.born b').text.strip())
-        team_url = li.select_one('h3.name a')['href']
-        full_team_url = f"https://www.velogames.com/spain/2024/{team_url}"
-
-        team_roster = fetch_team_roster(full_team_url)
-
-        teams.append({
-            "name": team_name,
-            "points": points,
-            "roster": team_roster
-        })
-
-    # Sort teams by points in descending order
-    teams.sort(key=lambda x: x['points'], reverse=True)
-
-    return teams
-
 def numpy_to_python(obj):
-    if isinstance(obj, np.integer):
-        return int(obj)
-    elif isinstance(obj, np.floating):
-        return float(obj)
-    elif isinstance(obj, np.ndarray):
-        return obj.tolist()
-    elif isinstance(obj, pd.Series):
-        return obj.tolist()
-    elif isinstance(obj, pd.DataFrame):
-        return obj.to_dict(orient='records')
+    # A numpy or pandas value can only exist once its module is loaded, so don't import them here
+    np = sys.modules.get('numpy')
+    pd = sys.modules.get('pandas')
+    if np is not None:
+        if isinstance(obj, np.integer):
+            return int(obj)
+        elif isinstance(obj, np.floating):
+            return float(obj)
+        elif isinstance(obj, np.ndarray):
+            return obj.tolist()
+    if pd is not None:
+        if isinstance(obj, pd.Series):
+            return obj.tolist()
+        elif isinstance(obj, pd.DataFrame):
+            return obj.to_dict(orient='records')
     return obj
 
-def load_existing_data(filename):
+def load_existing_data(filename, split_dir=None):
     try:
-        with open(filename, 'r') as f:
-            data = json.load(f)
+        # Prefer the split output when there is one, the monolithic file seeds the first split run
+        data = load_split_output(split_dir) if split_dir else None
+        if data is None:
+            with open(filename, 'r') as f:
+                data = json.load(f)
         # Ensure all cyclists have a pointHistory
         for cyclist in data['cyclists']:
             if 'pointHistory' not in cyclist:
@@ -198,16 +89,79 @@ def load_existing_data(filename):
     except FileNotFoundError:
         return {'cyclists': [], 'top_50_efficiency': [], 'league_scores': {'current': [], 'history': []}, 'dream_team': None, 'last_update': None, 'mvp_history': [], 'mip_history': []}
 
-def update_historical_data(existing_data, new_cyclists, new_league_scores):
-    today = datetime.now().strftime('%Y-%m-%d')
+def upsert_history_entry(history, date, field, value):
+    """Set the entry for `date` in a date-sorted history list, trimming it to HISTORY_RETENTION_DAYS in place."""
+    if history and history[-1]['date'] == date:
+        history[-1][field] = value
+    elif not history or history[-1]['date'] < date:
+        history.append({'date': date, field: value})
+    else:
+        # Date falls inside the history, fall back to a sorted insert
+        i = bisect.bisect_left([entry['date'] for entry in history], date)
+        if history[i]['date'] == date:
+            history[i][field] = value
+        else:
+            history.insert(i, {'date': date, field: value})
+    del history[:-HISTORY_RETENTION_DAYS]
+
+def calculate_league_changes(league_scores, history, today):
+    """Per-team points added and rank movement since the latest history entry before `today`.
+
+    Teams absent from that entry get None deltas; rank_change is positive when
+    a team moved up.
+    """
+    previous = next((entry for entry in reversed(history) if entry['date'] < today), None)
+    previous_points = {}
+    previous_ranks = {}
+    if previous:
+        ranked = sorted(previous['scores'], key=lambda team: team['points'], reverse=True)
+        for rank, team in enumerate(ranked, 1):
+            previous_points[team['name']] = team['points']
+            previous_ranks[team['name']] = rank
+
+    teams = []
+    for rank, team in enumerate(sorted(league_scores, key=lambda team: team['points'], reverse=True), 1):
+        previous_rank = previous_ranks.get(team['name'])
+        teams.append({
+            'name': team['name'],
+            'points': team['points'],
+            'points_delta': team['points'] - previous_points[team['name']] if team['name'] in previous_points else None,
+            'rank': rank,
+            'previous_rank': previous_rank,
+            'rank_change': previous_rank - rank if previous_rank is not None else None
+        })
+
+    return {'date': today, 'previous_date': previous['date'] if previous else None, 'teams': teams}
+
+def update_historical_data(existing_data, new_cyclists, new_league_scores, history_store=None, today=None):
+    """Merge today's scrape into the existing data.
+
+    With a HistoryStore, today's points are recorded there and the pointHistory
+    and league history lists are re-exported from it (last HISTORY_RETENTION_DAYS
+    entries) instead of being edited in place. An empty store is first seeded
+    with the history already in existing_data. today (YYYY-MM-DD) defaults to
+    the current date; replay.py passes the date of the snapshot it rebuilds.
+    """
+    today = today or datetime.now().strftime('%Y-%m-%d')
+
+    if history_store is not None and history_store.empty:
+        league_history = existing_data.get('league_scores', {}).get('history', [])
+        history_store.import_history(existing_data['cyclists'], league_history, normalize_name)
+
+    # Index existing cyclists by normalized name so each lookup is O(1)
+    existing_by_key = {normalize_name(c['name']): c for c in existing_data['cyclists']}
+    new_keys = set()
 
     # Update cyclist data
     for new_cyclist in new_cyclists:
-        existing_cyclist = next((c for c in existing_data['cyclists'] if c['name'] == new_cyclist['name']), None)
+        key = normalize_name(new_cyclist['name'])
+        new_keys.add(key)
+        existing_cyclist = existing_by_key.get(key)
 
         if existing_cyclist:
             # Update existing cyclist's current data
             existing_cyclist.update({
+                'name': new_cyclist['name'],
                 'team': new_cyclist['team'],
                 'role': new_cyclist['role'],
                 'cost': new_cyclist['cost'],
@@ -216,22 +170,17 @@ def update_historical_data(existing_data, new_cyclists, new_league_scores):
                 'cost_per_point': new_cyclist['cost_per_point']
             })
 
-            # Update or add today's entry in pointHistory
-            today_entry = next((entry for entry in existing_cyclist['pointHistory'] if entry['date'] == today), None)
-            if today_entry:
-                today_entry['points'] = new_cyclist['points']
-            else:
-                existing_cyclist['pointHistory'].append({'date': today, 'points': new_cyclist['points']})
-
-            # Keep only the last 30 days of historical data
-            existing_cyclist['pointHistory'] = sorted(existing_cyclist['pointHistory'], key=lambda x: x['date'])[-HISTORY_RETENTION_DAYS:]
+            # Update or add today's entry in pointHistory, keeping the last 30 days
+            if history_store is None:
+                upsert_history_entry(existing_cyclist['pointHistory'], today, 'points', new_cyclist['points'])
         else:
             # Add new cyclist
             new_cyclist['pointHistory'] = [{'date': today, 'points': new_cyclist['points']}]
             existing_data['cyclists'].append(new_cyclist)
+            existing_by_key[key] = new_cyclist
 
     # Remove cyclists that are no longer present in the new data
-    existing_data['cyclists'] = [c for c in existing_data['cyclists'] if any(nc['name'] == c['name'] for nc in new_cyclists)]
+    existing_data['cyclists'] = [c for c in existing_data['cyclists'] if normalize_name(c['name']) in new_keys]
 
     # Update league scores
     if 'league_scores' not in existing_data:
@@ -239,48 +188,50 @@ def update_historical_data(existing_data, new_cyclists, new_league_scores):
 
     # Update current scores and team rosters
     existing_data['league_scores']['current'] = new_league_scores
+    existing_data['league_changes'] = calculate_league_changes(new_league_scores, existing_data['league_scores']['history'], today)
 
-    # Update or add today's entry in league score history
-    today_history_entry = next((entry for entry in existing_data['league_scores']['history'] if entry['date'] == today), None)
-    if today_history_entry:
-        today_history_entry['scores'] = new_league_scores
+    if history_store is not None:
+        history_store.record_riders(today, [normalize_name(c['name']) for c in new_cyclists], [c['points'] for c in new_cyclists])
+        history_store.record_league(today, new_league_scores)
+        existing_data['league_scores']['history'] = history_store.export(
+            existing_data['cyclists'], normalize_name, HISTORY_RETENTION_DAYS)
     else:
-        existing_data['league_scores']['history'].append({'date': today, 'scores': new_league_scores})
-
-    # Keep only the last 30 days of league score history
-    existing_data['league_scores']['history'] = sorted(existing_data['league_scores']['history'], key=lambda x: x['date'])[-HISTORY_RETENTION_DAYS:]
+        # Update or add today's entry in league score history, keeping the last 30 days
+        upsert_history_entry(existing_data['league_scores']['history'], today, 'scores', new_league_scores)
 
     # Update the last update timestamp
     existing_data['last_update'] = today
 
     return existing_data
 
-def calculate_mvp_mip(cyclists, previous_data):
-    today = datetime.now().strftime('%Y-%m-%d')
+def calculate_mvp_mip(cyclists, previous_data, rider_table=None, today=None):
+    import numpy as np
+    from analytics import RiderTable
+    today = today or datetime.now().strftime('%Y-%m-%d')
 
     mvp = {'name': '', 'points_added': 0, 'date': today}
     mip = {'name': '', 'percentage_increase': 0, 'date': today, 'from_zero': False}
 
-    for cyclist in cyclists:
-        if len(cyclist['pointHistory']) < 2:
-            continue
-
-        latest_points = cyclist['pointHistory'][-1]['points']
-        previous_points = cyclist['pointHistory'][-2]['points']
-        points_added = latest_points - previous_points
-
-        # MVP calculation
-        if points_added > mvp['points_added']:
-            mvp = {'name': cyclist['name'], 'points_added': points_added, 'date': today}
-
-        # MIP calculation
-        if previous_points == 0 and latest_points > 0:
-            if not mip['from_zero'] or points_added > mip['percentage_increase']:
-                mip = {'name': cyclist['name'], 'percentage_increase': points_added, 'date': today, 'from_zero': True}
-        elif previous_points > 0:
-            percentage_increase = (points_added / previous_points) * 100
-            if percentage_increase > mip['percentage_increase'] and not mip['from_zero']:
-                mip = {'name': cyclist['name'], 'percentage_increase': percentage_increase, 'date': today, 'from_zero': False}
+    rider_table = rider_table or RiderTable(cyclists)
+    latest_points, previous_points = rider_table.last_two_points()
+    # Riders with fewer than two history entries have NaN here and never qualify
+    points_added = latest_points - previous_points
+    with np.errstate(invalid='ignore', divide='ignore'):
+        percentage_increase = np.where(previous_points > 0, points_added / previous_points * 100, np.nan)
+
+    # MVP calculation: first rider with the largest positive gain
+    if np.any(points_added > 0):
+        i = int(np.nanargmax(points_added))
+        mvp = {'name': cyclists[i]['name'], 'points_added': float(points_added[i]), 'date': today}
+
+    # MIP calculation: riders scoring their first points outrank any percentage increase
+    from_zero = (previous_points == 0) & (latest_points > 0)
+    if from_zero.any():
+        i = int(np.argmax(np.where(from_zero, points_added, -np.inf)))
+        mip = {'name': cyclists[i]['name'], 'percentage_increase': float(points_added[i]), 'date': today, 'from_zero': True}
+    elif np.any(percentage_increase > 0):
+        i = int(np.nanargmax(percentage_increase))
+        mip = {'name': cyclists[i]['name'], 'percentage_increase': float(percentage_increase[i]), 'date': today, 'from_zero': False}
 
     # Remove any existing entry for today before appending
     previous_data['mvp_history'] = [entry for entry in previous_data['mvp_history'] if entry['date'] != today]
@@ -295,59 +246,21 @@ def calculate_mvp_mip(cyclists, previous_data):
 
     return previous_data, mvp, mip
 
-def select_dream_team_optimized(cyclists):
-    # Create the linear programming problem
-    prob = pulp.LpProblem("Dream Team Selection", pulp.LpMaximize)
-
-    # Create binary variables for each cyclist
-    cyclist_vars = pulp.LpVariable.dicts("Cyclist", 
-                                         ((c['name'], c['role']) for c in cyclists), 
-                                         cat='Binary')
-
-    # Objective function: maximize total points
-    prob += pulp.lpSum(cyclist['points'] * cyclist_vars[cyclist['name'], cyclist['role']] 
-                       for cyclist in cyclists)
-
-    # Constraints
-    constraints = [
-        ("Total cyclists", pulp.lpSum(cyclist_vars) == TOTAL_CYCLISTS),
-        ("Maximum cost", pulp.lpSum(cyclist['cost'] * cyclist_vars[cyclist['name'], cyclist['role']] 
-                                    for cyclist in cyclists) <= MAX_COST),
-        ("Sprinters", pulp.lpSum(cyclist_vars[cyclist['name'], cyclist['role']] 
-                                 for cyclist in cyclists if cyclist['role'] == 'Sprinter') >= MIN_SPRINTERS),
-        ("All-Rounders", pulp.lpSum(cyclist_vars[cyclist['name'], cyclist['role']] 
-                                    for cyclist in cyclists if cyclist['role'] == 'All Rounder') >= MIN_ALL_ROUNDERS),
-        ("Climbers", pulp.lpSum(cyclist_vars[cyclist['name'], cyclist['role']] 
-                                for cyclist in cyclists if cyclist['role'] == 'Climber') >= MIN_CLIMBERS),
-        ("Unclassed", pulp.lpSum(cyclist_vars[cyclist['name'], cyclist['role']] 
-                                 for cyclist in cyclists if cyclist['role'] == 'Unclassed') >= MIN_UNCLASSED)
-    ]
-
-    # Add constraints to the problem
-    for name, constraint in constraints:
-        prob += constraint, name
+def previous_team_names(team):
+    return [rider['name'] for rider in team['riders']] if team else []
 
-    # Solve the problem
-    solver = pulp.PULP_CBC_CMD(msg=True)  # Enable solver output
-    prob.solve(solver)
+def select_dream_team_optimized(cyclists, optimizer=None, previous_team=None):
+    optimizer = optimizer or TeamOptimizer(cyclists)
+    dream_team, total_points, total_cost = optimizer.solve(previous_team=previous_team)
 
     # Check if a solution was found
-    if pulp.LpStatus[prob.status] == "Optimal":
-        # Extract the solution
-        dream_team = []
-        total_points = 0
-        total_cost = 0
+    if dream_team:
         role_count = {'All Rounder': 0, 'Climber': 0, 'Sprinter': 0, 'Unclassed': 0, 'Other': 0}
-
-        for cyclist in cyclists:
-            if cyclist_vars[cyclist['name'], cyclist['role']].value() == 1:
-                dream_team.append(cyclist)
-                total_points += cyclist['points']
-                total_cost += cyclist['cost']
-                if cyclist['role'] in role_count:
-                    role_count[cyclist['role']] += 1
-                else:
-                    role_count['Other'] += 1
+        for cyclist in dream_team:
+            if cyclist['role'] in role_count:
+                role_count[cyclist['role']] += 1
+            else:
+                role_count['Other'] += 1
 
         print("Dream Team:", file=sys.stderr)
         for rider in dream_team:
@@ -358,71 +271,81 @@ def select_dream_team_optimized(cyclists):
 
         return dream_team, total_points, total_cost
     else:
-        print(f"No feasible dream team found. Status: {pulp.LpStatus[prob.status]}", file=sys.stderr)
+        print(f"No feasible dream team found. Status: {optimizer.last_status}", file=sys.stderr)
+        return None, 0, 0
 
-        # Check which constraints are violated
-        print("Checking constraints:", file=sys.stderr)
-        for name, constraint in constraints:
-            print(f"{name}: {'Satisfied' if constraint.value() else 'Violated'}", file=sys.stderr)
+def forecast_points(cyclists, rider_table, withdrawals, race_stages=RACE_STAGES):
+    """Set projected_points on every cyclist and return the forecast settings used.
+
+    Stages done are counted from the scoring days in the history, or the latest
+    withdrawal stage if that is further on; the horizon is the rest of the race
+    unless FORECAST_HORIZON_STAGES fixes it. Withdrawn riders project 0.
+    """
+    stages_done = max([int(rider_table.scoring_days().sum())] + [w['stage'] for w in withdrawals])
+    horizon = FORECAST_HORIZON_STAGES if FORECAST_HORIZON_STAGES is not None else max(race_stages - stages_done, 0)
+    withdrawn = [c.get('isWithdrawn', False) for c in cyclists]
+    projected = rider_table.forecast(horizon, stages_done=stages_done, withdrawn=withdrawn)
+    for cyclist, value in zip(cyclists, projected):
+        cyclist['projected_points'] = round(float(value), 1)
+
+    print(f"Projected {horizon} remaining stages after {stages_done} done", file=sys.stderr)
+    return {
+        'stages_done': stages_done,
+        'horizon_stages': horizon,
+        'halflife_stages': FORECAST_HALFLIFE_STAGES,
+    }
+
+def select_projected_team(cyclists, optimizer, forecast, previous_team=None):
+    """Best team by projected_points over the forecast horizon, leaving out withdrawn riders."""
+    if not forecast['horizon_stages']:
+        print("Race is over, no projected team", file=sys.stderr)
+        return None
 
-        return None, 0, 0
+    withdrawn = [c['name'] for c in cyclists if c.get('isWithdrawn')]
+    team, total_projected, total_cost = optimizer.solve(
+        previous_team=previous_team, exclude=withdrawn, objective='projected_points')
+    if not team:
+        print(f"No feasible projected team found. Status: {optimizer.last_status}", file=sys.stderr)
+        return None
 
-def select_league_all_star_team(league_data, cyclists):
+    print(f"Projected team: {total_projected:.1f} expected points over {forecast['horizon_stages']} stages", file=sys.stderr)
+    return {
+        'riders': [
+            {
+                'name': rider['name'],
+                'role': rider['role'],
+                'cost': rider['cost'],
+                'points': rider['points'],
+                'projected_points': rider['projected_points']
+            } for rider in team
+        ],
+        'total_projected_points': round(total_projected, 1),
+        'total_points': sum(rider['points'] for rider in team),
+        'total_cost': total_cost,
+        'horizon_stages': forecast['horizon_stages']
+    }
+
+def build_team_scenarios(dream_team):
+    scenarios = [{'label': f"Top {TOP_K_TEAMS} teams", 'top_k': TOP_K_TEAMS}]
+    scenarios += [{'label': f"Budget {budget}", 'max_cost': budget} for budget in BUDGET_SWEEP]
+    # What the dream team loses without each of its riders
+    scenarios += [{'label': f"Without {rider['name']}", 'exclude': [rider['name']]} for rider in dream_team or []]
+    scenarios += [{'label': f"With {name}", 'include': [name]} for name in SCENARIO_FORCE_INCLUDE]
+    scenarios += [{'label': f"Without {name}", 'exclude': [name]} for name in SCENARIO_FORCE_EXCLUDE]
+    return scenarios
+
+def select_league_all_star_team(league_data, cyclists, optimizer=None, previous_team=None):
     # Create a set of all unique riders in the league
     league_riders = set()
     for team in league_data:
         league_riders.update(team['roster'])
 
-    # Filter cyclists to only include those in the league
-    league_cyclists = [c for c in cyclists if c['name'] in league_riders]
-
-    # Create the linear programming problem
-    prob = pulp.LpProblem("League All-Star Team Selection", pulp.LpMaximize)
-
-    # Create binary variables for each cyclist
-    cyclist_vars = pulp.LpVariable.dicts("Cyclist", 
-                                         ((c['name'], c['role']) for c in league_cyclists), 
-                                         cat='Binary')
-
-    # Objective function: maximize total points
-    prob += pulp.lpSum(cyclist['points'] * cyclist_vars[cyclist['name'], cyclist['role']] 
-                       for cyclist in league_cyclists)
-
-    # Constraints
-    constraints = [
-        ("Total cyclists", pulp.lpSum(cyclist_vars) == TOTAL_CYCLISTS),
-        ("Maximum cost", pulp.lpSum(cyclist['cost'] * cyclist_vars[cyclist['name'], cyclist['role']] 
-                                    for cyclist in league_cyclists) <= MAX_COST),
-        ("Sprinters", pulp.lpSum(cyclist_vars[cyclist['name'], cyclist['role']] 
-                                 for cyclist in league_cyclists if cyclist['role'] == 'Sprinter') >= MIN_SPRINTERS),
-        ("All-Rounders", pulp.lpSum(cyclist_vars[cyclist['name'], cyclist['role']] 
-                                    for cyclist in league_cyclists if cyclist['role'] == 'All Rounder') >= MIN_ALL_ROUNDERS),
-        ("Climbers", pulp.lpSum(cyclist_vars[cyclist['name'], cyclist['role']] 
-                                for cyclist in league_cyclists if cyclist['role'] == 'Climber') >= MIN_CLIMBERS),
-        ("Unclassed", pulp.lpSum(cyclist_vars[cyclist['name'], cyclist['role']] 
-                                 for cyclist in league_cyclists if cyclist['role'] == 'Unclassed') >= MIN_UNCLASSED)
-    ]
-
-    # Add constraints to the problem
-    for name, constraint in constraints:
-        prob += constraint, name
-
-    # Solve the problem
-    prob.solve()
+    # Re-solve the shared model restricted to riders picked in the league
+    optimizer = optimizer or TeamOptimizer(cyclists)
+    all_star_team, total_points, total_cost = optimizer.solve(allowed=league_riders, previous_team=previous_team)
 
     # Check if a solution was found
-    if pulp.LpStatus[prob.status] == "Optimal":
-        # Extract the solution
-        all_star_team = []
-        total_points = 0
-        total_cost = 0
-
-        for cyclist in league_cyclists:
-            if cyclist_vars[cyclist['name'], cyclist['role']].value() == 1:
-                all_star_team.append(cyclist)
-                total_points += cyclist['points']
-                total_cost += cyclist['cost']
-
+    if all_star_team:
         return {
             'riders': [
                 {
@@ -437,164 +360,502 @@ def select_league_all_star_team(league_data, cyclists):
             'total_cost': total_cost
         }
     else:
-        print(f"No feasible League All-Star team found. Status: {pulp.LpStatus[prob.status]}", file=sys.stderr)
+        print(f"No feasible League All-Star team found. Status: {optimizer.last_status}", file=sys.stderr)
         return None
 
-def fetch_twitter_league_data():
-    response = requests.get(TWITTER_LEAGUE_URL)
-    soup = BeautifulSoup(response.content, 'html.parser')
-
-    scores = []
-    for li in soup.select('#users .list li'):
-        points = int(li.select_one('p.born b').text.strip())
-        scores.append(points)
-
-    return sorted(scores, reverse=True)
-
 def calculate_rank_and_percentile(all_star_points, league_scores):
-    rank = next(i for i, score in enumerate(league_scores, 1) if score <= all_star_points)
-    percentile = (1 - (rank - 1) / len(league_scores)) * 100
-    return rank, percentile
-
-def format_withdrawal_name(name):
-    name = name.strip()
-    parts = name.split()
-    if len(parts) <= 1:
-        return name.capitalize()
-
-    # List of common name prefixes (in lowercase)
-    prefixes = ['van', 'de', 'der', 'den', 'von', 'le', 'la', 'du', 'des', 'del', 'della', 'di', 'da', 'mac', 'mc']
-
-    # Check if the name is in all caps (indicating it's in "LastName FirstName" format)
-    if parts[0].isupper():
-        # It's in "LastName FirstName" format, so we need to swap
-        last_name = []
-        first_name = []
-        prefix_ended = False
-        for part in parts:
-            if not prefix_ended and part.lower() in prefixes:
-                last_name.append(part.lower().capitalize())
-            elif not prefix_ended:
-                last_name.append(part.capitalize())
-                prefix_ended = True
-            else:
-                first_name.append(part.capitalize())
-        return f"{' '.join(first_name)} {' '.join(last_name)}"
-    else:
-        # It's already in "FirstName LastName" format
-        return ' '.join(part.capitalize() for part in parts)
-    
+    """Rank and percentile of one score in a ScoreIndex or a list of league scores."""
+    from score_index import ScoreIndex
+    index = league_scores if isinstance(league_scores, ScoreIndex) else ScoreIndex(league_scores)
+    ranks, percentiles = index.rank(all_star_points)
+    return int(ranks[0]), float(percentiles[0])
+
+def compare_with_league(teams, index):
+    """Rank every (name, points) pair in `teams` against the comparison league in one lookup."""
+    ranks, percentiles = index.rank([points for _, points in teams])
+    return {
+        'total_participants': len(index),
+        'teams': [
+            {'name': name, 'points': points, 'rank': int(rank), 'percentile': round(float(percentile), 2)}
+            for (name, points), rank, percentile in zip(teams, ranks, percentiles)
+        ],
+    }
+
 def calculate_name_similarity(name1, name2):
     return difflib.SequenceMatcher(None, name1.lower(), name2.lower()).ratio()
 
-def mark_withdrawn_cyclists(cyclists, withdrawals):
-    formatted_withdrawals = [w['rider'] for w in withdrawals]
-    for cyclist in cyclists:
-        cyclist['isWithdrawn'] = any(
-            calculate_name_similarity(cyclist['name'], w) >= 0.70
-            for w in formatted_withdrawals
-        )
+def fold_name(name):
+    """Lowercase and strip accents so 'Rubén Fernández' and 'Ruben Fernandez' compare equal."""
+    decomposed = unicodedata.normalize('NFKD', name.lower())
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+def _name_trigrams(folded):
+    padded = f"  {folded} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def build_name_index(names):
+    index = {'names': names, 'exact': {}, 'tokens': defaultdict(set), 'trigrams': defaultdict(set)}
+    for i, name in enumerate(names):
+        folded = fold_name(name)
+        index['exact'].setdefault(normalize_name(folded), []).append(i)
+        for token in folded.split():
+            index['tokens'][token].add(i)
+        for gram in _name_trigrams(folded):
+            index['trigrams'][gram].add(i)
+    return index
+
+def find_name_matches(index, name, threshold=WITHDRAWAL_MATCH_THRESHOLD):
+    """Return (position, score) for every indexed name similar enough to `name`.
+
+    An exact match on the accent-folded, token-sorted name wins outright. Otherwise only
+    names sharing a token, plus the few with the most shared trigrams, are scored.
+    """
+    folded = fold_name(name)
+    exact = index['exact'].get(normalize_name(folded))
+    if exact:
+        return [(i, 1.0) for i in exact]
+
+    candidates = set()
+    for token in folded.split():
+        candidates.update(index['tokens'].get(token, ()))
+    shared_trigrams = Counter()
+    for gram in _name_trigrams(folded):
+        shared_trigrams.update(index['trigrams'].get(gram, ()))
+    candidates.update(i for i, _ in shared_trigrams.most_common(WITHDRAWAL_MAX_CANDIDATES))
+
+    matches = []
+    for i in candidates:
+        matcher = difflib.SequenceMatcher(None, index['names'][i].lower(), name.lower())
+        if matcher.real_quick_ratio() >= threshold and matcher.quick_ratio() >= threshold:
+            score = matcher.ratio()
+            if score >= threshold:
+                matches.append((i, score))
+    return matches
+
+def mark_withdrawn_cyclists(cyclists, withdrawals, match_cache=None):
+    """Set isWithdrawn (and withdrawalMatch for auditing) on every cyclist.
+
+    match_cache maps a withdrawal name to the cyclists it matched on a previous run;
+    those withdrawals are not re-scored as long as the matched cyclists still exist.
+    """
+    names = [c['name'] for c in cyclists]
+    position = {name: i for i, name in enumerate(names)}
+    index = None
+    best_match = {}
+
+    if match_cache is not None:
+        current = {w['rider'] for w in withdrawals}
+        for rider in list(match_cache):
+            if rider not in current:
+                del match_cache[rider]
+
+    for w in withdrawals:
+        rider = w['rider']
+        cached = match_cache.get(rider) if match_cache is not None else None
+        if cached is not None and all(m['name'] in position for m in cached):
+            matches = [(position[m['name']], m['score']) for m in cached]
+        else:
+            if index is None:
+                index = build_name_index(names)
+            matches = find_name_matches(index, rider)
+            if match_cache is not None:
+                match_cache[rider] = [{'name': names[i], 'score': score} for i, score in matches]
+
+        for i, score in matches:
+            if i not in best_match or score > best_match[i][1]:
+                best_match[i] = (rider, score)
+
+    for i, cyclist in enumerate(cyclists):
+        if i in best_match:
+            rider, score = best_match[i]
+            cyclist['isWithdrawn'] = True
+            cyclist['withdrawalMatch'] = {'rider': rider, 'score': round(score, 3)}
+        else:
+            cyclist['isWithdrawn'] = False
+            cyclist.pop('withdrawalMatch', None)
     return cyclists
 
-def main():
-    try:
-        print("Loading existing data", file=sys.stderr)
-        existing_data = load_existing_data(OUTPUT_FILE)
+def load_race_data(race):
+    return load_existing_data(race['output_file'], race['output_dir'] if OUTPUT_MODE != 'monolithic' else None)
 
-        print(f"Fetching new cyclist data from {CYCLIST_URL}", file=sys.stderr)
-        html_content = fetch_html_content(CYCLIST_URL)
+def write_race_output(race, data):
+    """Validate data against what script.js reads, then write it in OUTPUT_MODE.
 
-        print("Analyzing new cyclist data", file=sys.stderr)
-        new_cyclists = analyze_cyclists(html_content)
+    Files are replaced atomically and only when their content changed, so the
+    site never serves a half-written file.
+    """
+    errors = validate_output(data)
+    if errors:
+        raise ValueError(f"Output does not match what script.js reads: {'; '.join(errors)}")
 
+    if OUTPUT_MODE in ('monolithic', 'both'):
+        print("Writing updated JSON output to file", file=sys.stderr)
+        if write_if_changed(race['output_file'], dumps(data, default=numpy_to_python, indent=True)):
+            print(f"Output saved to {race['output_file']}", file=sys.stderr)
+        else:
+            print(f"Output unchanged, {race['output_file']} not rewritten", file=sys.stderr)
+
+    if OUTPUT_MODE in ('split', 'both'):
+        print("Writing split JSON output", file=sys.stderr)
+        write_split_output(data, race['output_dir'], default=numpy_to_python, write_gzip=OUTPUT_GZIP)
+        print(f"Output saved to {race['output_dir']}/", file=sys.stderr)
+
+def refresh_withdrawals(race, withdrawals=None):
+    """Re-mark withdrawn riders (and re-pick the projected team and transfers) in a race's
+    existing output without re-running the pipeline.
+
+    For when only the withdrawal page changed; withdrawals are fetched unless given.
+    """
+    data = load_race_data(race)
+    if not data.get('cyclists'):
+        raise ValueError(f"No existing data for race {race['id']} to refresh")
+    if withdrawals is None:
+        withdrawals = fetch_withdrawals(race['withdrawals_url']) if race['withdrawals_url'] else []
+    data['withdrawals'] = withdrawals
+    match_cache = data.setdefault('withdrawal_matches', {})
+    data['cyclists'] = mark_withdrawn_cyclists(data['cyclists'], withdrawals, match_cache)
+
+    # Newly withdrawn riders won't score again; the rest of the forecast still holds
+    if data.get('forecast'):
+        for cyclist in data['cyclists']:
+            if cyclist['isWithdrawn']:
+                cyclist['projected_points'] = 0.0
+        data['projected_team'] = select_projected_team(
+            data['cyclists'], TeamOptimizer(data['cyclists']), data['forecast'],
+            previous_team_names(data.get('projected_team')))
+
+    # Transfers sell withdrawn riders first and never buy them, so they are redone from the new marks
+    from transfers import recommend_transfers
+    data['transfer_recommendations'] = recommend_transfers(data['cyclists'], data['league_scores']['current'])
+    # The simulations still count the newly withdrawn riders' points; drop them until the next full run
+    for section in ('league_simulation', 'all_star_simulation'):
+        data.pop(section, None)
+
+    write_race_output(race, data)
+    return data
+
+# Stage outputs named after a section of the output data; write_output merges the ones that were
+# produced, so a section whose stage failed keeps the previous run's value
+OUTPUT_SECTIONS = ('rider_metrics', 'top_50_efficiency', 'ownership_analysis', 'chart_data', 'withdrawals',
+                   'withdrawal_matches', 'forecast', 'league_all_star_team', 'dream_team', 'twitter_league_comparison',
+                   'league_simulation', 'all_star_simulation', 'projected_team', 'transfer_recommendations',
+                   'dream_team_scenarios', 'mvp_history', 'mip_history')
+
+def race_pipeline(race):
+    """(stages, initial values) of one race run, for pipeline.run_pipeline.
+
+    The page fetches are io stages; the league waits for the riders page, whose
+    points tell which stored rosters are still current. The dream team is solved
+    from the scraped riders while the league rosters are still downloading
+    (unless TEAM_OBJECTIVE needs the forecast), and a failed withdrawals or
+    comparison league fetch falls back to what the previous run had.
+    """
+    values = {}
+
+    def load_existing():
+        print("Loading existing data", file=sys.stderr)
+        return {'existing_data': load_race_data(race)}
+
+    def fetch_riders():
+        print(f"Fetching new cyclist data from {race['riders_url']}", file=sys.stderr)
+        new_cyclists = fetch_parsed(race['riders_url'], parse_riders_page, 'riders')
         if not new_cyclists:
             raise ValueError("No new cyclist data was extracted")
-
         print(f"Extracted data for {len(new_cyclists)} cyclists", file=sys.stderr)
+        return {'new_cyclists': new_cyclists}
 
+    def fetch_league(new_cyclists=None):
         print("Fetching league scores and team rosters", file=sys.stderr)
-        new_league_scores = fetch_league_scores()
+        roster_store = RosterStore(race['roster_store_file'])
+        # The riders' points tell which stored rosters no longer add up to their team's points
+        rider_points = {c['name']: c['points'] for c in new_cyclists} if new_cyclists is not None else None
+        league_scores = fetch_league_scores(race['league_url'], roster_store, rider_points)
+        roster_store.save()
+        return {'league_scores': league_scores}
+
+    def fetch_withdrawals_page():
+        print("Fetching withdrawal data", file=sys.stderr)
+        # Not fetch_withdrawals(): an error has to fail the stage for the fallback to apply
+        withdrawals = fetch_parsed(race['withdrawals_url'], parse_withdrawals, 'withdrawals')
+        print(f"Fetched {len(withdrawals)} withdrawals", file=sys.stderr)
+        return {'withdrawals': withdrawals}
 
-        print("Updating historical data", file=sys.stderr)
-        updated_data = update_historical_data(existing_data, new_cyclists, new_league_scores)
+    def previous_withdrawals(values):
+        # Withdrawn riders stay withdrawn, so the last list fetched is still right as far as it goes
+        return {'withdrawals': values.get('existing_data', {}).get('withdrawals', [])}
 
-        print("Creating top 50 efficiency data", file=sys.stderr)
-        updated_data['top_50_efficiency'] = create_top_50_efficiency_data(updated_data['cyclists'])
+    def fetch_twitter_league():
+        print("Fetching Twitter League data", file=sys.stderr)
+        return {'twitter_league_index': fetch_twitter_league_data(race['twitter_league_url'], race['score_index_file'])}
 
-        print("Selecting dream team (optimized)", file=sys.stderr)
-        dream_team, total_points, total_cost = select_dream_team_optimized(updated_data['cyclists'])
+    def saved_twitter_league(values):
+        from score_index import ScoreIndex
+        index = ScoreIndex.load(race['score_index_file'])
+        # Everyone would rank 1st in an empty league; leave the comparison out instead
+        return {'twitter_league_index': index} if len(index) else {}
 
-        print("Selecting League All-Star Team", file=sys.stderr)
-        league_all_star_team = select_league_all_star_team(updated_data['league_scores']['current'], updated_data['cyclists'])
+    def update_history(existing_data, new_cyclists, league_scores):
+        from history_store import HistoryStore
+        print("Updating historical data", file=sys.stderr)
+        history_store = HistoryStore(race['history_store_dir'])
+        data = update_historical_data(existing_data, new_cyclists, league_scores, history_store)
+        history_store.save()
+        return {'data': data, 'history_store': history_store}
+
+    def rider_metrics(data, history_store):
+        from analytics import RiderTable
+        print("Building rider table and metrics", file=sys.stderr)
+        rider_keys = [normalize_name(c['name']) for c in data['cyclists']]
+        rider_table = RiderTable(data['cyclists'], history_store.rider_matrix(rider_keys, HISTORY_RETENTION_DAYS))
+        print("Creating top 50 efficiency data", file=sys.stderr)
+        return {
+            'rider_table': rider_table,
+            'rider_metrics': rider_table.metrics(),
+            'top_50_efficiency': create_top_50_efficiency_data(data['cyclists'], rider_table),
+        }
 
-        if league_all_star_team:
-            updated_data['league_all_star_team'] = league_all_star_team
-            print(f"League All-Star Team selected. Total points: {league_all_star_team['total_points']}, Total cost: {league_all_star_team['total_cost']}", file=sys.stderr)
+    def ownership_analysis(data, rider_table):
+        from ownership_analysis import analyze_ownership
+        print("Analysing league ownership and roster overlap", file=sys.stderr)
+        return {'ownership_analysis': analyze_ownership(rider_table, data['league_scores']['current'])}
 
-            print("Fetching Twitter League data", file=sys.stderr)
-            twitter_league_scores = fetch_twitter_league_data()
+    def chart_data(data, rider_table):
+        from chart_data import build_chart_data
+        print("Precomputing chart data", file=sys.stderr)
+        return {'chart_data': build_chart_data(
+            rider_table, data['league_scores']['history'], data['league_scores']['current'])}
 
-            all_star_points = league_all_star_team['total_points']
-            rank, percentile = calculate_rank_and_percentile(all_star_points, twitter_league_scores)
+    def mark_withdrawn(data, withdrawals):
+        print("Marking withdrawn cyclists", file=sys.stderr)
+        match_cache = dict(data.get('withdrawal_matches', {}))
+        mark_withdrawn_cyclists(data['cyclists'], withdrawals, match_cache)
+        return {'withdrawn': [c['isWithdrawn'] for c in data['cyclists']], 'withdrawal_matches': match_cache}
 
-            updated_data['league_all_star_team']['twitter_league_comparison'] = {
-                'rank': rank,
-                'percentile': percentile,
-                'total_participants': len(twitter_league_scores)
-            }
+    def forecast(data, rider_table, withdrawals, withdrawn):
+        # withdrawn orders this after mark_withdrawn: forecast_points reads isWithdrawn
+        print("Forecasting rider points", file=sys.stderr)
+        return {'forecast': forecast_points(data['cyclists'], rider_table, withdrawals, race['stages'])}
 
-            print(f"All-Star Team Rank in Twitter League: {rank}", file=sys.stderr)
-            print(f"All-Star Team Percentile in Twitter League: {percentile:.2f}%", file=sys.stderr)
+    def dream_team(existing_data, new_cyclists=None, data=None, forecast=None):
+        print("Selecting dream team (optimized)", file=sys.stderr)
+        # Today's points are already in the scraped riders; projected points only exist on the merged ones
+        optimizer = TeamOptimizer(new_cyclists if new_cyclists is not None else data['cyclists'])
+        selection = select_dream_team_optimized(
+            optimizer.cyclists, optimizer, previous_team_names(existing_data.get('dream_team')))
+        return {'optimizer': optimizer, 'dream_team_selection': selection}
+
+    def all_star_team(existing_data, league_scores, optimizer):
+        print("Selecting League All-Star Team", file=sys.stderr)
+        team = select_league_all_star_team(league_scores, optimizer.cyclists, optimizer,
+                                           previous_team_names(existing_data.get('league_all_star_team')))
+        if team:
+            print(f"League All-Star Team selected. Total points: {team['total_points']}, Total cost: {team['total_cost']}", file=sys.stderr)
         else:
-            updated_data['league_all_star_team'] = None
             print("Failed to select League All-Star Team", file=sys.stderr)
+        return {'league_all_star_team': team}
+
+    def dream_team_history(data, dream_team_selection):
+        team, total_points, total_cost = dream_team_selection
+        if not team:
+            return {'dream_team': None}
+        point_history = {c['name']: c['pointHistory'] for c in data['cyclists']}
+        return {'dream_team': {
+            'riders': [
+                {
+                    'name': rider['name'],
+                    'role': rider['role'],
+                    'cost': rider['cost'],
+                    'points': rider['points'],
+                    'pointHistory': point_history.get(rider['name'], [])
+                } for rider in team
+            ],
+            'total_points': total_points,
+            'total_cost': total_cost
+        }}
 
-        if dream_team:
-            updated_data['dream_team'] = {
-                'riders': [
-                    {
-                        'name': rider['name'],
-                        'role': rider['role'],
-                        'cost': rider['cost'],
-                        'points': rider['points'],
-                        'pointHistory': rider['pointHistory']
-                    } for rider in dream_team
-                ],
-                'total_points': total_points,
-                'total_cost': total_cost
-            }
-        else:
-            updated_data['dream_team'] = None
+    def twitter_league_comparison(twitter_league_index, league_scores, dream_team_selection=None,
+                                  league_all_star_team=None):
+        teams = [(team['name'], team['points']) for team in league_scores]
+        if dream_team_selection and dream_team_selection[0]:
+            teams.append(('Dream Team', dream_team_selection[1]))
+        if league_all_star_team:
+            teams.append(('League All-Star Team', league_all_star_team['total_points']))
+        comparison = compare_with_league(teams, twitter_league_index)
 
+        if league_all_star_team:
+            all_star = comparison['teams'][-1]
+            league_all_star_team['twitter_league_comparison'] = {
+                'rank': all_star['rank'],
+                'percentile': all_star['percentile'],
+                'total_participants': comparison['total_participants']
+            }
+            print(f"All-Star Team Rank in Twitter League: {all_star['rank']}", file=sys.stderr)
+            print(f"All-Star Team Percentile in Twitter League: {all_star['percentile']:.2f}%", file=sys.stderr)
+        return {'twitter_league_comparison': comparison}
+
+    def league_simulation(rider_table, league_scores, forecast, withdrawn, league_all_star_team=None,
+                          twitter_league_index=None):
+        from league_simulation import simulate_league
+        print(f"Simulating league outcomes ({SIMULATIONS} runs)", file=sys.stderr)
+        league, field = simulate_league(
+            rider_table, league_scores, forecast['horizon_stages'], withdrawn, league_all_star_team,
+            twitter_league_index.scores if twitter_league_index is not None else None)
+        return {'league_simulation': league, 'all_star_simulation': field}
+
+    def projected_team(data, forecast):
+        print("Selecting projected team", file=sys.stderr)
+        return {'projected_team': select_projected_team(
+            data['cyclists'], TeamOptimizer(data['cyclists']), forecast,
+            previous_team_names(data.get('projected_team')))}
+
+    def transfer_recommendations(data, forecast, withdrawn):
+        # forecast sets the projected_points the swaps are valued by
+        from transfers import recommend_transfers
+        print("Recommending transfers for league teams", file=sys.stderr)
+        return {'transfer_recommendations': recommend_transfers(data['cyclists'], data['league_scores']['current'])}
+
+    def team_scenarios(optimizer, dream_team_selection):
+        print("Solving dream team scenarios", file=sys.stderr)
+        scenarios = build_team_scenarios(dream_team_selection[0])
+        results = run_scenarios(optimizer, scenarios)
+        print(f"Solved {len(scenarios)} dream team scenarios", file=sys.stderr)
+        return {'dream_team_scenarios': results}
+
+    def mvp_mip(data, rider_table):
         print("Calculating MVP and MIP", file=sys.stderr)
-        updated_data, mvp, mip = calculate_mvp_mip(updated_data['cyclists'], updated_data)
-
+        data, mvp, mip = calculate_mvp_mip(data['cyclists'], data, rider_table)
         print(f"MVP: {mvp['name']} (Points added: {mvp['points_added']})", file=sys.stderr)
         print(f"MIP: {mip['name']} ({'Points gained' if mip['from_zero'] else 'Percentage increase'}: {mip['percentage_increase']}{'%' if not mip['from_zero'] else ''})", file=sys.stderr)
+        return {'mvp_history': data['mvp_history'], 'mip_history': data['mip_history']}
 
-        print("Fetching withdrawal data", file=sys.stderr)
-        withdrawals = fetch_withdrawals()
-        updated_data['withdrawals'] = withdrawals
-        print(f"Fetched {len(withdrawals)} withdrawals", file=sys.stderr)
-
-        print("Marking withdrawn cyclists", file=sys.stderr)
-        updated_data['cyclists'] = mark_withdrawn_cyclists(updated_data['cyclists'], withdrawals)
-   
+    def write_output(data, **sections):
+        data.update((key, sections[key]) for key in OUTPUT_SECTIONS if key in sections)
         print(f"Current working directory: {os.getcwd()}", file=sys.stderr)
-        try:
-            print("Writing updated JSON output to file", file=sys.stderr)
-            with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-                json.dump(updated_data, f, default=numpy_to_python, ensure_ascii=False, indent=2)
-
-            print(f"Script completed successfully. Output saved to {OUTPUT_FILE}", file=sys.stderr)
-        except IOError as e:
-            print(f"Error writing to file: {e}", file=sys.stderr)
-        except Exception as e:
-            print(f"Unexpected error while writing file: {e}", file=sys.stderr)
+        write_race_output(race, data)
+
+    if TEAM_OBJECTIVE == 'points':
+        dream_team_inputs = ('existing_data', 'new_cyclists')
+    else:
+        dream_team_inputs = ('existing_data', 'data', 'forecast')
+
+    stages = [
+        Stage('load_existing', load_existing, outputs=('existing_data',)),
+        Stage('fetch_riders', fetch_riders, outputs=('new_cyclists',), io=True),
+        Stage('fetch_league', fetch_league, outputs=('league_scores',), optional=('new_cyclists',), io=True),
+        Stage('update_history', update_history, ('existing_data', 'new_cyclists', 'league_scores'),
+              ('data', 'history_store')),
+        Stage('dream_team', dream_team, dream_team_inputs, ('optimizer', 'dream_team_selection')),
+        Stage('all_star_team', all_star_team, ('existing_data', 'league_scores', 'optimizer'),
+              ('league_all_star_team',)),
+        Stage('rider_metrics', rider_metrics, ('data', 'history_store'),
+              ('rider_table', 'rider_metrics', 'top_50_efficiency')),
+        Stage('ownership_analysis', ownership_analysis, ('data', 'rider_table'), ('ownership_analysis',)),
+        Stage('chart_data', chart_data, ('data', 'rider_table'), ('chart_data',)),
+        Stage('mark_withdrawn', mark_withdrawn, ('data', 'withdrawals'), ('withdrawn', 'withdrawal_matches')),
+        Stage('forecast', forecast, ('data', 'rider_table', 'withdrawals', 'withdrawn'), ('forecast',)),
+        Stage('dream_team_history', dream_team_history, ('data', 'dream_team_selection'), ('dream_team',)),
+        Stage('league_simulation', league_simulation, ('rider_table', 'league_scores', 'forecast', 'withdrawn'),
+              ('league_simulation', 'all_star_simulation'), optional=('league_all_star_team', 'twitter_league_index')),
+        Stage('projected_team', projected_team, ('data', 'forecast'), ('projected_team',)),
+        Stage('transfer_recommendations', transfer_recommendations, ('data', 'forecast', 'withdrawn'),
+              ('transfer_recommendations',)),
+        Stage('team_scenarios', team_scenarios, ('optimizer', 'dream_team_selection'), ('dream_team_scenarios',)),
+        Stage('mvp_mip', mvp_mip, ('data', 'rider_table'), ('mvp_history', 'mip_history')),
+        Stage('write_output', write_output, ('data',), optional=OUTPUT_SECTIONS),
+    ]
+    if race['withdrawals_url']:
+        stages.append(Stage('fetch_withdrawals', fetch_withdrawals_page, outputs=('withdrawals',), io=True,
+                            fallback=previous_withdrawals))
+    else:
+        values['withdrawals'] = []
+    if race['twitter_league_url']:
+        stages.append(Stage('fetch_twitter_league', fetch_twitter_league, outputs=('twitter_league_index',),
+                            io=True, fallback=saved_twitter_league))
+        stages.append(Stage('twitter_league_comparison', twitter_league_comparison,
+                            ('twitter_league_index', 'league_scores'), ('twitter_league_comparison',),
+                            optional=('dream_team_selection', 'league_all_star_team')))
+    return stages, values
+
+def run_race(race):
+    """Run the whole pipeline for one resolved races.py entry.
+
+    Returns 'ok', 'partial' when the output was written but some stages failed
+    or were skipped (their sections keep the previous run's values), or 'failed'.
+    """
+    return run_race_stages(race)[0]
+
+def run_race_stages(race):
+    """run_race, returning (status, names of the stages that failed or were skipped)."""
+    report = RunReport(counters={'http': cache_stats, 'solver': solver_stats},
+                       profile=PROFILE_MODE, profile_file=race['profile_file'], name=race['id'])
+    status = 'failed'
+    not_ok = []
+    print(f"Processing race {race['id']}", file=sys.stderr)
+    try:
+        stages, values = race_pipeline(race)
+        _, statuses = run_pipeline(stages, report, values, PIPELINE_IO_WORKERS)
+        not_ok = [name for name, stage_status in statuses.items() if stage_status != 'ok']
+        if statuses.get('write_output') == 'ok':
+            status = 'partial' if not_ok else 'ok'
+            print("Script completed successfully" if not not_ok else
+                  f"Output written without {', '.join(not_ok)}", file=sys.stderr)
+        else:
+            failed = [name for name, stage_status in statuses.items() if stage_status == 'failed']
+            print(f"No output written for race {race['id']}: {', '.join(failed)} failed", file=sys.stderr)
     except Exception as e:
-        print(f"An error occurred: {str(e)}", file=sys.stderr)
+        print(f"An error occurred in race {race['id']}: {str(e)}", file=sys.stderr)
         print("Traceback:", file=sys.stderr)
         traceback.print_exc(file=sys.stderr)
+    finally:
+        os.makedirs(os.path.dirname(race['run_report_file']) or '.', exist_ok=True)
+        report.write(race['run_report_file'], status)
+    return status, not_ok
+
+def _run_race_worker(race):
+    try:
+        return run_race(race)
+    finally:
+        log_cache_stats()
+        close_session()
+
+def run_races(races, processes=RACE_PROCESSES):
+    """Run every race and return {race id: status}.
+
+    Races are independent, so with more than one worker they run in separate
+    processes; each keeps its own HTTP session but they share the on-disk cache.
+    In-process runs share a single session.
+    """
+    if processes is None:
+        processes = min(len(races), os.cpu_count() or 1)
+    if processes <= 1 or len(races) <= 1:
+        return {race['id']: run_race(race) for race in races}
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        statuses = executor.map(_run_race_worker, races)
+        return dict(zip((race['id'] for race in races), statuses))
+
+def main(argv=None):
+    """Process the races named on the command line, or every race in the registry."""
+    try:
+        races = select_races(sys.argv[1:] if argv is None else argv)
+    except ValueError as e:
+        print(f"Invalid race selection: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    try:
+        statuses = run_races(races)
+    finally:
+        prune_cache()
+        log_cache_stats()
+        close_session()
+
+    # A partial run still wrote its output, so it doesn't fail the command
+    failed = [race_id for race_id, status in statuses.items() if status == 'failed']
+    partial = [race_id for race_id, status in statuses.items() if status == 'partial']
+    if len(races) > 1:
+        print(f"Processed {len(races)} races, {len(failed)} failed{': ' + ', '.join(failed) if failed else ''}"
+              f"{f', {len(partial)} partial: ' + ', '.join(partial) if partial else ''}", file=sys.stderr)
+    if failed:
         sys.exit(1)
 
 if __name__ == '__main__':
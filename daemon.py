@@ -0,0 +1,175 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import traceback
+from datetime import datetime, timezone
+import cyclist_analyzer as ca
+from config import POLL_INTERVAL, POLL_STATUS_FILE
+from races import select_races
+from http_client import fetch_parsed, prune_cache, log_cache_stats, close_session
+
+# Pages whose change re-runs the whole pipeline; any other watched page has a cheaper refresh
+FULL_RUN_PAGES = ('riders', 'league')
+
+def watched_pages(race):
+    """{name: (url, parser, parser name)} for the pages polled for a race.
+
+    Change is judged on the parsed result, not the raw HTML, so ads or tokens
+    in the markup don't trigger runs; the HTTP cache keeps unchanged polls to a
+    conditional GET per page.
+    """
+    pages = {
+        'riders': (race['riders_url'], ca.parse_riders_page, 'riders'),
+        'league': (race['league_url'], ca.parse_league_points, 'league_points'),
+    }
+    if race['withdrawals_url']:
+        pages['withdrawals'] = (race['withdrawals_url'], ca.parse_withdrawals, 'withdrawals')
+    return pages
+
+def fingerprint(result):
+    return hashlib.sha256(json.dumps(result, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def new_state():
+    return {
+        'fingerprints': {},
+        'last_checked': None,
+        'last_source_change': None,
+        'last_output_write': None,
+        'pending': [],
+        'stale_since': None,
+        'full_runs': 0,
+        'partial_runs': 0,
+        'degraded_stages': [],
+        'errors': 0,
+        'last_error': None,
+    }
+
+def poll_race(race, state, now=None):
+    """Check a race's pages once and re-run whatever their changes affect.
+
+    Returns 'full', 'withdrawals' or None for the work done. Fingerprints are
+    only recorded once the output is written, so a failed run is retried on
+    the next poll. A partial run wrote its output too; the stages it ran
+    without are kept in state['degraded_stages'] for the status file.
+    """
+    now = time.time() if now is None else now
+    fingerprints = {name: fingerprint(fetch_parsed(url, parse, parser_name))
+                    for name, (url, parse, parser_name) in watched_pages(race).items()}
+    state['last_checked'] = now
+    changed = [name for name in fingerprints if fingerprints[name] != state['fingerprints'].get(name)]
+    if not changed:
+        return None
+
+    if state['stale_since'] is None:
+        state['stale_since'] = now
+    state['pending'] = changed
+    print(f"[{race['id']}] Source changed: {', '.join(changed)}", file=sys.stderr)
+
+    if any(name in FULL_RUN_PAGES for name in changed):
+        status, degraded = ca.run_race_stages(race)
+        if status == 'failed':
+            raise RuntimeError(f"Pipeline run failed for race {race['id']}")
+        action = 'full'
+        state['full_runs'] += 1
+        state['degraded_stages'] = degraded
+    else:
+        ca.refresh_withdrawals(race)
+        action = 'withdrawals'
+        state['partial_runs'] += 1
+
+    state['fingerprints'] = fingerprints
+    state['last_source_change'] = state['stale_since']
+    state['last_output_write'] = time.time()
+    state['pending'] = []
+    state['stale_since'] = None
+    return action
+
+def _timestamp(seconds):
+    return None if seconds is None else datetime.fromtimestamp(seconds, timezone.utc).isoformat(timespec='seconds')
+
+def race_status(state, now=None):
+    """Freshness of one race's output.
+
+    staleness_seconds bounds how far the output may lag the sources: the time
+    since the last check when it is up to date, otherwise since the unprocessed
+    change was first seen.
+    """
+    now = time.time() if now is None else now
+    since = state['stale_since'] or state['last_checked']
+    return {
+        'up_to_date': state['stale_since'] is None and state['last_output_write'] is not None,
+        'staleness_seconds': None if since is None else round(now - since, 1),
+        'last_checked': _timestamp(state['last_checked']),
+        'last_source_change': _timestamp(state['last_source_change']),
+        'last_output_write': _timestamp(state['last_output_write']),
+        'pending_changes': state['pending'],
+        'full_runs': state['full_runs'],
+        'partial_runs': state['partial_runs'],
+        'degraded_stages': state['degraded_stages'],
+        'errors': state['errors'],
+        'last_error': state['last_error'],
+    }
+
+def write_status(states, path=POLL_STATUS_FILE):
+    now = time.time()
+    status = {'updated_at': _timestamp(now),
+              'races': {race_id: race_status(state, now) for race_id, state in states.items()}}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(status, f, indent=2)
+    os.replace(tmp_path, path)
+    return status
+
+def run_daemon(races, interval=POLL_INTERVAL, max_polls=None, status_file=POLL_STATUS_FILE):
+    """Poll every race each `interval` seconds until interrupted (or for max_polls rounds).
+
+    The first round always runs the full pipeline so the output matches what
+    is being watched. Races are polled one after another on a shared HTTP session.
+    """
+    states = {race['id']: new_state() for race in races}
+    polls = 0
+    try:
+        while max_polls is None or polls < max_polls:
+            started = time.monotonic()
+            for race in races:
+                state = states[race['id']]
+                try:
+                    poll_race(race, state)
+                except Exception as e:
+                    state['errors'] += 1
+                    state['last_error'] = f"{type(e).__name__}: {e}"
+                    print(f"[{race['id']}] Poll failed: {state['last_error']}", file=sys.stderr)
+                    traceback.print_exc(file=sys.stderr)
+            polls += 1
+            status = write_status(states, status_file)
+            for race_id, race_state in status['races'].items():
+                print(f"[{race_id}] {'up to date' if race_state['up_to_date'] else 'stale'}, "
+                      f"staleness {race_state['staleness_seconds']}s", file=sys.stderr)
+            prune_cache()
+            if max_polls is None or polls < max_polls:
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+    except KeyboardInterrupt:
+        print("Stopping daemon", file=sys.stderr)
+    finally:
+        log_cache_stats()
+        close_session()
+    return states
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Poll the race pages and update the output when they change")
+    parser.add_argument('races', nargs='*', help="race ids from config.RACES (default: all)")
+    parser.add_argument('--interval', type=float, default=POLL_INTERVAL, help=f"seconds between checks (default {POLL_INTERVAL})")
+    parser.add_argument('--polls', type=int, default=None, help="stop after this many checks")
+    parser.add_argument('--status-file', default=POLL_STATUS_FILE, help=f"freshness report path (default {POLL_STATUS_FILE})")
+    args = parser.parse_args(argv)
+    try:
+        races = select_races(args.races)
+    except ValueError as e:
+        parser.error(str(e))
+    run_daemon(races, args.interval, args.polls, args.status_file)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Local stand-in for velogames.com and lavuelta.es serving the recorded pages in fixtures/.
+
+Used by benchmark.py and for offline runs of the pipeline:
+
+    python fixture_server.py [port]
+"""
+import os
+import re
+import sys
+import time
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+ROSTER_FIXTURES = 4  # roster-<n>.html files, reused round-robin for scaled leagues
+LEAGUE_ID = '1'
+TWITTER_LEAGUE_ID = '2'
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+_RIDER_LINK = re.compile(r'(<a href="riderprofile\.php\?rid=)(\d+)(">)([^<]+)(</a>)')
+
+def scale_riders_page(html_content, factor):
+    """Repeat the rider rows `factor` times, numbering the copies so rider names stay unique."""
+    head, rest = html_content.split('<tbody>', 1)
+    body, tail = rest.split('</tbody>', 1)
+    copies = [body]
+    for k in range(1, factor):
+        copies.append(_RIDER_LINK.sub(lambda m: f"{m[1]}{int(m[2]) + k * 10000}{m[3]}{m[4]} {k + 1}{m[5]}", body))
+    return f"{head}<tbody>{''.join(copies)}</tbody>{tail}"
+
+def scale_league_page(html_content, factor):
+    """Repeat the league entries `factor` times with distinct team ids and names."""
+    head, rest = html_content.split('<ul class="list">', 1)
+    body, tail = rest.split('</ul>', 1)
+    entries = re.findall(r'<li>.*?</li>', body, flags=re.S)
+    scaled = []
+    for k in range(factor):
+        for i, entry in enumerate(entries):
+            tid = k * len(entries) + i
+            entry = re.sub(r'tid=\d+', f'tid={tid}', entry)
+            if k:
+                entry = re.sub(r'(<h3 class="name"><a [^>]*>)([^<]+)', lambda m: f"{m[1]}{m[2]} {k + 1}", entry)
+            scaled.append(entry)
+    return f'{head}<ul class="list">\n' + '\n'.join(scaled) + f'\n</ul>{tail}'
+
+class FixtureSite:
+    """The pages served by the stand-in server, optionally scaled up synthetically."""
+
+    def __init__(self, rider_factor=1, team_factor=1):
+        self.pages = {
+            '/riders.php': scale_riders_page(read_fixture('riders.html'), rider_factor),
+            f'/leaguescores.php?league={LEAGUE_ID}': scale_league_page(read_fixture('league.html'), team_factor),
+            f'/leaguescores.php?league={TWITTER_LEAGUE_ID}': read_fixture('twitter_league.html'),
+            '/withdrawal': read_fixture('withdrawals.html'),
+        }
+        self.rosters = [read_fixture(f'roster-{i}.html') for i in range(ROSTER_FIXTURES)]
+        self.lock = threading.Lock()
+
+    def set_page(self, path, html_content):
+        with self.lock:
+            self.pages[path] = html_content
+
+    def get(self, path):
+        url = urlsplit(path)
+        if url.path == '/teamroster.php':
+            tid = int(parse_qs(url.query).get('tid', ['0'])[0])
+            return self.rosters[tid % len(self.rosters)]
+        key = url.path + (f'?league={parse_qs(url.query)["league"][0]}' if 'league' in parse_qs(url.query) else '')
+        with self.lock:
+            return self.pages.get(key)
+
+def serve_fixtures(site=None, latency=0.0, port=0):
+    """Start the stand-in server in a daemon thread; return (server, base_url).
+
+    latency adds a fixed delay to every response to mimic the real sites. Responses
+    carry an ETag and honour If-None-Match so the HTTP cache can be exercised.
+    """
+    site = site or FixtureSite()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if latency:
+                time.sleep(latency)
+            html_content = site.get(self.path)
+            if html_content is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = html_content.encode('utf-8')
+            etag = '"%s"' % hashlib.sha1(body).hexdigest()
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('ETag', etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+def fixture_race(base_url, race_id='fixtures'):
+    """A RACES registry entry (see config.py) pointing at a stand-in server."""
+    return {
+        'id': race_id,
+        'velogames_url': f"{base_url}/",
+        'league_id': LEAGUE_ID,
+        'twitter_league_id': TWITTER_LEAGUE_ID,
+        'withdrawals_url': f"{base_url}/withdrawal",
+    }
+
+if __name__ == '__main__':
+    server, base_url = serve_fixtures(port=int(sys.argv[1]) if len(sys.argv) > 1 else 8000)
+    print(f"Serving fixtures at {base_url}", file=sys.stderr)
+    print(f"Registry entry: {fixture_race(base_url)!r}", file=sys.stderr)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,202 @@
+import os
+import json
+import bisect
+import numpy as np
+from config import HISTORY_STORE_RETENTION_DAYS
+
+INDEX_FILE = 'index.json'
+ARRAYS = ('rider_points', 'team_points', 'team_rosters')
+
+def _keep_last(valid, count):
+    """Mask of the last `count` True values in each row of `valid` (all of them when count is None)."""
+    if count is None:
+        return valid
+    from_end = np.cumsum(valid[:, ::-1], axis=1)[:, ::-1]
+    return valid & (from_end <= count)
+
+class HistoryStore:
+    """Rider and league point history as dense entity x date matrices on disk.
+
+    The date axis, row keys and distinct rosters live in index.json; the points
+    are float64 .npy matrices (NaN where an entity has no value that day), loaded
+    memory-mapped. Rider rows are keyed by normalized name, team rows by team
+    name, and each team's roster is stored once and referenced by index per day
+    (-1 when the day has none). index.json is written last, so a save either
+    lands completely or not at all. The store is a cache, not published output:
+    a lost store is re-seeded from the history in the JSON output.
+    """
+
+    def __init__(self, directory, retention_days=HISTORY_STORE_RETENTION_DAYS):
+        self.directory = directory
+        self.retention_days = retention_days
+        self.generation = 0
+        self.dates = []
+        self.rider_keys = []
+        self.team_names = []
+        self.rosters = []
+        self.rider_points = np.empty((0, 0))
+        self.team_points = np.empty((0, 0))
+        self.team_rosters = np.empty((0, 0), dtype=np.int32)
+
+        index_path = os.path.join(directory, INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            self.generation = index['generation']
+            self.dates = index['dates']
+            self.rider_keys = index['riders']
+            self.team_names = index['teams']
+            self.rosters = index['rosters']
+            for name in ARRAYS:
+                setattr(self, name, np.load(self._array_path(name, self.generation), mmap_mode='r'))
+
+        self._rider_rows = {key: i for i, key in enumerate(self.rider_keys)}
+        self._team_rows = {name: i for i, name in enumerate(self.team_names)}
+        self._roster_ids = {json.dumps(roster, sort_keys=True): i for i, roster in enumerate(self.rosters)}
+
+    @property
+    def empty(self):
+        return not self.dates
+
+    def _array_path(self, name, generation):
+        return os.path.join(self.directory, f"{name}.{generation}.npy")
+
+    def _date_column(self, date):
+        """Column index for `date`, inserting an empty column in date order if needed."""
+        i = bisect.bisect_left(self.dates, date)
+        if i < len(self.dates) and self.dates[i] == date:
+            return i
+        self.dates.insert(i, date)
+        self.rider_points = np.insert(self.rider_points, i, np.nan, axis=1)
+        self.team_points = np.insert(self.team_points, i, np.nan, axis=1)
+        self.team_rosters = np.insert(self.team_rosters, i, -1, axis=1)
+        return i
+
+    def _rows(self, keys, rows, key_list, arrays):
+        """Row index per key, appending empty rows for new keys to the named arrays."""
+        new_keys = [key for key in dict.fromkeys(keys) if key not in rows]
+        if new_keys:
+            for key in new_keys:
+                rows[key] = len(key_list)
+                key_list.append(key)
+            for name, fill in arrays:
+                values = getattr(self, name)
+                padding = np.full((len(new_keys), len(self.dates)), fill, dtype=values.dtype)
+                setattr(self, name, np.concatenate([values, padding]))
+        return np.array([rows[key] for key in keys], dtype=np.intp)
+
+    def _roster_id(self, roster):
+        if roster is None:
+            return -1
+        key = json.dumps(roster, sort_keys=True)
+        if key not in self._roster_ids:
+            self._roster_ids[key] = len(self.rosters)
+            self.rosters.append(roster)
+        return self._roster_ids[key]
+
+    def record_riders(self, date, keys, points):
+        """Set the points of the riders identified by `keys` on `date`."""
+        column = self._date_column(date)
+        rows = self._rows(keys, self._rider_rows, self.rider_keys, [('rider_points', np.nan)])
+        self.rider_points = np.array(self.rider_points)
+        self.rider_points[rows, column] = np.asarray(points, dtype=float)
+
+    def record_league(self, date, league_scores):
+        """Set every team's points, and roster reference when given, on `date`."""
+        column = self._date_column(date)
+        rows = self._rows([team['name'] for team in league_scores], self._team_rows, self.team_names,
+                          [('team_points', np.nan), ('team_rosters', -1)])
+        self.team_points = np.array(self.team_points)
+        self.team_rosters = np.array(self.team_rosters)
+        self.team_points[rows, column] = [team['points'] for team in league_scores]
+        self.team_rosters[rows, column] = [self._roster_id(team.get('roster')) for team in league_scores]
+
+    def import_history(self, cyclists, league_history, key):
+        """Load JSON-shaped history (pointHistory lists and league_scores.history) into the store."""
+        by_date = {}
+        for cyclist in cyclists:
+            for entry in cyclist.get('pointHistory', []):
+                by_date.setdefault(entry['date'], ([], []))
+                by_date[entry['date']][0].append(key(cyclist['name']))
+                by_date[entry['date']][1].append(entry['points'])
+        for date, (keys, points) in sorted(by_date.items()):
+            self.record_riders(date, keys, points)
+        for entry in league_history:
+            self.record_league(entry['date'], entry['scores'])
+
+    def rider_matrix(self, keys, entries=None):
+        """(dates, matrix) of the riders' points, one row per key (NaN rows for unknown keys).
+
+        With `entries`, only each rider's last `entries` recorded values are kept,
+        as in the JSON pointHistory lists, and dates no rider has a value on are dropped.
+        """
+        matrix = np.full((len(keys), len(self.dates)), np.nan)
+        known = [i for i, key in enumerate(keys) if key in self._rider_rows]
+        if known:
+            matrix[known] = self.rider_points[[self._rider_rows[keys[i]] for i in known]]
+        valid = _keep_last(~np.isnan(matrix), entries)
+        matrix[~valid] = np.nan
+        columns = valid.any(axis=0)
+        return [date for date, used in zip(self.dates, columns) if used], matrix[:, columns]
+
+    def export(self, cyclists, key, entries=None):
+        """JSON-shaped history for the front end: sets each cyclist's pointHistory and
+        returns league_scores.history, both limited to the last `entries` values."""
+        dates, matrix = self.rider_matrix([key(c['name']) for c in cyclists], entries)
+        # tolist() up front: iterating numpy scalars is several times slower
+        for cyclist, row, valid in zip(cyclists, matrix.tolist(), (~np.isnan(matrix)).tolist()):
+            cyclist['pointHistory'] = [{'date': date, 'points': value}
+                                       for date, value, ok in zip(dates, row, valid) if ok]
+
+        team_points = np.asarray(self.team_points)
+        team_rosters = np.asarray(self.team_rosters)
+        days = np.flatnonzero((~np.isnan(team_points)).any(axis=0))
+        if entries is not None:
+            days = days[-entries:]
+        history = []
+        for column in days:
+            rows = np.flatnonzero(~np.isnan(team_points[:, column]))
+            # Highest points first; ties keep the order teams were first recorded in
+            rows = rows[np.argsort(-team_points[rows, column], kind='stable')]
+            scores = []
+            for row in rows:
+                team = {'name': self.team_names[row], 'points': int(team_points[row, column])}
+                roster = team_rosters[row, column]
+                if roster >= 0:
+                    team['roster'] = self.rosters[roster]
+                scores.append(team)
+            history.append({'date': self.dates[column], 'scores': scores})
+        return history
+
+    def _trim(self):
+        if self.retention_days is None or len(self.dates) <= self.retention_days:
+            return
+        drop = len(self.dates) - self.retention_days
+        self.dates = self.dates[drop:]
+        for name in ARRAYS:
+            setattr(self, name, np.asarray(getattr(self, name))[:, drop:])
+
+    def save(self):
+        self._trim()
+        os.makedirs(self.directory, exist_ok=True)
+        previous, generation = self.generation, self.generation + 1
+        for name in ARRAYS:
+            np.save(self._array_path(name, generation), np.asarray(getattr(self, name)))
+
+        index = {
+            'generation': generation,
+            'dates': self.dates,
+            'riders': self.rider_keys,
+            'teams': self.team_names,
+            'rosters': self.rosters,
+        }
+        index_path = os.path.join(self.directory, INDEX_FILE)
+        with open(f"{index_path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(f"{index_path}.tmp", index_path)
+        self.generation = generation
+
+        for name in ARRAYS:
+            path = self._array_path(name, previous)
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,131 @@
+import sys
+import codecs
+from html.parser import HTMLParser
+from config import HTML_PARSER_BACKEND
+
+CHUNK_SIZE = 64 * 1024
+_etree = None  # lxml.etree once imported, False if lxml is not installed
+
+def lxml_etree():
+    """lxml.etree, or None when lxml is not installed (it is optional, the stdlib parser is the fallback).
+
+    bs4 and lxml are imported on first use so that runs served from the parse
+    cache never load them.
+    """
+    global _etree
+    if _etree is None:
+        try:
+            from lxml import etree
+        except ImportError:
+            etree = False
+        _etree = etree
+    return _etree or None
+
+def resolve_backend(backend=None):
+    """Map 'auto' to the fastest available backend: lxml if installed, else the stdlib stream parser."""
+    backend = backend or HTML_PARSER_BACKEND
+    if backend == 'auto':
+        return 'lxml' if lxml_etree() is not None else 'stream'
+    if backend == 'lxml' and lxml_etree() is None:
+        print("lxml is not installed, falling back to the stream parser", file=sys.stderr)
+        return 'stream'
+    if backend not in ('bs4', 'stream', 'lxml'):
+        raise ValueError(f"Unknown HTML parser backend: {backend}")
+    return backend
+
+def make_soup(markup):
+    """BeautifulSoup tree using lxml when it is available."""
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(markup, 'lxml' if lxml_etree() is not None else 'html.parser')
+
+def _chunks(markup):
+    if isinstance(markup, (str, bytes)):
+        for start in range(0, len(markup), CHUNK_SIZE):
+            yield markup[start:start + CHUNK_SIZE]
+    else:
+        yield from markup
+
+class _RowCollector(HTMLParser):
+    """Incremental parser that collects the stripped <td> texts of each <tr> as it closes."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows = []
+        self._cells = None
+        self._cell = None
+
+    def _close_cell(self):
+        if self._cell is not None:
+            self._cells.append(''.join(self._cell).strip())
+            self._cell = None
+
+    def _close_row(self):
+        if self._cells is not None:
+            self._close_cell()
+            self.rows.append(self._cells)
+            self._cells = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'tr':
+            self._close_row()
+            self._cells = []
+        elif tag in ('td', 'th') and self._cells is not None:
+            self._close_cell()
+            if tag == 'td':
+                self._cell = []
+
+    def handle_endtag(self, tag):
+        if tag == 'tr':
+            self._close_row()
+        elif tag in ('td', 'th'):
+            self._close_cell()
+        elif tag == 'table':
+            self._close_row()
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+def _iter_rows_stream(markup):
+    parser = _RowCollector()
+    # One decoder across chunks so a multibyte character split between two chunks survives
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    for chunk in _chunks(markup):
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        parser.feed(chunk)
+        yield from parser.rows
+        parser.rows.clear()
+    parser.feed(decoder.decode(b'', final=True))
+    parser.close()
+    parser._close_row()
+    yield from parser.rows
+
+def _iter_rows_lxml(markup):
+    parser = lxml_etree().HTMLPullParser(events=('end',), tag='tr')
+    for chunk in _chunks(markup):
+        parser.feed(chunk)
+        for _, row in parser.read_events():
+            yield [''.join(cell.itertext()).strip() for cell in row.iter('td')]
+            # Drop rows already handled so memory stays bounded on large tables
+            row.clear()
+            while row.getprevious() is not None:
+                del row.getparent()[0]
+    parser.close()
+    for _, row in parser.read_events():
+        yield [''.join(cell.itertext()).strip() for cell in row.iter('td')]
+
+def _iter_rows_bs4(markup):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(markup, 'html.parser')
+    for row in soup.find_all('tr'):
+        yield [col.text.strip() for col in row.find_all('td')]
+
+def iter_table_rows(markup, backend=None):
+    """Yield the list of <td> texts for every <tr> in markup (a string, bytes or iterable of chunks)."""
+    backend = resolve_backend(backend)
+    if backend == 'lxml':
+        return _iter_rows_lxml(markup)
+    if backend == 'stream':
+        return _iter_rows_stream(markup)
+    return _iter_rows_bs4(markup)
@@ -0,0 +1,229 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import (REQUEST_TIMEOUT, REQUEST_RETRIES, REQUEST_BACKOFF, FETCH_CONCURRENCY,
+                    HTTP_CACHE_DIR, HTTP_CACHE_TTL_DAYS, HTTP_CACHE_MAX_BYTES)
+
+_session = None
+_session_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+cache_stats = {'requests': 0, 'bytes': 0, 'not_modified': 0, 'unchanged': 0, 'changed': 0, 'new': 0,
+               'parse_hits': 0, 'parse_misses': 0, 'evicted': 0}
+
+class Page:
+    """A fetched page body, either fresh from the network or replayed from the cache."""
+
+    def __init__(self, url, content, encoding, content_hash, unchanged):
+        self.url = url
+        self.content = content
+        self.encoding = encoding
+        self.content_hash = content_hash
+        self.unchanged = unchanged  # same body as the previous run
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+def get_session():
+    """Return the shared keep-alive session, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=REQUEST_RETRIES,
+                backoff_factor=REQUEST_BACKOFF,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=('GET', 'HEAD'),
+            )
+            adapter = HTTPAdapter(max_retries=retry,
+                                  pool_connections=FETCH_CONCURRENCY,
+                                  pool_maxsize=FETCH_CONCURRENCY)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+        return _session
+
+def close_session():
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+def http_get(url, headers=None):
+    """GET a URL through the shared session, raising on HTTP errors."""
+    response = get_session().get(url, timeout=REQUEST_TIMEOUT, headers=headers)
+    response.raise_for_status()
+    return response
+
+def _count(key, amount=1):
+    with _stats_lock:
+        cache_stats[key] += amount
+
+def _entry_paths(url):
+    key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    return os.path.join(HTTP_CACHE_DIR, key + '.json'), os.path.join(HTTP_CACHE_DIR, key + '.body')
+
+def _read_entry(url):
+    meta_path, body_path = _entry_paths(url)
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(body_path, 'rb') as f:
+            body = f.read()
+    except (OSError, ValueError):
+        return None, None
+    if meta.get('url') != url or hashlib.sha256(body).hexdigest() != meta.get('sha256'):
+        return None, None
+    return meta, body
+
+def _write_file(path, data, mode):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, mode) as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def _write_entry(meta, body=None):
+    os.makedirs(HTTP_CACHE_DIR, exist_ok=True)
+    meta_path, body_path = _entry_paths(meta['url'])
+    meta['last_used'] = time.time()
+    if body is not None:
+        _write_file(body_path, body, 'wb')
+    _write_file(meta_path, json.dumps(meta, ensure_ascii=False).encode('utf-8'), 'wb')
+
+def fetch_page(url):
+    """Fetch a URL, revalidating against the on-disk cache with a conditional GET."""
+    _count('requests')
+    if not HTTP_CACHE_DIR:
+        response = http_get(url)
+        _count('bytes', len(response.content))
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        return Page(url, response.content, response.encoding, content_hash, False)
+
+    meta, body = _read_entry(url)
+    headers = {}
+    if meta:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    response = http_get(url, headers=headers)
+    if response.status_code == 304 and meta:
+        _count('not_modified')
+        _write_entry(meta)
+        return Page(url, body, meta.get('encoding'), meta['sha256'], True)
+
+    content = response.content
+    _count('bytes', len(content))
+    content_hash = hashlib.sha256(content).hexdigest()
+    unchanged = bool(meta) and meta['sha256'] == content_hash
+    _count('unchanged' if unchanged else 'changed' if meta else 'new')
+
+    new_meta = {
+        'url': url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'encoding': response.encoding or response.apparent_encoding,
+        'sha256': content_hash,
+        'size': len(content),
+    }
+    if unchanged and 'parsed' in meta:
+        new_meta['parsed'] = meta['parsed']
+    _write_entry(new_meta, None if unchanged else content)
+    return Page(url, content, new_meta['encoding'], content_hash, unchanged)
+
+_parser_versions = {}
+
+def parser_version(parse):
+    """Hash of the source of parse's module and of html_parsing, which the page parsers are built on.
+
+    Part of the parse cache key, so a parser fix re-parses pages whose body
+    hasn't changed instead of serving the old result from .http-cache.
+    """
+    version = _parser_versions.get(parse)
+    if version is None:
+        digest = hashlib.sha256()
+        for name in (parse.__module__, 'html_parsing'):
+            path = getattr(sys.modules.get(name), '__file__', None)
+            if path:
+                with open(path, 'rb') as f:
+                    digest.update(f.read())
+        version = _parser_versions[parse] = digest.hexdigest()[:16]
+    return version
+
+def fetch_parsed(url, parse, parser_name):
+    """Fetch a URL and return parse(page), reusing the cached result if the body is unchanged.
+
+    The parse result must be JSON-serialisable. parser_name identifies the parser
+    so a cached result is never handed to a different one, and parser_version()
+    drops results from before the parser's code last changed.
+    """
+    page = fetch_page(url)
+    version = parser_version(parse)
+    if HTTP_CACHE_DIR:
+        meta, _ = _read_entry(url)
+        parsed = (meta or {}).get('parsed')
+        if (parsed and parsed['parser'] == parser_name and parsed.get('version') == version
+                and parsed['sha256'] == page.content_hash):
+            _count('parse_hits')
+            return parsed['result']
+
+    _count('parse_misses')
+    result = parse(page)
+    if HTTP_CACHE_DIR and meta:
+        meta['parsed'] = {'parser': parser_name, 'version': version, 'sha256': page.content_hash, 'result': result}
+        _write_entry(meta)
+    return result
+
+def prune_cache():
+    """Evict entries unused for HTTP_CACHE_TTL_DAYS, then least recently used ones over HTTP_CACHE_MAX_BYTES."""
+    if not HTTP_CACHE_DIR or not os.path.isdir(HTTP_CACHE_DIR):
+        return 0
+
+    entries = []
+    for filename in os.listdir(HTTP_CACHE_DIR):
+        if not filename.endswith('.json'):
+            continue
+        meta_path = os.path.join(HTTP_CACHE_DIR, filename)
+        body_path = meta_path[:-len('.json')] + '.body'
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            size = os.path.getsize(meta_path) + os.path.getsize(body_path)
+        except (OSError, ValueError):
+            meta, size = {}, 0
+        entries.append((meta.get('last_used', 0), size, meta_path, body_path))
+
+    cutoff = time.time() - HTTP_CACHE_TTL_DAYS * 86400
+    entries.sort(reverse=True)  # most recently used first
+    kept_bytes = 0
+    evicted = 0
+    for last_used, size, meta_path, body_path in entries:
+        if last_used >= cutoff and size and kept_bytes + size <= HTTP_CACHE_MAX_BYTES:
+            kept_bytes += size
+            continue
+        for path in (meta_path, body_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        evicted += 1
+    with _stats_lock:
+        cache_stats['evicted'] += evicted
+    return evicted
+
+def log_cache_stats():
+    print(f"HTTP cache: {cache_stats['requests']} requests, "
+          f"{cache_stats['not_modified']} not modified (304), "
+          f"{cache_stats['unchanged']} unchanged, {cache_stats['changed']} changed, "
+          f"{cache_stats['new']} new; parse cache {cache_stats['parse_hits']} hits / "
+          f"{cache_stats['parse_misses']} misses; {cache_stats['evicted']} entries evicted", file=sys.stderr)
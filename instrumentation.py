@@ -0,0 +1,138 @@
+import sys
+import json
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB (None where unsupported)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def _delta(before, after):
+    return {key: round(after[key] - before.get(key, 0), 6) for key in after
+            if isinstance(after[key], (int, float)) and after[key] != before.get(key, 0)}
+
+def _since(before, after):
+    return {key: round(value - before.get(key, 0), 6) if isinstance(value, (int, float)) else value
+            for key, value in after.items()}
+
+class RunReport:
+    """Per-stage timings and resource counters for one pipeline run.
+
+    counters maps a name to a dict of running totals (e.g. the HTTP cache stats);
+    each stage records how much every counter moved while it ran, and the report
+    totals only count this run. profile is None, 'cprofile' or 'tracemalloc'.
+    Stages may run on several threads (see pipeline.py); the counters and the
+    traced peak of overlapping stages then include each other's work.
+    """
+
+    def __init__(self, counters=None, profile=None, profile_file=None, name=None):
+        self.name = name
+        self.counters = counters or {}
+        self._initial = self._snapshot()
+        self.profile = profile
+        self.profile_file = profile_file
+        self.stages = []
+        self._lock = threading.Lock()
+        self.started_at = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self._profiler = None
+        if profile == 'cprofile':
+            import cProfile  # with pstats, only loaded when profiling
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif profile == 'tracemalloc':
+            tracemalloc.start()
+        elif profile:
+            print(f"Unknown profile mode {profile!r}, profiling disabled", file=sys.stderr)
+            self.profile = None
+
+    def _snapshot(self):
+        return {name: dict(values) for name, values in self.counters.items()}
+
+    @contextmanager
+    def stage(self, name):
+        entry = {'name': name, 'status': 'ok'}
+        before = self._snapshot()
+        if self.profile == 'tracemalloc':
+            tracemalloc.reset_peak()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield entry
+        except BaseException as e:
+            entry['status'] = 'failed'
+            entry['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            entry['seconds'] = round(time.perf_counter() - wall, 4)
+            entry['cpu_seconds'] = round(time.process_time() - cpu, 4)
+            entry['peak_rss_mb'] = peak_rss_mb()
+            after = self._snapshot()
+            for counter in self.counters:
+                moved = _delta(before[counter], after[counter])
+                if moved:
+                    entry[counter] = moved
+            if self.profile == 'tracemalloc':
+                entry['traced_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+            with self._lock:
+                self.stages.append(entry)
+
+    def fallback_failed(self, name, error):
+        """Record that the fallback of the failed stage `name` raised `error` as well."""
+        with self._lock:
+            for entry in reversed(self.stages):
+                if entry['name'] == name:
+                    entry['fallback'] = False
+                    entry['fallback_error'] = f"{type(error).__name__}: {error}"
+                    break
+
+    def skip(self, name, missing):
+        """Record a stage that never ran because the inputs in `missing` were not produced."""
+        with self._lock:
+            self.stages.append({'name': name, 'status': 'skipped', 'missing': list(missing), 'seconds': 0.0})
+
+    def finish(self, status):
+        report = {
+            'name': self.name,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'status': status,
+            'total_seconds': round(time.perf_counter() - self._start, 4),
+            'peak_rss_mb': peak_rss_mb(),
+            'profile': self.profile,
+            'stages': self.stages,
+            'counters': {name: _since(self._initial[name], values) for name, values in self._snapshot().items()},
+        }
+        if self._profiler is not None:
+            import pstats
+            self._profiler.disable()
+            stats = pstats.Stats(self._profiler, stream=sys.stderr).sort_stats('cumulative')
+            if self.profile_file:
+                stats.dump_stats(self.profile_file)
+                report['profile_file'] = self.profile_file
+            stats.print_stats(25)
+        elif self.profile == 'tracemalloc':
+            print("Top allocations:", file=sys.stderr)
+            for stat in tracemalloc.take_snapshot().statistics('lineno')[:15]:
+                print(f"  {stat}", file=sys.stderr)
+            tracemalloc.stop()
+        return report
+
+    def write(self, path, status):
+        report = self.finish(status)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        slowest = sorted(self.stages, key=lambda s: s['seconds'], reverse=True)[:3]
+        summary = ', '.join(f"{s['name']} {s['seconds']:.2f}s" for s in slowest)
+        print(f"Run report written to {path} ({report['total_seconds']:.2f}s total; slowest: {summary})", file=sys.stderr)
+        return report
@@ -0,0 +1,150 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from config import SIMULATIONS, SIMULATION_CHUNK, SIMULATION_SEED, SIMULATION_PROCESSES, FORECAST_HALFLIFE_STAGES
+
+def incidence_matrix(rosters, rider_names):
+    """rosters x riders 0/1 matrix; roster names missing from rider_names are ignored."""
+    column = {name: j for j, name in enumerate(rider_names)}
+    matrix = np.zeros((len(rosters), len(rider_names)))
+    for i, roster in enumerate(rosters):
+        for name in roster:
+            if name in column:
+                matrix[i, column[name]] = 1.0
+    return matrix
+
+def stage_samples(rider_table, withdrawn=None, halflife=FORECAST_HALFLIFE_STAGES):
+    """(riders x stages gains, sampling probability per stage) from the scored stages in the history.
+
+    Recent stages are sampled more often, with the same half-life as the points
+    forecast; withdrawn riders score nothing in any sampled stage.
+    """
+    gains = np.nan_to_num(rider_table.daily_deltas()[:, rider_table.scoring_days()], nan=0.0)
+    gains = np.clip(gains, 0, None)
+    if withdrawn is not None:
+        gains[np.asarray(withdrawn, dtype=bool)] = 0.0
+    weights = 0.5 ** (np.arange(gains.shape[1])[::-1] / halflife)
+    return gains, weights / weights.sum() if weights.size else weights
+
+def _competition_ranks(values):
+    """Per-row ranks, 1 for the highest value, tied values sharing the better rank."""
+    order = np.argsort(-values, axis=1)
+    ordered = np.take_along_axis(values, order, axis=1)
+    positions = np.broadcast_to(np.arange(1, values.shape[1] + 1), values.shape)
+    new_value = np.ones(values.shape, dtype=bool)
+    new_value[:, 1:] = ordered[:, 1:] != ordered[:, :-1]
+    ranked = np.maximum.accumulate(np.where(new_value, positions, 0), axis=1)
+    ranks = np.empty_like(ranked)
+    np.put_along_axis(ranks, order, ranked, axis=1)
+    return ranks
+
+def _simulate_chunk(task):
+    """Aggregates for one chunk of simulations; task is a tuple so it pickles for the process pool."""
+    team_stage_points, probabilities, horizon, current, league_size, field_points, seed, simulations = task
+    rng = np.random.default_rng(seed)
+    stages = team_stage_points.shape[1]
+
+    if stages and horizon:
+        picks = rng.choice(stages, size=(simulations, horizon), p=probabilities)
+        # How often each historical stage was drawn in each simulation
+        counts = np.bincount((picks + stages * np.arange(simulations)[:, None]).ravel(),
+                             minlength=simulations * stages).reshape(simulations, stages)
+        finals = current + counts @ team_stage_points.T
+    else:
+        finals = np.broadcast_to(current, (simulations, len(current))).astype(float)
+
+    league = finals[:, :league_size]
+    result = {
+        'points_sum': league.sum(axis=0),
+        'points_sq_sum': (league ** 2).sum(axis=0),
+        'rank_counts': np.zeros((league_size, league_size), dtype=np.int64),
+        'field_ranks': None,
+    }
+    if league_size:
+        ranks = _competition_ranks(league)
+        flat = (np.arange(league_size) * league_size + ranks - 1).ravel()
+        result['rank_counts'] = np.bincount(flat, minlength=league_size * league_size).reshape(league_size, league_size)
+
+    if field_points is not None and league_size:
+        # Field entrants' rosters are unknown: each one grows by the league's simulated relative gain
+        growth = league.sum(axis=1) / max(current[:league_size].sum(), 1.0)
+        threshold = finals[:, league_size] / np.where(growth > 0, growth, 1.0)
+        result['field_ranks'] = 1 + len(field_points) - np.searchsorted(field_points, threshold, side='right')
+    return result
+
+def simulate_league(rider_table, league_teams, horizon, withdrawn=None, all_star=None, field_scores=None,
+                    simulations=SIMULATIONS, seed=SIMULATION_SEED, processes=SIMULATION_PROCESSES,
+                    chunk=SIMULATION_CHUNK):
+    """Monte Carlo final standings over the remaining `horizon` stages.
+
+    Each simulation draws `horizon` stages from the scored history and adds every
+    rider's gains on them to each roster (an incidence matrix product). Returns
+    (league section, All-Star section); the latter ranks `all_star` (a team with
+    'riders' and 'total_points') against `field_scores`, and is None without them.
+    Simulations run in fixed-size chunks with seeds spawned from `seed`, so a
+    given seed gives the same result whatever the number of processes.
+    """
+    gains, probabilities = stage_samples(rider_table, withdrawn)
+    rosters = [team.get('roster', []) for team in league_teams]
+    current = [team['points'] for team in league_teams]
+    with_field = all_star is not None and field_scores is not None and len(league_teams) > 0
+    if with_field:
+        rosters.append([rider['name'] for rider in all_star['riders']])
+        current.append(all_star['total_points'])
+
+    team_stage_points = incidence_matrix(rosters, rider_table.names) @ gains
+    current = np.array(current, dtype=float)
+    field_points = np.sort(np.asarray(field_scores, dtype=float)) if with_field else None
+
+    sizes = [chunk] * (simulations // chunk) + ([simulations % chunk] if simulations % chunk else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(team_stage_points, probabilities, horizon, current, len(league_teams), field_points, s, n)
+             for s, n in zip(seeds, sizes)]
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes <= 1 or len(tasks) < 2:
+        results = [_simulate_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(processes, len(tasks))) as executor:
+            results = list(executor.map(_simulate_chunk, tasks))
+
+    points_sum = sum(r['points_sum'] for r in results)
+    points_sq_sum = sum(r['points_sq_sum'] for r in results)
+    rank_counts = sum(r['rank_counts'] for r in results)
+    expected = points_sum / simulations
+    std = np.sqrt(np.maximum(points_sq_sum / simulations - expected ** 2, 0))
+    rank_values = np.arange(1, len(league_teams) + 1)
+
+    league = {
+        'simulations': simulations,
+        'seed': seed,
+        'horizon_stages': horizon,
+        'teams': [
+            {
+                'name': team['name'],
+                'points': team['points'],
+                'expected_points': round(float(expected[i]), 1),
+                'points_std': round(float(std[i]), 1),
+                'expected_rank': round(float(rank_counts[i] @ rank_values / simulations), 2),
+                'win_probability': round(float(rank_counts[i, 0] / simulations), 4),
+                'podium_probability': round(float(rank_counts[i, :3].sum() / simulations), 4),
+            } for i, team in enumerate(league_teams)
+        ],
+    }
+
+    field = None
+    if with_field:
+        ranks = np.concatenate([r['field_ranks'] for r in results])
+        p10, median, p90 = np.percentile(ranks, [10, 50, 90])
+        field_size = len(field_points)
+        field = {
+            'simulations': simulations,
+            'field_size': field_size,
+            'expected_rank': round(float(ranks.mean()), 1),
+            'rank_p10': int(p10),
+            'median_rank': int(median),
+            'rank_p90': int(p90),
+            'expected_percentile': round(float(np.mean((1 - (ranks - 1) / field_size) * 100)), 2),
+            'win_probability': round(float(np.mean(ranks == 1)), 4),
+        }
+    return league, field
@@ -0,0 +1,109 @@
+from numbers import Real
+from itertools import repeat
+from operator import itemgetter
+
+class Nullable:
+    """A field script.js checks before using: it may be missing or null."""
+
+    def __init__(self, spec):
+        self.spec = spec
+
+# Specs are a type (or tuple of types), a dict of required keys to specs, or a
+# one-item list for a list whose items all match that spec. Only the fields
+# script.js reads are listed; anything else in the output is left alone.
+NUMBER = (int, float, Real)  # int and float first: the Real check is an ABC lookup, much slower
+HISTORY_POINT = {'date': str, 'points': NUMBER}
+TEAM_SCORE = {'name': str, 'points': NUMBER}
+TEAM_RIDER = {'name': str, 'role': str, 'cost': NUMBER, 'points': NUMBER}
+SERIES = [[Nullable(NUMBER)]]
+
+OUTPUT_SCHEMA = {
+    'cyclists': [{
+        'name': str,
+        'team': str,
+        'role': str,
+        'cost': NUMBER,
+        'points': NUMBER,
+        'ownership': NUMBER,
+        'cost_per_point': (NUMBER, str),  # "Infinity" for riders without points
+        'pointHistory': [HISTORY_POINT],
+    }],
+    'league_scores': {
+        'current': [dict(TEAM_SCORE, roster=[str])],
+        'history': [{'date': str, 'scores': [TEAM_SCORE]}],
+    },
+    'withdrawals': [{'rider': str, 'team': str, 'stage': NUMBER}],
+    'mvp_history': [{'name': str, 'points_added': NUMBER, 'date': str}],
+    'mip_history': [{'name': str, 'percentage_increase': NUMBER, 'date': str, 'from_zero': bool}],
+    'dream_team': Nullable({'riders': [dict(TEAM_RIDER, pointHistory=[HISTORY_POINT])],
+                            'total_points': NUMBER, 'total_cost': NUMBER}),
+    'league_all_star_team': Nullable({
+        'riders': [dict(TEAM_RIDER, team=str)],
+        'total_points': NUMBER,
+        'total_cost': NUMBER,
+        'twitter_league_comparison': Nullable({'rank': NUMBER, 'percentile': NUMBER, 'total_participants': NUMBER}),
+    }),
+    'league_changes': Nullable({
+        'date': str,
+        'previous_date': Nullable(str),
+        'teams': [dict(TEAM_SCORE, points_delta=Nullable(NUMBER), rank_change=Nullable(NUMBER))],
+    }),
+    'chart_data': Nullable({
+        'league': {'dates': [str], 'teams': [str], 'points': SERIES},
+        'rosters': {'dates': [str], 'teams': dict},
+        'top_movers': {'league_date': Nullable(str), 'teams': [{'name': str, 'points_delta': NUMBER}]},
+    }),
+}
+
+def _is_plain(spec):
+    return isinstance(spec, (type, tuple))
+
+def _all_valid(items, spec):
+    """Whether every item matches a scalar or flat-record spec, checked one field at a time across
+    the list (map keeps the loops in C); None for other specs.
+
+    Long lists like pointHistory only go through validate() item by item when something is wrong.
+    """
+    if isinstance(spec, Nullable) and _is_plain(spec.spec):
+        spec = (spec.spec, type(None))
+    if _is_plain(spec):
+        return all(map(isinstance, items, repeat(spec)))
+    if not isinstance(spec, dict) or not all(_is_plain(field) for field in spec.values()):
+        return None
+    if not all(map(isinstance, items, repeat(dict))):
+        return False
+    try:
+        return all(all(map(isinstance, map(itemgetter(key), items), repeat(field))) for key, field in spec.items())
+    except KeyError:
+        return False
+
+def validate(value, spec=OUTPUT_SCHEMA, path='data', errors=None, limit=20):
+    """Where value doesn't match spec, as a list of 'path: problem' strings (at most `limit`)."""
+    errors = [] if errors is None else errors
+    if len(errors) >= limit:
+        return errors
+    if isinstance(spec, Nullable):
+        return errors if value is None else validate(value, spec.spec, path, errors, limit)
+
+    if isinstance(spec, dict):
+        if not isinstance(value, dict):
+            errors.append(f"{path}: expected an object, got {type(value).__name__}")
+            return errors
+        for key, item_spec in spec.items():
+            if key in value:
+                validate(value[key], item_spec, f"{path}.{key}", errors, limit)
+            elif not isinstance(item_spec, Nullable):
+                errors.append(f"{path}: missing {key}")
+    elif isinstance(spec, list):
+        if not isinstance(value, list):
+            errors.append(f"{path}: expected a list, got {type(value).__name__}")
+            return errors
+        if _all_valid(value, spec[0]):
+            return errors
+        for i, item in enumerate(value):
+            validate(item, spec[0], f"{path}[{i}]", errors, limit)
+            if len(errors) >= limit:
+                break
+    elif not isinstance(value, spec):
+        errors.append(f"{path}: unexpected {type(value).__name__}")
+    return errors
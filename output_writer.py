@@ -0,0 +1,91 @@
+import os
+import sys
+import json
+import math
+import hashlib
+import threading
+from config import JSON_ENCODER
+
+_orjson = None  # the orjson module once imported, False if it is not installed
+
+def orjson_module():
+    """orjson, or None when it is not installed (it is optional, the stdlib encoder is the fallback)."""
+    global _orjson
+    if _orjson is None:
+        try:
+            import orjson
+        except ImportError:
+            orjson = False
+        _orjson = orjson
+    return _orjson or None
+
+def resolve_encoder(encoder=None):
+    """Map 'auto' to orjson if it is installed, else the stdlib json module."""
+    encoder = encoder or JSON_ENCODER
+    if encoder == 'auto':
+        return 'orjson' if orjson_module() is not None else 'json'
+    if encoder == 'orjson' and orjson_module() is None:
+        print("orjson is not installed, falling back to the json module", file=sys.stderr)
+        return 'json'
+    if encoder not in ('orjson', 'json'):
+        raise ValueError(f"Unknown JSON encoder: {encoder}")
+    return encoder
+
+def _finite(value):
+    """value with NaN and infinities replaced by None, as orjson writes them."""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+def dumps(data, default=None, indent=False, encoder=None):
+    """data as UTF-8 JSON bytes, compact or indented by 2 spaces.
+
+    orjson serialises NumPy arrays and scalars natively, so default is only
+    called for the other types it doesn't know. Both encoders write NaN and
+    infinities as null; the json module would write NaN, which JSON.parse rejects.
+    """
+    if resolve_encoder(encoder) == 'orjson':
+        orjson = orjson_module()
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=default, option=option)
+    layout = {'indent': 2} if indent else {'separators': (',', ':')}
+    try:
+        return json.dumps(data, default=default, ensure_ascii=False, allow_nan=False, **layout).encode('utf-8')
+    except ValueError:
+        # Only walk the data when it has a non-finite float somewhere
+        finite_default = (lambda obj: _finite(default(obj))) if default else None
+        return json.dumps(_finite(data), default=finite_default, ensure_ascii=False, allow_nan=False,
+                          **layout).encode('utf-8')
+
+def file_hash(path):
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+def write_atomic(path, content):
+    """Write bytes to a temporary file next to path and rename it into place, so readers never see a partial file."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def write_if_changed(path, content):
+    """write_atomic unless path already holds content; returns whether it was written."""
+    if file_hash(path) == hashlib.sha256(content).hexdigest():
+        return False
+    write_atomic(path, content)
+    return True
@@ -0,0 +1,145 @@
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from config import PIPELINE_IO_WORKERS
+
+class Stage:
+    """One pipeline step: run(**inputs) returns a dict of (some of) its outputs.
+
+    inputs must all be available for the stage to run; optional inputs are passed
+    when they were produced and left out when their stage failed. io stages are
+    network-bound and run on a thread pool, the others one at a time on the
+    calling thread, so only io stages may run alongside anything. fallback, given
+    the values so far, supplies the outputs instead when the stage fails.
+    """
+
+    def __init__(self, name, run, inputs=(), outputs=(), optional=(), io=False, fallback=None):
+        self.name = name
+        self.run = run
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.optional = tuple(optional)
+        self.io = io
+        self.fallback = fallback
+
+def _producers(stages, values):
+    producers = {}
+    for stage in stages:
+        for output in stage.outputs:
+            if output in producers or output in values:
+                raise ValueError(f"{output!r} is produced more than once")
+            producers[output] = stage.name
+    for stage in stages:
+        for name in stage.inputs + stage.optional:
+            if name not in producers and name not in values:
+                raise ValueError(f"Stage {stage.name!r} needs {name!r}, which no stage produces")
+    return producers
+
+def _execute(stage, kwargs, report):
+    with report.stage(stage.name) as entry:
+        try:
+            return stage.run(**kwargs) or {}
+        except Exception:
+            if stage.fallback is not None:
+                entry['fallback'] = True
+            raise
+
+def run_pipeline(stages, report, values=None, io_workers=PIPELINE_IO_WORKERS):
+    """Run every stage once its inputs exist and return (values, {stage name: status}).
+
+    Ready io stages are started first, then the first ready CPU stage in list
+    order runs while they are outstanding. A status is 'ok', 'failed' (the
+    stage raised, and so did its fallback if it has one; 'fallback' if the
+    fallback supplied the outputs) or 'skipped'
+    (a required input was never produced), and every stage is recorded in the
+    RunReport `report`. Stages never see each other's exceptions, only the
+    missing outputs. io_workers=0 runs io stages inline too.
+    """
+    values = dict(values or {})
+    producers = _producers(stages, values)
+    pending = list(stages)
+    statuses = {}
+    running = {}
+
+    def settled(name):
+        return name in values or producers.get(name) in statuses
+
+    def finish(stage, outputs, status):
+        values.update((key, value) for key, value in outputs.items() if key in stage.outputs)
+        statuses[stage.name] = status
+
+    def failed(stage, error):
+        print(f"Stage {stage.name} failed: {type(error).__name__}: {error}", file=sys.stderr)
+        traceback.print_exception(type(error), error, error.__traceback__, file=sys.stderr)
+        if stage.fallback is None:
+            finish(stage, {}, 'failed')
+            return
+        try:
+            outputs = stage.fallback(values)
+        except Exception as fallback_error:
+            # A broken fallback (say the previous output is unreadable) only loses this stage and its dependents
+            print(f"Stage {stage.name} fallback failed: {type(fallback_error).__name__}: {fallback_error}",
+                  file=sys.stderr)
+            traceback.print_exception(type(fallback_error), fallback_error, fallback_error.__traceback__,
+                                      file=sys.stderr)
+            report.fallback_failed(stage.name, fallback_error)
+            finish(stage, {}, 'failed')
+            return
+        print(f"Stage {stage.name} fell back to {', '.join(outputs) or 'no outputs'}", file=sys.stderr)
+        finish(stage, outputs, 'fallback')
+
+    def kwargs(stage):
+        return {name: values[name] for name in stage.inputs + stage.optional if name in values}
+
+    def collect(future):
+        stage = running.pop(future)
+        if future.exception() is not None:
+            failed(stage, future.exception())
+        else:
+            finish(stage, future.result(), 'ok')
+
+    def run_inline(stage):
+        try:
+            outputs = _execute(stage, kwargs(stage), report)
+        except Exception as e:
+            failed(stage, e)
+        else:
+            finish(stage, outputs, 'ok')
+
+    executor = ThreadPoolExecutor(max_workers=io_workers) if io_workers else None
+    try:
+        while pending or running:
+            for future in [future for future in running if future.done()]:
+                collect(future)
+
+            # Skipping a stage settles its outputs, which can make later stages skippable too
+            skipped = True
+            while skipped:
+                skipped = False
+                for stage in list(pending):
+                    missing = [name for name in stage.inputs if settled(name) and name not in values]
+                    if missing:
+                        pending.remove(stage)
+                        statuses[stage.name] = 'skipped'
+                        report.skip(stage.name, missing)
+                        print(f"Skipping stage {stage.name}: no {', '.join(missing)}", file=sys.stderr)
+                        skipped = True
+
+            ready = [stage for stage in pending if all(settled(name) for name in stage.inputs + stage.optional)]
+            if executor is not None:
+                for stage in [stage for stage in ready if stage.io]:
+                    pending.remove(stage)
+                    running[executor.submit(_execute, stage, kwargs(stage), report)] = stage
+                ready = [stage for stage in ready if not stage.io]
+
+            if ready:
+                pending.remove(ready[0])
+                run_inline(ready[0])
+            elif running:
+                wait(running, return_when=FIRST_COMPLETED)
+            elif pending:
+                raise ValueError(f"Stages {', '.join(stage.name for stage in pending)} depend on each other")
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+    return values, statuses
@@ -0,0 +1,56 @@
+import os
+from urllib.parse import urljoin
+from config import RACES, RACE_OUTPUT_ROOT, RACE_STAGES, ROSTER_STORE_DIR, SCORE_INDEX_DIR
+
+PATH_KEYS = ('output_file', 'output_dir', 'run_report_file', 'profile_file', 'history_store_dir', 'roster_store_file',
+             'score_index_file')
+
+def resolve_race(entry):
+    """Fill in the page URLs and output paths a RACES entry leaves out."""
+    missing = [key for key in ('id', 'velogames_url', 'league_id') if not entry.get(key)]
+    if missing:
+        raise ValueError(f"Race entry {entry.get('id', entry)!r} is missing {', '.join(missing)}")
+
+    race = dict(entry)
+    base_url = race['velogames_url']
+    race.setdefault('riders_url', urljoin(base_url, 'riders.php'))
+    race.setdefault('league_url', urljoin(base_url, f"leaguescores.php?league={race['league_id']}"))
+    if race.get('twitter_league_id'):
+        race.setdefault('twitter_league_url', urljoin(base_url, f"leaguescores.php?league={race['twitter_league_id']}"))
+    else:
+        race.setdefault('twitter_league_url', None)
+    race.setdefault('withdrawals_url', None)
+    race.setdefault('stages', RACE_STAGES)
+
+    race_dir = os.path.join(RACE_OUTPUT_ROOT, race['id'])
+    race.setdefault('output_file', os.path.join(race_dir, 'cyclist-data.json'))
+    race.setdefault('output_dir', os.path.join(race_dir, 'data'))
+    race.setdefault('run_report_file', os.path.join(race_dir, 'run-report.json'))
+    race.setdefault('profile_file', os.path.join(race_dir, 'run-profile.prof'))
+    race.setdefault('history_store_dir', os.path.join(race_dir, 'history-store'))
+    race.setdefault('roster_store_file', os.path.join(ROSTER_STORE_DIR, f"{race['id']}.json"))
+    race.setdefault('score_index_file', os.path.join(SCORE_INDEX_DIR, f"{race['id']}.npz"))
+    return race
+
+def select_races(names=None, registry=None):
+    """Resolved registry entries, limited to `names` (race ids) when given.
+
+    Raises ValueError on unknown names, duplicate ids or two races sharing an output path.
+    """
+    races = [resolve_race(entry) for entry in (RACES if registry is None else registry)]
+
+    seen = {}
+    for race in races:
+        keys = [('id', race['id'])] + [('path', os.path.normpath(race[key])) for key in PATH_KEYS]
+        for key in keys:
+            if key in seen:
+                raise ValueError(f"Races {seen[key]!r} and {race['id']!r} share {key[0]} {key[1]!r}")
+            seen[key] = race['id']
+
+    if names:
+        by_id = {race['id']: race for race in races}
+        unknown = [name for name in names if name not in by_id]
+        if unknown:
+            raise ValueError(f"Unknown race(s) {', '.join(unknown)}; configured: {', '.join(by_id)}")
+        races = [by_id[name] for name in dict.fromkeys(names)]
+    return races
@@ -0,0 +1,291 @@
+import os
+import sys
+import json
+import gzip
+import shutil
+import hashlib
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+import cyclist_analyzer as ca
+from output_writer import orjson_module, dumps, write_atomic
+from split_output import CURRENT_NAME
+from team_optimizer import TeamOptimizer, team_summary
+from config import (OUTPUT_FILE, OUTPUT_DIR, OUTPUT_MODE, REPLAY_OUTPUT_FILE, REPLAY_CACHE_DIR, REPLAY_PROCESSES,
+                    HISTORY_RETENTION_DAYS, TEAM_SOLVER)
+
+# The fields a riders page scrape produces, i.e. what update_historical_data gets each day
+SCRAPED_FIELDS = ('name', 'team', 'role', 'cost', 'ownership', 'points', 'cost_per_point')
+# The optimizer inputs; a day whose riders match these for an earlier day reuses its teams
+SOLVER_FIELDS = ('name', 'role', 'cost', 'points')
+
+def _loads(content):
+    orjson = orjson_module()
+    return orjson.loads(content) if orjson is not None else json.loads(content)
+
+def _utc_date(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%d')
+
+def snapshot_paths():
+    """The committed output files a day's riders and league can be read from, the one OUTPUT_MODE writes first.
+
+    The split output's current.json holds everything replay() reads (the history
+    shards are rebuilt, not read); the monolithic file covers commits from before
+    a switch between the two.
+    """
+    split_path = f"{OUTPUT_DIR}/{CURRENT_NAME}"
+    return (OUTPUT_FILE, split_path) if OUTPUT_MODE == 'monolithic' else (split_path, OUTPUT_FILE)
+
+def git_snapshots(paths=None, repo='.', rev='HEAD'):
+    """Yield (date, content) for each version of the output in rev's history, oldest first.
+
+    paths (relative to the repository root, default snapshot_paths()) are tried
+    in order at each commit, so history written in either output mode is read.
+    Only the last commit of each day is read, and a commit whose file is the same
+    blob as the previous one is skipped. Blobs are streamed from one git
+    cat-file process rather than a git show per commit. date is the commit day
+    (UTC); the snapshot's own last_update takes precedence in replay().
+    """
+    paths = [paths] if isinstance(paths, str) else list(paths or snapshot_paths())
+    log = subprocess.run(['git', '-C', repo, 'log', '--reverse', '--format=%H %ct', rev, '--'] + paths,
+                         capture_output=True, text=True, check=True).stdout.split('\n')
+    last_of_day = {}
+    for line in filter(None, log):
+        commit, timestamp = line.split()
+        last_of_day[_utc_date(int(timestamp))] = commit
+
+    reader = subprocess.Popen(['git', '-C', repo, 'cat-file', '--batch'], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    try:
+        previous_blob = None
+        for date, commit in sorted(last_of_day.items()):
+            for path in paths:
+                reader.stdin.write(f"{commit}:{path}\n".encode('utf-8'))
+                reader.stdin.flush()
+                header = reader.stdout.readline().split()
+                if header[-1] != b'missing':
+                    break
+            else:
+                continue  # the commit deleted the files
+            blob, size = header[0], int(header[2])
+            content = reader.stdout.read(size)
+            reader.stdout.read(1)  # the newline after each object
+            if blob != previous_blob:
+                previous_blob = blob
+                yield date, content
+    finally:
+        reader.stdin.close()
+        reader.wait()
+
+def archive_snapshots(directory):
+    """Yield (date, content) for every .json or .json.gz file in directory, in file name order.
+
+    date is the file's modification day (UTC); the snapshot's own last_update
+    takes precedence in replay().
+    """
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not name.endswith(('.json', '.json.gz')) or not os.path.isfile(path):
+            continue
+        opener = gzip.open if name.endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            content = f.read()
+        yield _utc_date(os.path.getmtime(path)), content
+
+def _scrape(data):
+    """The day's riders, reduced to what the riders page scrape gives, and league teams from a snapshot."""
+    league = data.get('league_scores', {})
+    league = league if isinstance(league, list) else league.get('current', [])
+    riders = [{field: c.get(field) for field in SCRAPED_FIELDS} for c in data['cyclists']]
+    for rider in riders:
+        if rider['ownership'] is None:
+            rider['ownership'] = 0.0
+        if rider['cost_per_point'] is None:
+            rider['cost_per_point'] = "Infinity" if rider['points'] == 0 else rider['cost'] / rider['points']
+    return riders, league
+
+def snapshot_days(snapshots):
+    """Yield (date, riders, league teams) per day from (date, content) snapshots, oldest first.
+
+    Snapshots are parsed as they arrive; of consecutive snapshots for the same
+    date only the last is kept, as each run overwrote that day's entries.
+    """
+    day = None
+    for fallback_date, content in snapshots:
+        data = _loads(content)
+        if not data.get('cyclists'):
+            continue
+        date = data.get('last_update') or fallback_date
+        if day is not None and day[0] != date:
+            yield day
+        day = (date,) + _scrape(data)
+    if day is not None:
+        yield day
+
+def _solver_key(riders, league_riders):
+    inputs = [[c[field] for field in SOLVER_FIELDS] for c in riders]
+    content = json.dumps([TEAM_SOLVER, inputs, sorted(league_riders)], ensure_ascii=False)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def _solve(optimizer, allowed=None, previous_team=None):
+    team, total_points, total_cost = optimizer.solve(allowed=allowed, previous_team=previous_team, objective='points')
+    return [rider['name'] for rider in team] if team else None
+
+def solve_day(riders, league_riders):
+    """The day's dream team and league All-Star team as rider names, each with whether it is the only best team.
+
+    The daily run passes yesterday's team to break ties between equally good
+    teams. A team found without it is the answer whatever yesterday was exactly
+    when re-solving with every other rider preferred still finds it; only the
+    days where it isn't need solving again in date order.
+    """
+    optimizer = TeamOptimizer(riders, objective='points')
+    names = [c['name'] for c in riders]
+    result = {}
+    for team_name, allowed in (('dream_team', None), ('league_all_star_team', set(league_riders))):
+        team = _solve(optimizer, allowed)
+        unique = False
+        if team and optimizer.solver == 'dp':
+            others = set(names) - set(team)
+            unique = _solve(optimizer, allowed, others) == team
+        result[team_name] = {'riders': team, 'unique': unique}
+    return result
+
+def _solve_day_task(task):
+    return solve_day(*task)
+
+def _load_cached(cache_dir, key):
+    try:
+        with open(os.path.join(cache_dir, f"{key}.json"), 'rb') as f:
+            return _loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+def _team(riders, names):
+    if names is None:
+        return None
+    by_name = {c['name']: c for c in riders}
+    team = [by_name[name] for name in names]
+    return team_summary(team, sum(c['points'] for c in team), sum(c['cost'] for c in team))
+
+def replay(snapshots, processes=REPLAY_PROCESSES, cache_dir=REPLAY_CACHE_DIR, history_dir=None):
+    """Rebuild the day-by-day state from (date, content) output snapshots, oldest first.
+
+    Each day goes through update_historical_data (into a HistoryStore holding
+    the whole season) and calculate_mvp_mip in order, while the days' dream and
+    League All-Star teams are solved across a process pool: they only depend on
+    the day itself, except for tie-breaking (see solve_day). Solved days are
+    cached in cache_dir by their riders and league, so replaying again after a
+    change to the history or MVP/MIP logic only re-solves days whose inputs
+    changed. Teams maximise actual points, as the dream team does with the
+    default TEAM_OBJECTIVE.
+
+    Returns {'days': [per-day dates, MVP, MIP, league changes and teams], 'data':
+    the state after the last day, as the daily run would have written it}. With
+    history_dir the season's HistoryStore is saved there.
+    """
+    from analytics import RiderTable
+    from history_store import HistoryStore
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    store_dir = history_dir or tempfile.mkdtemp(prefix='replay-history-')
+    history_store = HistoryStore(store_dir, retention_days=None)
+    data = {'cyclists': [], 'league_scores': {'current': [], 'history': []}, 'mvp_history': [], 'mip_history': []}
+    days = []
+    solved = {}  # solver key -> solve_day result or its pending future
+    fresh = set()  # keys solved in this replay, written to the cache at the end
+    # Spawned, not forked: a forked worker would keep git_snapshots' pipe to git cat-file open
+    context = multiprocessing.get_context('spawn')
+    executor = ProcessPoolExecutor(max_workers=processes, mp_context=context) if processes > 1 else None
+    hits = 0
+    try:
+        for date, riders, league in snapshot_days(snapshots):
+            league_riders = {name for team in league for name in team.get('roster', [])}
+            key = _solver_key(riders, league_riders)
+            if key not in solved:
+                cached = _load_cached(cache_dir, key) if cache_dir else None
+                if cached is not None:
+                    hits += 1
+                    solved[key] = cached
+                else:
+                    fresh.add(key)
+                    if executor is not None:
+                        solved[key] = executor.submit(_solve_day_task, (riders, sorted(league_riders)))
+                    else:
+                        solved[key] = solve_day(riders, sorted(league_riders))
+
+            data = ca.update_historical_data(data, [dict(c) for c in riders], league, history_store, today=date)
+            rider_keys = [ca.normalize_name(c['name']) for c in data['cyclists']]
+            rider_table = RiderTable(data['cyclists'], history_store.rider_matrix(rider_keys, HISTORY_RETENTION_DAYS))
+            data, mvp, mip = ca.calculate_mvp_mip(data['cyclists'], data, rider_table, today=date)
+            days.append({'date': date, 'mvp': mvp, 'mip': mip, 'league_changes': data['league_changes'],
+                         'riders': riders, 'league_riders': league_riders, 'key': key})
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    for key in fresh:
+        if not isinstance(solved[key], dict):
+            solved[key] = solved[key].result()
+        if cache_dir:
+            write_atomic(os.path.join(cache_dir, f"{key}.json"), dumps(solved[key]))
+
+    # Ties are settled in date order against the previous day's team, as the daily run does
+    previous = {'dream_team': None, 'league_all_star_team': None}
+    optimizers = {}
+    for day in days:
+        riders, league_riders, key = day.pop('riders'), day.pop('league_riders'), day.pop('key')
+        for team_name in previous:
+            result = solved[key][team_name]
+            names = result['riders']
+            if names and not result['unique'] and previous[team_name]:
+                if key not in optimizers:
+                    optimizers[key] = TeamOptimizer(riders, objective='points')
+                allowed = None if team_name == 'dream_team' else league_riders
+                names = _solve(optimizers[key], allowed, previous[team_name])
+            previous[team_name] = names
+            day[team_name] = _team(riders, names)
+
+    if days:
+        # The last day's teams in the shape the daily run writes them
+        point_history = {c['name']: c['pointHistory'] for c in data['cyclists']}
+        rider_teams = {c['name']: c['team'] for c in data['cyclists']}
+        dream_team, all_star_team = days[-1]['dream_team'], days[-1]['league_all_star_team']
+        data['dream_team'] = dream_team and dict(dream_team, riders=[
+            dict(rider, pointHistory=point_history.get(rider['name'], [])) for rider in dream_team['riders']])
+        data['league_all_star_team'] = all_star_team and dict(all_star_team, riders=[
+            dict(rider, team=rider_teams.get(rider['name'])) for rider in all_star_team['riders']])
+        data['top_50_efficiency'] = ca.create_top_50_efficiency_data(data['cyclists'])
+    if history_dir:
+        history_store.save()
+    else:
+        shutil.rmtree(store_dir, ignore_errors=True)
+    print(f"Replayed {len(days)} days, {len(solved)} distinct, {hits} from the cache", file=sys.stderr)
+    return {'days': days, 'data': data}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild the day-by-day state from past snapshots of the output")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--git', metavar='PATH', action='append',
+                        help="output file whose git history is replayed, relative to the repository root; repeat to "
+                             f"fall back to further files (default {' then '.join(snapshot_paths())})")
+    source.add_argument('--archive', metavar='DIR',
+                        help=f"directory of archived .json/.json.gz outputs ({OUTPUT_FILE} or {CURRENT_NAME}) to replay instead")
+    parser.add_argument('--repo', default='.', help="git repository (default: the current directory)")
+    parser.add_argument('--rev', default='HEAD', help="revision whose history is replayed (default HEAD)")
+    parser.add_argument('--output', default=REPLAY_OUTPUT_FILE, help=f"result path (default {REPLAY_OUTPUT_FILE})")
+    parser.add_argument('--processes', type=int, default=REPLAY_PROCESSES, help="worker processes (default: every CPU)")
+    parser.add_argument('--history-store', metavar='DIR', help="also save the season's HistoryStore here")
+    parser.add_argument('--no-cache', action='store_true', help=f"solve every day again instead of using {REPLAY_CACHE_DIR}")
+    args = parser.parse_args(argv)
+
+    snapshots = archive_snapshots(args.archive) if args.archive else git_snapshots(args.git, args.repo, args.rev)
+    result = replay(snapshots, args.processes, None if args.no_cache else REPLAY_CACHE_DIR, args.history_store)
+    write_atomic(args.output, dumps(result, ca.numpy_to_python, indent=True))
+    print(f"Replay written to {args.output}", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+import os
+import sys
+import json
+import time
+import hashlib
+from config import ROSTER_STORE_MAX_AGE
+
+class RosterStore:
+    """Team rosters from earlier runs, keyed by roster URL and persisted as JSON.
+
+    A stored roster is reused while the team's fingerprint (its name and URL on
+    the league page) is unchanged. Transfers don't change the league page, so
+    each entry also keeps the team's points minus its riders' points when it
+    was fetched: while the roster stays the same, that offset does too, as the
+    team scores exactly what its riders score. A different offset on a later
+    run means riders were swapped and the roster is fetched again. When the
+    riders' points aren't known the check is skipped, and max_age seconds is
+    the backstop, also for swaps whose riders haven't scored since. Losing the
+    file only costs re-fetching the rosters.
+    """
+
+    def __init__(self, path=None, max_age=ROSTER_STORE_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self.entries = {}
+        self.changed = False
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable roster store {path}: {e}", file=sys.stderr)
+
+    @staticmethod
+    def fingerprint(team_name, url):
+        return hashlib.sha256(f"{team_name}\n{url}".encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def points_offset(team_points, roster, rider_points):
+        """team_points less the roster's current rider points, or None when a rider's points are unknown."""
+        if team_points is None or rider_points is None or any(name not in rider_points for name in roster):
+            return None
+        return team_points - sum(rider_points[name] for name in roster)
+
+    def get(self, url, fingerprint, team_points=None, rider_points=None, now=None):
+        now = time.time() if now is None else now
+        entry = self.entries.get(url)
+        # Entries from before fetched_at was stored count as expired
+        if not entry or entry['fingerprint'] != fingerprint or now - entry.get('fetched_at', 0) >= self.max_age:
+            return None
+        offset = self.points_offset(team_points, entry['roster'], rider_points)
+        if offset is not None:
+            if entry.get('offset') is None:
+                entry['offset'] = offset
+                self.changed = True
+            elif abs(offset - entry['offset']) > 1e-6:
+                return None
+        return entry['roster']
+
+    def put(self, url, fingerprint, roster, team_points=None, rider_points=None, now=None):
+        now = time.time() if now is None else now
+        self.entries[url] = {'fingerprint': fingerprint, 'roster': roster, 'fetched_at': now,
+                             'offset': self.points_offset(team_points, roster, rider_points)}
+        self.changed = True
+
+    def retain(self, urls):
+        """Forget teams that are no longer in the league."""
+        urls = set(urls)
+        for url in [url for url in self.entries if url not in urls]:
+            del self.entries[url]
+            self.changed = True
+
+    def save(self):
+        if not self.path or not self.changed:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+        self.changed = False
@@ -0,0 +1,84 @@
+import os
+import hashlib
+import numpy as np
+
+class ScoreIndex:
+    """Sorted scores of a comparison league answering rank/percentile queries by binary search.
+
+    Scores are kept per source page so a refresh only touches the pages whose
+    scores changed. Ranks follow calculate_rank_and_percentile: 1 + the number
+    of entries with strictly more points, so ties share the better rank, a
+    score above every entry ranks 1 and one below every entry ranks last + 1.
+    """
+
+    def __init__(self, scores=()):
+        self.scores = np.sort(np.asarray(scores, dtype=float))
+        self.pages = {}  # page key -> (fingerprint, sorted scores)
+
+    def __len__(self):
+        return len(self.scores)
+
+    @staticmethod
+    def fingerprint(scores):
+        return hashlib.sha256(np.asarray(scores, dtype=float).tobytes()).hexdigest()[:16]
+
+    def _remove(self, values):
+        positions = np.searchsorted(self.scores, values, side='left')
+        # Equal values are interchangeable: drop the k-th copy of a repeated value at position + k
+        repeat = np.arange(len(values)) - np.searchsorted(values, values, side='left')
+        self.scores = np.delete(self.scores, positions + repeat)
+
+    def update_page(self, key, scores):
+        """Replace the scores contributed by page `key`; returns False when they are unchanged."""
+        fingerprint = self.fingerprint(scores)
+        old = self.pages.get(key)
+        if old is not None and old[0] == fingerprint:
+            return False
+        values = np.sort(np.asarray(scores, dtype=float))
+        if old is not None:
+            self._remove(old[1])
+        self.scores = np.insert(self.scores, np.searchsorted(self.scores, values), values)
+        self.pages[key] = (fingerprint, values)
+        return True
+
+    def retain_pages(self, keys):
+        """Drop the scores of pages that no longer exist (e.g. the league got shorter)."""
+        for key in [key for key in self.pages if key not in set(keys)]:
+            self._remove(self.pages.pop(key)[1])
+
+    def rank(self, points):
+        """(ranks, percentiles) arrays for every value in `points`; an empty league ranks everyone 1st."""
+        points = np.atleast_1d(np.asarray(points, dtype=float))
+        size = len(self.scores)
+        ranks = 1 + size - np.searchsorted(self.scores, points, side='right')
+        percentiles = (1 - (ranks - 1) / size) * 100 if size else np.full(len(points), 100.0)
+        return ranks, percentiles
+
+    @classmethod
+    def load(cls, path):
+        """The index saved at `path`, or an empty one if there is none (or it is unreadable)."""
+        index = cls()
+        if not path or not os.path.exists(path):
+            return index
+        try:
+            with np.load(path) as stored:
+                offsets = stored['page_offsets']
+                for i, (key, fingerprint) in enumerate(zip(stored['page_keys'], stored['page_fingerprints'])):
+                    index.pages[str(key)] = (str(fingerprint), stored['page_scores'][offsets[i]:offsets[i + 1]])
+                index.scores = stored['scores']
+        except (OSError, ValueError, KeyError):
+            return cls()
+        return index
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        keys = list(self.pages)
+        page_scores = [self.pages[key][1] for key in keys]
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path,
+                 scores=self.scores,
+                 page_keys=np.array(keys, dtype=str),
+                 page_fingerprints=np.array([self.pages[key][0] for key in keys], dtype=str),
+                 page_offsets=np.cumsum([0] + [len(scores) for scores in page_scores]),
+                 page_scores=np.concatenate(page_scores) if page_scores else np.empty(0))
+        os.replace(tmp_path, path)
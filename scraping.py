@@ -0,0 +1,254 @@
+import sys
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+from config import (WITHDRAWALS_URL, LEAGUE_SCORES_URL, TWITTER_LEAGUE_URL, FETCH_CONCURRENCY,
+                    MAX_LEAGUE_PAGES)
+from html_parsing import iter_table_rows, make_soup
+from http_client import fetch_page, fetch_parsed
+from roster_store import RosterStore
+
+def fetch_html_content(url):
+    try:
+        return fetch_page(url).text
+    except requests.RequestException as e:
+        print(f"Error fetching URL {url}: {e}", file=sys.stderr)
+        raise
+
+
+def parse_withdrawals(page):
+    soup = make_soup(page.content)
+
+    withdrawals = []
+
+    for stage_div in soup.find_all('div', class_='rankingTables__item'):
+        stage_number = stage_div.find('div', class_='rankingTables__caption').text.strip().split()[1]
+
+        table = stage_div.find('table', class_='rankingTable')
+        if table:
+            for row in table.find_all('tr')[1:]:  # Skip header row
+                cells = row.find_all('td')
+                if len(cells) >= 3:
+                    rider_name = format_withdrawal_name(cells[1].text.strip())
+                    team_name = cells[2].text.strip()
+                    withdrawals.append({
+                        'stage': int(stage_number),
+                        'rider': rider_name,
+                        'team': team_name
+                    })
+
+    return withdrawals
+
+
+def fetch_withdrawals(url=WITHDRAWALS_URL):
+    try:
+        return fetch_parsed(url, parse_withdrawals, 'withdrawals')
+    except requests.RequestException as e:
+        print(f"Error fetching withdrawals: {e}", file=sys.stderr)
+        return []
+
+
+def extract_numeric(value):
+    import re
+    match = re.search(r'\d+(\.\d+)?', value)
+    if match:
+        return float(match.group())
+    else:
+        print(f"Error extracting numeric value from: {value}", file=sys.stderr)
+        return 0.0
+
+
+def iter_cyclists(html_content, backend=None):
+    """Yield a cyclist dict for each rider row as the table is parsed."""
+    for cols in iter_table_rows(html_content, backend):
+        if len(cols) >= 7:
+            try:
+                name = cols[1]
+                team = cols[2]
+                role = cols[3]
+                cost = extract_numeric(cols[4])
+                ownership = extract_numeric(cols[5])
+                points = extract_numeric(cols[6])
+
+                cost_per_point = "Infinity" if points == 0 else cost / points
+
+                yield {
+                    'name': name,
+                    'team': team,
+                    'role': role,
+                    'cost': cost,
+                    'ownership': ownership,
+                    'points': points,
+                    'cost_per_point': cost_per_point
+                }
+            except Exception as e:
+                print(f"Error processing row: {e}", file=sys.stderr)
+
+
+def analyze_cyclists(html_content, backend=None):
+    cyclists = list(iter_cyclists(html_content, backend))
+
+    if not cyclists:
+        print("No cyclists data extracted. Check if the page structure has changed.", file=sys.stderr)
+
+    return cyclists
+
+
+def parse_riders_page(page):
+    print("Analyzing new cyclist data", file=sys.stderr)
+    return analyze_cyclists(page.text)
+
+
+def parse_team_roster(page):
+    soup = make_soup(page.text)
+
+    riders = []
+    table = soup.find('table', class_='responsive')
+    if table:
+        for row in table.find_all('tr'):
+            name_cell = row.find('td')
+            if name_cell:
+                name_link = name_cell.find('a')
+                if name_link:
+                    rider_name = name_link.text.strip()
+                    riders.append(rider_name)
+
+    return riders
+
+
+def fetch_team_roster(url):
+    try:
+        riders = fetch_parsed(url, parse_team_roster, 'team_roster')
+
+        if not riders:
+            print(f"No riders found for URL: {url}", file=sys.stderr)
+
+        return riders
+    except requests.RequestException as e:
+        print(f"Error fetching team roster from URL {url}: {e}", file=sys.stderr)
+        return []
+
+
+def fetch_league_scores(url=LEAGUE_SCORES_URL, roster_store=None, rider_points=None):
+    """Fetch league standings with each team's roster.
+
+    With a RosterStore, only rosters of new or renamed teams, of teams whose
+    points no longer match their stored riders' (rider_points, {name: points}
+    from the riders page, see RosterStore) and rosters older than the store's
+    max_age are downloaded; teams still on 0 points are always re-fetched since
+    rosters can change until the race starts.
+    """
+    page = fetch_page(url)
+    soup = make_soup(page.content)
+
+    teams = []
+    team_urls = []
+    to_fetch = []
+    for li in soup.select('#users .list li'):
+        team_name = li.select_one('h3.name a').text.strip()
+        points = int(li.select_one('p.born b').text.strip())
+        # Roster links are relative to the league page
+        team_url = urljoin(url, li.select_one('h3.name a')['href'])
+        team_urls.append(team_url)
+
+        team = {
+            "name": team_name,
+            "points": points
+        }
+        teams.append(team)
+
+        fingerprint = RosterStore.fingerprint(team_name, team_url)
+        roster = roster_store.get(team_url, fingerprint, points, rider_points) if roster_store is not None and points else None
+        if roster is None:
+            to_fetch.append((team, team_url, fingerprint))
+        else:
+            team['roster'] = roster
+
+    # Download the remaining rosters concurrently; map() keeps them in league order
+    with ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY) as executor:
+        rosters = executor.map(fetch_team_roster, [team_url for _, team_url, _ in to_fetch])
+        for (team, team_url, fingerprint), team_roster in zip(to_fetch, rosters):
+            team['roster'] = team_roster
+            # Failed fetches return an empty roster; leave those to be retried next run
+            if roster_store is not None and team_roster:
+                roster_store.put(team_url, fingerprint, team_roster, team['points'], rider_points)
+
+    if roster_store is not None:
+        roster_store.retain(team_urls)
+        print(f"Fetched {len(to_fetch)} of {len(teams)} team rosters, reused the rest", file=sys.stderr)
+
+    # Sort teams by points in descending order
+    teams.sort(key=lambda x: x['points'], reverse=True)
+
+    return teams
+
+
+def parse_league_points(page):
+    soup = make_soup(page.content)
+
+    scores = []
+    for li in soup.select('#users .list li'):
+        points = int(li.select_one('p.born b').text.strip())
+        scores.append(points)
+
+    return scores
+
+
+def parse_league_page(page):
+    """Points of every entry on one league page, and the URL of the next page if the league is paginated."""
+    soup = make_soup(page.content)
+    scores = [int(li.select_one('p.born b').text.strip()) for li in soup.select('#users .list li')]
+    next_link = soup.select_one('a[rel~=next]') or soup.find(
+        'a', string=lambda text: text is not None and text.strip().lower() in ('next', 'next »', '»'))
+    next_url = urljoin(page.url, next_link['href']) if next_link is not None and next_link.get('href') else None
+    return {'scores': scores, 'next': next_url}
+
+
+def fetch_twitter_league_data(url=TWITTER_LEAGUE_URL, index_file=None):
+    """ScoreIndex of a (possibly paginated) comparison league, refreshed from the one saved at index_file.
+
+    Only pages whose scores changed since the saved index are merged in again.
+    """
+    from score_index import ScoreIndex  # numpy; only needed once a comparison league is configured
+    index = ScoreIndex.load(index_file)
+    page_urls = []
+    page_url = url
+    while page_url and page_url not in page_urls and len(page_urls) < MAX_LEAGUE_PAGES:
+        page_urls.append(page_url)
+        page = fetch_parsed(page_url, parse_league_page, 'league_page')
+        if index.update_page(page_url, page['scores']):
+            print(f"League page {page_url} changed ({len(page['scores'])} entries)", file=sys.stderr)
+        page_url = page['next']
+    index.retain_pages(page_urls)
+    if index_file:
+        index.save(index_file)
+    return index
+
+
+def format_withdrawal_name(name):
+    name = name.strip()
+    parts = name.split()
+    if len(parts) <= 1:
+        return name.capitalize()
+
+    # List of common name prefixes (in lowercase)
+    prefixes = ['van', 'de', 'der', 'den', 'von', 'le', 'la', 'du', 'des', 'del', 'della', 'di', 'da', 'mac', 'mc']
+
+    # Check if the name is in all caps (indicating it's in "LastName FirstName" format)
+    if parts[0].isupper():
+        # It's in "LastName FirstName" format, so we need to swap
+        last_name = []
+        first_name = []
+        prefix_ended = False
+        for part in parts:
+            if not prefix_ended and part.lower() in prefixes:
+                last_name.append(part.lower().capitalize())
+            elif not prefix_ended:
+                last_name.append(part.capitalize())
+                prefix_ended = True
+            else:
+                first_name.append(part.capitalize())
+        return f"{' '.join(first_name)} {' '.join(last_name)}"
+    else:
+        # It's already in "FirstName LastName" format
+        return ' '.join(part.capitalize() for part in parts)
@@ -266,7 +266,7 @@ function updateLeagueTeamRosterChart() {
     createResponsiveChart('leagueTeamRosterChart', [trace], layout);
 
     // Calculate and create the daily points chart
-    const dailyPoints = calculateDailyPoints(team.roster);
+    const dailyPoints = precomputedDailyPoints(selectedTeam) || calculateDailyPoints(team.roster);
     createDailyPointsChart(dailyPoints, selectedTeam);
     applyWithdrawnRiderStyles();
     updateBestRoleSelections();
@@ -320,8 +320,54 @@ function updateCyclingTeamRosterDisplay() {
     displayTeamRiskAssessment();
 }
 
+// Rebuild the cyclist-data.json shape from the split output written by cyclist_analyzer.py
+function joinSplitData(current, days) {
+    const data = Object.assign({}, current);
+    data.cyclists = current.cyclists.map(c => Object.assign({}, c, { pointHistory: [] }));
+    const byName = {};
+    data.cyclists.forEach(c => { byName[c.name] = c; });
+    data.league_scores = { current: current.league_scores.current, history: [] };
+    data.mvp_history = [];
+    data.mip_history = [];
+
+    days.sort((a, b) => a.date.localeCompare(b.date)).forEach(day => {
+        Object.entries(day.points || {}).forEach(([name, points]) => {
+            if (byName[name]) {
+                byName[name].pointHistory.push({ date: day.date, points: points });
+            }
+        });
+        if (day.league_scores) {
+            data.league_scores.history.push({ date: day.date, scores: day.league_scores });
+        }
+        if (day.mvp) data.mvp_history.push(day.mvp);
+        if (day.mip) data.mip_history.push(day.mip);
+    });
+    return data;
+}
+
+// Load data/manifest.json and its shards, falling back to the monolithic cyclist-data.json
+function loadCyclistData() {
+    const result = $.Deferred();
+    const fallback = () => $.getJSON('cyclist-data.json').done(result.resolve).fail(result.reject);
+
+    $.getJSON('data/manifest.json', { t: Date.now() }).done(function(manifest) {
+        // The history shards are still needed next to chart_data: rider point histories (trajectories,
+        // risk) and MVP/MIP history only come from them. Shard URLs carry their content hash so the
+        // browser can cache unchanged days
+        const files = [manifest.current].concat(manifest.history);
+        const requests = files.map(f => $.getJSON('data/' + f.file, { v: f.sha256.slice(0, 12) }));
+        $.when.apply($, requests).done(function() {
+            const responses = requests.length === 1 ? [arguments] : Array.from(arguments);
+            const payloads = responses.map(r => r[0]);
+            result.resolve(joinSplitData(payloads[0], payloads.slice(1)));
+        }).fail(result.reject);
+    }).fail(fallback);
+
+    return result.promise();
+}
+
 $(document).ready(function() {
-    $.getJSON('cyclist-data.json', function(data) {
+    loadCyclistData().done(function(data) {
         $('#loading').hide();
         $('#dashboard').show();
 
@@ -1269,22 +1315,36 @@ function createLeagueStandingsChart() {
     const teams = {};
     const colors = ['#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF', '#FF9F40'];
     
-    // Process the historical data
-    leagueHistory.forEach(entry => {
-        const date = new Date(entry.date);
-        entry.scores.forEach(score => {
-            if (!teams[score.name]) {
-                teams[score.name] = {
-                    name: score.name,
-                    x: [],
-                    y: [],
-                    color: colors[Object.keys(teams).length % colors.length]
-                };
-            }
-            teams[score.name].x.push(date.getTime());
-            teams[score.name].y.push(score.points);
+    // Use the per-team series precomputed by cyclist_analyzer.py, else process the historical data
+    const series = chartData('league');
+    if (series) {
+        series.teams.forEach((name, i) => {
+            const team = { name: name, x: [], y: [], color: colors[i % colors.length] };
+            series.dates.forEach((date, j) => {
+                if (series.points[i][j] !== null) {
+                    team.x.push(new Date(date).getTime());
+                    team.y.push(series.points[i][j]);
+                }
+            });
+            teams[name] = team;
         });
-    });
+    } else {
+        leagueHistory.forEach(entry => {
+            const date = new Date(entry.date);
+            entry.scores.forEach(score => {
+                if (!teams[score.name]) {
+                    teams[score.name] = {
+                        name: score.name,
+                        x: [],
+                        y: [],
+                        color: colors[Object.keys(teams).length % colors.length]
+                    };
+                }
+                teams[score.name].x.push(date.getTime());
+                teams[score.name].y.push(score.points);
+            });
+        });
+    }
 
     const traces = [];
     Object.values(teams).forEach(team => {
@@ -1452,23 +1512,56 @@ function makeTableResponsive() {
     // Update on window resize
     window.addEventListener('resize', updateTableDisplay);
 }
+
+// Ready-to-plot series from chart_data in cyclist_analyzer.py; null for data written before it existed
+function chartData(section) {
+    if (!cyclistData || !cyclistData.chart_data) {
+        return null;
+    }
+    return cyclistData.chart_data[section] || null;
+}
+
+// Points added per team since the previous day. Uses league_changes from cyclist_analyzer.py;
+// output written before it existed falls back to comparing the last two history entries.
+// points_delta is null for teams missing from the previous day.
+function latestLeagueChanges() {
+    if (!cyclistData) {
+        return null;
+    }
+    if (cyclistData.league_changes && cyclistData.league_changes.previous_date) {
+        return cyclistData.league_changes;
+    }
+    if (!cyclistData.league_scores || !cyclistData.league_scores.history || cyclistData.league_scores.history.length < 2) {
+        return null;
+    }
+
+    const history = cyclistData.league_scores.history;
+    const latestData = history[history.length - 1];
+    const previousPoints = new Map(history[history.length - 2].scores.map(t => [t.name, t.points]));
+    return {
+        date: latestData.date,
+        teams: latestData.scores.map(team => ({
+            name: team.name,
+            points: team.points,
+            points_delta: previousPoints.has(team.name) ? team.points - previousPoints.get(team.name) : null
+        }))
+    };
+}
+
 function createLatestPointsUpdateChart() {
     // Ensure we have the necessary data
-    if (!cyclistData || !cyclistData.league_scores || !cyclistData.league_scores.history || cyclistData.league_scores.history.length < 2) {
+    const changes = latestLeagueChanges();
+    if (!changes) {
         console.error('Insufficient data for latest points update chart');
         return;
     }
 
-    const latestData = cyclistData.league_scores.history[cyclistData.league_scores.history.length - 1];
-    const previousData = cyclistData.league_scores.history[cyclistData.league_scores.history.length - 2];
-
     // Calculate the point changes
-    const pointChanges = latestData.scores.map(team => {
-        const previousTeam = previousData.scores.find(t => t.name === team.name);
-        const previousPoints = previousTeam ? previousTeam.points : 0;
+    const pointChanges = changes.teams.map(team => {
+        const change = team.points_delta === null ? team.points : team.points_delta;
         return {
             name: team.name,
-            change: Math.max(0, team.points - previousPoints)  // Ensure change is non-negative
+            change: Math.max(0, change)  // Ensure change is non-negative
         };
     });
 
@@ -1567,7 +1660,13 @@ function generateNewsContent() {
     newsHtml += '<div class="news-row">';
 
     let standings = [];
-    if (cyclistData && cyclistData.league_scores && cyclistData.league_scores.current) {
+    const leagueSeries = chartData('league');
+    if (leagueSeries && leagueSeries.dates.length > 0) {
+        const last = leagueSeries.dates.length - 1;
+        standings = leagueSeries.standings
+            .filter(i => leagueSeries.points[i][last] !== null)
+            .map(i => ({ name: leagueSeries.teams[i], points: leagueSeries.points[i][last] }));
+    } else if (cyclistData && cyclistData.league_scores && cyclistData.league_scores.current) {
         standings = cyclistData.league_scores.current.sort((a, b) => b.points - a.points);
     }
 
@@ -1577,11 +1676,19 @@ function generateNewsContent() {
     newsHtml += '<h3>Overall Standings</h3>';
     if (standings.length > 0) {
         newsHtml += '<div class="standings-list">';
+        const rankChanges = new Map(((cyclistData.league_changes || {}).teams || []).map(t => [t.name, t.rank_change]));
         standings.slice(0, 5).forEach((team, index) => {
+            const rankChange = rankChanges.get(team.name);
+            let movement = '';
+            if (rankChange > 0) {
+                movement = ` <span class="team-change positive-change">&#9650;${rankChange}</span>`;
+            } else if (rankChange < 0) {
+                movement = ` <span class="team-change negative-change">&#9660;${-rankChange}</span>`;
+            }
             newsHtml += `<div class="standing-item">
                 <span class="standing-rank">${index + 1}</span>
                 <span class="team-name"><a href="#" class="team-link" data-team="${team.name}">${team.name}</a></span>
-                <span class="team-points">${team.points} points</span>
+                <span class="team-points">${team.points} points${movement}</span>
             </div>`;
         });
         newsHtml += '</div>';
@@ -1594,23 +1701,23 @@ function generateNewsContent() {
     // Recent Points Added (right column)
     newsHtml += '<div class="news-column">';
     newsHtml += '<div class="news-section news-score-changes">';
-    if (cyclistData && cyclistData.league_scores && cyclistData.league_scores.history && cyclistData.league_scores.history.length >= 2) {
-        const latestHistory = cyclistData.league_scores.history[cyclistData.league_scores.history.length - 1];
-        const previousHistory = cyclistData.league_scores.history[cyclistData.league_scores.history.length - 2];
-
-        const latestDate = new Date(latestHistory.date);
+    const leagueChanges = latestLeagueChanges();
+    if (leagueChanges) {
+        const latestDate = new Date(leagueChanges.date);
         newsHtml += `<h3>Recent Points Added <span class="news-date">(${latestDate.toDateString()})</span></h3>`;
 
-        const scoreChanges = latestHistory.scores.map(latest => {
-            const previous = previousHistory.scores.find(prev => prev.name === latest.name);
-            return {
+        // top_movers is already sorted; otherwise sort the changes by amount (descending)
+        const movers = chartData('top_movers');
+        let scoreChanges;
+        if (movers && movers.league_date === leagueChanges.date) {
+            scoreChanges = movers.teams.map(team => ({ name: team.name, change: Math.max(0, team.points_delta) }));
+        } else {
+            scoreChanges = leagueChanges.teams.map(latest => ({
                 name: latest.name,
-                change: Math.max(0, latest.points - (previous ? previous.points : latest.points))
-            };
-        });
-
-        // Sort score changes by the amount of change (descending)
-        scoreChanges.sort((a, b) => b.change - a.change);
+                change: Math.max(0, latest.points_delta === null ? 0 : latest.points_delta)
+            }));
+            scoreChanges.sort((a, b) => b.change - a.change);
+        }
 
         newsHtml += '<div class="score-changes-list">';
         scoreChanges.slice(0, 5).forEach((team, index) => {
@@ -2549,6 +2656,24 @@ function displayTeamEfficiencyChart() {
     createResponsiveChart('teamEfficiencyChart', [trace], layout);
 }
 
+// Same shape as calculateDailyPoints, from the roster series in chart_data
+function precomputedDailyPoints(teamName) {
+    const rosters = chartData('rosters');
+    const series = rosters && rosters.teams[teamName];
+    if (!series || rosters.dates.length === 0) {
+        return null;
+    }
+
+    const dailyPoints = {};
+    rosters.dates.forEach((date, j) => {
+        dailyPoints[date] = {};
+        series.riders.forEach((riderName, i) => {
+            dailyPoints[date][normalizeNameDiacritics(riderName)] = series.points[i][j];
+        });
+    });
+    return dailyPoints;
+}
+
 function calculateDailyPoints(rosterNames) {
     const dailyPoints = {};
     
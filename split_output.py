@@ -0,0 +1,116 @@
+import os
+import sys
+import json
+import gzip
+import hashlib
+from output_writer import dumps, file_hash, write_atomic
+
+MANIFEST_NAME = 'manifest.json'
+CURRENT_NAME = 'current.json'
+HISTORY_DIR = 'history'
+
+def split_data(data):
+    """Split the monolithic output into a current snapshot and one history shard per day."""
+    days = {}
+
+    def day(date):
+        return days.setdefault(date, {'date': date})
+
+    current = {key: value for key, value in data.items()
+               if key not in ('cyclists', 'league_scores', 'mvp_history', 'mip_history')}
+    current['cyclists'] = []
+    for cyclist in data['cyclists']:
+        current['cyclists'].append({key: value for key, value in cyclist.items() if key != 'pointHistory'})
+        for entry in cyclist.get('pointHistory', []):
+            day(entry['date']).setdefault('points', {})[cyclist['name']] = entry['points']
+
+    league_scores = data.get('league_scores') or {'current': [], 'history': []}
+    current['league_scores'] = {'current': league_scores['current']}
+    for entry in league_scores['history']:
+        day(entry['date'])['league_scores'] = entry['scores']
+    for entry in data.get('mvp_history', []):
+        day(entry['date'])['mvp'] = entry
+    for entry in data.get('mip_history', []):
+        day(entry['date'])['mip'] = entry
+
+    return current, [days[date] for date in sorted(days)]
+
+def join_data(current, days):
+    """Inverse of split_data: rebuild the monolithic output shape."""
+    data = dict(current)
+    data['cyclists'] = [dict(cyclist, pointHistory=[]) for cyclist in current['cyclists']]
+    by_name = {cyclist['name']: cyclist for cyclist in data['cyclists']}
+    data['league_scores'] = {'current': current['league_scores']['current'], 'history': []}
+    data['mvp_history'] = []
+    data['mip_history'] = []
+
+    for shard in sorted(days, key=lambda d: d['date']):
+        date = shard['date']
+        for name, points in shard.get('points', {}).items():
+            if name in by_name:
+                by_name[name]['pointHistory'].append({'date': date, 'points': points})
+        if 'league_scores' in shard:
+            data['league_scores']['history'].append({'date': date, 'scores': shard['league_scores']})
+        if 'mvp' in shard:
+            data['mvp_history'].append(shard['mvp'])
+        if 'mip' in shard:
+            data['mip_history'].append(shard['mip'])
+    return data
+
+def _write_if_changed(directory, name, content, write_gzip):
+    """Write content unless the file already holds it; return its manifest entry and whether it was written."""
+    path = os.path.join(directory, name)
+    content_hash = hashlib.sha256(content).hexdigest()
+    written = False
+    if file_hash(path) != content_hash:
+        write_atomic(path, content)
+        written = True
+    if write_gzip and (written or not os.path.exists(path + '.gz')):
+        # mtime=0 keeps the gzip bytes stable so unchanged shards produce no diff
+        write_atomic(path + '.gz', gzip.compress(content, mtime=0))
+    return {'file': name, 'sha256': content_hash, 'bytes': len(content)}, written
+
+def _read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_split_output(data, directory, default=None, write_gzip=False):
+    """Write current.json, history/<date>.json shards and manifest.json, skipping unchanged files."""
+    previous = _read_manifest(directory) or {}
+    current, days = split_data(data)
+    manifest = {'format': 1, 'last_update': data.get('last_update'), 'history': []}
+
+    manifest['current'], written = _write_if_changed(directory, CURRENT_NAME, dumps(current, default), write_gzip)
+    for shard in days:
+        name = f"{HISTORY_DIR}/{shard['date']}.json"
+        entry, changed = _write_if_changed(directory, name, dumps(shard, default), write_gzip)
+        manifest['history'].append(dict(entry, date=shard['date']))
+        written += changed
+
+    # Drop shards that fell out of the retention window
+    kept = {entry['file'] for entry in manifest['history']}
+    for entry in previous.get('history', []):
+        if entry['file'] not in kept:
+            for path in (os.path.join(directory, entry['file']), os.path.join(directory, entry['file'] + '.gz')):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    _write_if_changed(directory, MANIFEST_NAME, dumps(manifest, default), write_gzip)
+    print(f"Split output: {written} of {len(days) + 1} files changed in {directory}", file=sys.stderr)
+    return manifest
+
+def load_split_output(directory):
+    """Rebuild the monolithic data from a split output directory, or return None if there is none."""
+    manifest = _read_manifest(directory)
+    if manifest is None:
+        return None
+    with open(os.path.join(directory, manifest['current']['file']), 'r', encoding='utf-8') as f:
+        current = json.load(f)
+    days = []
+    for entry in manifest['history']:
+        with open(os.path.join(directory, entry['file']), 'r', encoding='utf-8') as f:
+            days.append(json.load(f))
+    return join_data(current, days)
@@ -0,0 +1,319 @@
+import os
+import sys
+import time
+import heapq
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations_with_replacement, count
+from config import (TOTAL_CYCLISTS, MAX_COST, MIN_SPRINTERS, MIN_ALL_ROUNDERS, MIN_CLIMBERS,
+                    MIN_UNCLASSED, TEAM_SOLVER, TEAM_OBJECTIVE, SCENARIO_PROCESSES)
+
+# Role constraints from config.py; riders with any other role only count towards TOTAL_CYCLISTS
+ROLE_MINIMUMS = {
+    'Sprinter': MIN_SPRINTERS,
+    'All Rounder': MIN_ALL_ROUNDERS,
+    'Climber': MIN_CLIMBERS,
+    'Unclassed': MIN_UNCLASSED,
+}
+OTHER_ROLE = 'Other'
+
+# Running totals across solves in this process, read by the run report
+solver_stats = {'solves': 0, 'teams': 0, 'seconds': 0.0}
+
+def role_group(role):
+    return role if role in ROLE_MINIMUMS else OTHER_ROLE
+
+def _role_compositions():
+    """Every per-role rider count that satisfies the minimums and sums to TOTAL_CYCLISTS."""
+    groups = list(ROLE_MINIMUMS) + [OTHER_ROLE]
+    extra = TOTAL_CYCLISTS - sum(ROLE_MINIMUMS.values())
+    if extra < 0:
+        return []
+    compositions = []
+    for extra_roles in combinations_with_replacement(groups, extra):
+        counts = {group: ROLE_MINIMUMS.get(group, 0) for group in groups}
+        for group in extra_roles:
+            counts[group] += 1
+        compositions.append(counts)
+    return compositions
+
+ROLE_COMPOSITIONS = _role_compositions()
+
+def _add(a, b):
+    return (a[0] + b[0], a[1] + b[1])
+
+def _role_table(riders, max_pick, max_cost):
+    """Cardinality-constrained knapsack for one role.
+
+    table[k][c] is the best (value, rider indices) picking exactly k riders of total cost c,
+    where value is (points, riders kept from the previous team).
+    """
+    table = [[None] * (max_cost + 1) for _ in range(max_pick + 1)]
+    table[0][0] = ((0.0, 0), ())
+    for index, cost, value in riders:
+        for k in range(max_pick - 1, -1, -1):
+            row, next_row = table[k], table[k + 1]
+            for c in range(max_cost - cost, -1, -1):
+                entry = row[c]
+                if entry is None:
+                    continue
+                candidate = _add(entry[0], value)
+                current = next_row[c + cost]
+                if current is None or candidate > current[0]:
+                    next_row[c + cost] = (candidate, entry[1] + (index,))
+    return table
+
+def _merge(left, right, max_cost):
+    merged = [None] * (max_cost + 1)
+    for cl, el in enumerate(left):
+        if el is None:
+            continue
+        for cr in range(max_cost - cl + 1):
+            er = right[cr]
+            if er is None:
+                continue
+            value = _add(el[0], er[0])
+            current = merged[cl + cr]
+            if current is None or value > current[0]:
+                merged[cl + cr] = (value, el[1] + er[1])
+    return merged
+
+class TeamOptimizer:
+    """Team selection under the config.py constraints, reusable across rider subsets and point values.
+
+    The exact solver runs a knapsack per role and merges the tables for every valid role
+    composition, so the 9-rider problem needs no external solver. The CBC model is only
+    built when costs are fractional or TEAM_SOLVER is 'cbc', and is then reused between solves.
+    objective names the rider field maximised by default ('points' or 'projected_points').
+    """
+
+    def __init__(self, cyclists, solver=TEAM_SOLVER, objective=TEAM_OBJECTIVE):
+        self.cyclists = cyclists
+        self.objective = objective
+        self.groups = [role_group(c['role']) for c in cyclists]
+        integral_costs = all(float(c['cost']).is_integer() and c['cost'] >= 0 for c in cyclists)
+        if solver == 'auto':
+            solver = 'dp' if integral_costs else 'cbc'
+        elif solver == 'dp' and not integral_costs:
+            print("Fractional rider costs, using the CBC solver", file=sys.stderr)
+            solver = 'cbc'
+        self.solver = solver
+        self._lp = None
+        self.last_status = None
+
+    def solve(self, allowed=None, points=None, previous_team=None, include=(), exclude=(), max_cost=MAX_COST,
+              objective=None):
+        """Return (team, total_points, total_cost), or (None, 0, 0) when no team fits.
+
+        allowed restricts the pool to a set of rider names, points overrides the
+        per-rider objective (a list aligned with cyclists) and objective picks another
+        rider field for it; total_points sums that objective. previous_team is a
+        collection of rider names used to warm-start CBC and to break ties in favour
+        of keeping yesterday's riders. include/exclude force riders in or out of the
+        team and max_cost replaces the config.py budget.
+        """
+        teams = self.top_k(1, allowed, points, previous_team, include, exclude, max_cost, objective)
+        return teams[0] if teams else (None, 0, 0)
+
+    def top_k(self, k, allowed=None, points=None, previous_team=None, include=(), exclude=(), max_cost=MAX_COST,
+              objective=None):
+        """Return up to k distinct teams as (team, total_points, total_cost), best first.
+
+        Takes the same arguments as solve(). The exact solver enumerates teams by
+        partitioning the search space around each solution found (Lawler's method);
+        CBC re-solves its model with a no-good cut per team already returned.
+        """
+        if points is None:
+            points = [c.get(objective or self.objective, 0) for c in self.cyclists]
+        previous = set(previous_team or ())
+        exclude = set(exclude)
+        candidates = [i for i, c in enumerate(self.cyclists)
+                      if (allowed is None or c['name'] in allowed) and c['name'] not in exclude]
+        forced = {i for i, c in enumerate(self.cyclists) if c['name'] in set(include)}
+
+        start = time.perf_counter()
+        if self.solver == 'dp':
+            selections = self._top_k_dp(k, candidates, forced, points, previous, max_cost)
+        else:
+            selections = self._top_k_cbc(k, candidates, forced, points, previous, max_cost)
+        solver_stats['solves'] += 1
+        solver_stats['teams'] += len(selections)
+        solver_stats['seconds'] += time.perf_counter() - start
+
+        teams = []
+        for selected in selections:
+            team = [self.cyclists[i] for i in selected]
+            teams.append((team, sum(points[i] for i in selected), sum(c['cost'] for c in team)))
+        return teams
+
+    def _top_k_dp(self, k, candidates, forced, points, previous, max_cost):
+        def solve(excluded, fixed):
+            selected = self._solve_dp([i for i in candidates if i not in excluded], fixed, points, previous, max_cost)
+            if selected is None:
+                return None
+            return (-sum(points[i] for i in selected), sum(self.cyclists[i]['cost'] for i in selected),
+                    next(counter), selected, excluded, fixed)
+
+        counter = count()
+        queue = []
+        first = solve(frozenset(), frozenset(forced))
+        if first:
+            heapq.heappush(queue, first)
+
+        selections = []
+        while queue and len(selections) < k:
+            _, _, _, selected, excluded, fixed = heapq.heappop(queue)
+            selections.append(selected)
+            # The branches below only lead to further teams
+            if len(selections) == k:
+                break
+            # Partition the remaining teams: keep the first j free riders of this team, drop the next one
+            free = [i for i in selected if i not in fixed]
+            for j, dropped in enumerate(free):
+                branch = solve(excluded | {dropped}, fixed | frozenset(free[:j]))
+                if branch:
+                    heapq.heappush(queue, branch)
+
+        self.last_status = 'Optimal' if selections else 'Infeasible'
+        return selections
+
+    def _solve_dp(self, candidates, forced, points, previous, max_cost):
+        if not forced <= set(candidates):
+            return None
+        forced_cost = sum(int(self.cyclists[i]['cost']) for i in forced)
+        budget = max_cost - forced_cost
+        if budget < 0:
+            return None
+        forced_counts = {}
+        for i in forced:
+            forced_counts[self.groups[i]] = forced_counts.get(self.groups[i], 0) + 1
+        forced_value = (sum(points[i] for i in forced), sum(1 for i in forced if self.cyclists[i]['name'] in previous))
+
+        by_group = {}
+        for i in candidates:
+            if i in forced:
+                continue
+            c = self.cyclists[i]
+            by_group.setdefault(self.groups[i], []).append(
+                (i, int(c['cost']), (points[i], 1 if c['name'] in previous else 0)))
+
+        tables = {}
+        best = None
+        for counts in ROLE_COMPOSITIONS:
+            remaining = {group: n - forced_counts.get(group, 0) for group, n in counts.items()}
+            if min(remaining.values()) < 0:
+                continue
+            acc = [None] * (budget + 1)
+            acc[0] = (forced_value, tuple(forced))
+            for group, n in remaining.items():
+                if n == 0:
+                    continue
+                if group not in tables:
+                    max_pick = max(comp[group] for comp in ROLE_COMPOSITIONS)
+                    tables[group] = _role_table(by_group.get(group, []), max_pick, budget)
+                acc = _merge(acc, tables[group][n], budget)
+            for cost, entry in enumerate(acc):
+                # Prefer more points, then more kept riders, then the cheaper team
+                if entry is not None and (best is None or (entry[0], -cost) > (best[0], -best[1])):
+                    best = (entry[0], cost, entry[1])
+
+        return sorted(best[2]) if best else None
+
+    def _build_lp(self):
+        import pulp
+        prob = pulp.LpProblem("Team_Selection", pulp.LpMaximize)
+        variables = [pulp.LpVariable(f"rider_{i}", cat='Binary') for i in range(len(self.cyclists))]
+        prob += pulp.lpSum(variables) == TOTAL_CYCLISTS, "Total_cyclists"
+        prob += pulp.lpSum(c['cost'] * v for c, v in zip(self.cyclists, variables)) <= MAX_COST, "Maximum_cost"
+        for role, minimum in ROLE_MINIMUMS.items():
+            prob += pulp.lpSum(v for g, v in zip(self.groups, variables) if g == role) >= minimum, f"Min_{role.replace(' ', '_')}"
+        return prob, variables
+
+    def _top_k_cbc(self, k, candidates, forced, points, previous, max_cost):
+        import pulp
+        if self._lp is None:
+            self._lp = self._build_lp()
+        prob, variables = self._lp
+        allowed = set(candidates)
+        if not forced <= allowed:
+            self.last_status = 'Infeasible'
+            return []
+        for i, (c, v) in enumerate(zip(self.cyclists, variables)):
+            v.upBound = 1 if i in allowed else 0
+            v.lowBound = 1 if i in forced else 0
+            v.setInitialValue(1 if i in forced or (i in allowed and c['name'] in previous) else 0, check=False)
+        prob.constraints["Maximum_cost"].changeRHS(max_cost)
+        prob.setObjective(pulp.lpSum(points[i] * variables[i] for i in candidates))
+
+        selections = []
+        cuts = []
+        try:
+            while len(selections) < k:
+                prob.solve(pulp.PULP_CBC_CMD(msg=False, warmStart=bool(previous) and not selections))
+                self.last_status = pulp.LpStatus[prob.status]
+                if self.last_status != "Optimal":
+                    break
+                selected = [i for i in candidates if variables[i].value() is not None and variables[i].value() > 0.5]
+                selections.append(selected)
+                # No-good cut: the next solve must differ from this team in at least one rider
+                name = f"No_good_{len(cuts)}"
+                prob += pulp.lpSum(variables[i] for i in selected) <= len(selected) - 1, name
+                cuts.append(name)
+        finally:
+            for name in cuts:
+                del prob.constraints[name]
+            prob.constraints["Maximum_cost"].changeRHS(MAX_COST)
+            for v in variables:
+                v.lowBound = 0
+        if selections:
+            self.last_status = 'Optimal'
+        return selections
+
+def team_summary(team, total_points, total_cost):
+    return {
+        'riders': [
+            {
+                'name': rider['name'],
+                'role': rider['role'],
+                'cost': rider['cost'],
+                'points': rider['points']
+            } for rider in team
+        ],
+        'total_points': total_points,
+        'total_cost': total_cost
+    }
+
+def run_scenario(optimizer, scenario):
+    """Solve one what-if scenario.
+
+    A scenario is a dict with a 'label' and any of 'top_k', 'max_cost', 'include',
+    'exclude' and 'objective'; the result is the scenario plus its 'teams'.
+    """
+    teams = optimizer.top_k(
+        scenario.get('top_k', 1),
+        include=scenario.get('include', ()),
+        exclude=scenario.get('exclude', ()),
+        max_cost=scenario.get('max_cost', MAX_COST),
+        objective=scenario.get('objective'),
+    )
+    return dict(scenario, teams=[team_summary(*team) for team in teams])
+
+_worker_optimizer = None
+
+def _init_worker(cyclists, solver, objective):
+    global _worker_optimizer
+    _worker_optimizer = TeamOptimizer(cyclists, solver, objective)
+
+def _run_in_worker(scenario):
+    return run_scenario(_worker_optimizer, scenario)
+
+def run_scenarios(optimizer, scenarios, processes=SCENARIO_PROCESSES):
+    """Solve a batch of scenarios, across a process pool when processes > 1."""
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes <= 1 or len(scenarios) < 2:
+        return [run_scenario(optimizer, scenario) for scenario in scenarios]
+
+    # Each worker builds its own optimizer once and reuses it for its share of the batch
+    with ProcessPoolExecutor(max_workers=min(processes, len(scenarios)), initializer=_init_worker,
+                             initargs=(optimizer.cyclists, optimizer.solver, optimizer.objective)) as executor:
+        return list(executor.map(_run_in_worker, scenarios))
@@ -0,0 +1,251 @@
+import sys
+import numpy as np
+from collections import Counter
+from itertools import combinations, combinations_with_replacement
+from ownership_analysis import roster_indices
+from team_optimizer import ROLE_MINIMUMS, OTHER_ROLE, role_group
+from config import TOTAL_CYCLISTS, MAX_COST, TRANSFER_MAX_SWAPS, TRANSFER_OBJECTIVE, TRANSFER_CHUNK
+
+GROUPS = list(ROLE_MINIMUMS) + [OTHER_ROLE]
+GROUP_MINIMUMS = np.array([ROLE_MINIMUMS.get(group, 0) for group in GROUPS])
+
+def candidate_lists(groups, cost, value, available, depth):
+    """Per role group, the riders worth buying, by value (highest first).
+
+    A rider that at least depth[g] others of its group match or beat on both
+    cost and value is never needed: some of those are always free to take its
+    place. depth[g] is the most riders of group g any team owns plus the
+    number of transfers, so the lists stay exact whatever a team owns. Riders
+    tied on cost and value only count the earlier ones (by index) as
+    dominating them, so a large tied group keeps its first depth[g] riders
+    rather than losing them all.
+    """
+    lists = []
+    for g in range(len(GROUPS)):
+        members = np.flatnonzero((groups == g) & available)
+        c, v = cost[members], value[members]
+        better = (c[None, :] < c[:, None]) | (v[None, :] > v[:, None]) | (members[None, :] < members[:, None])
+        dominated_by = ((c[None, :] <= c[:, None]) & (v[None, :] >= v[:, None]) & better).sum(axis=1)
+        kept = members[dominated_by < depth[g]]
+        lists.append(kept[np.argsort(-value[kept], kind='stable')])
+    return lists
+
+def _role_tables(candidates, cost, value, owned, max_swaps, budget):
+    """Best value of m = 0..max_swaps riders from one group with total cost <= c, per team.
+
+    owned (teams x riders) masks the riders a team can't buy. Returns (values,
+    picks), both teams x m x cost; picks encodes the riders in base len(cost)
+    (see _decode).
+    """
+    teams, base = owned.shape[0], len(cost)
+    values = np.full((teams, max_swaps + 1, budget), -np.inf)
+    values[:, 0, 0] = 0.0
+    picks = np.zeros((teams, max_swaps + 1, budget), dtype=np.int64)
+    for r in candidates:
+        c, v = int(cost[r]), value[r]
+        free = ~owned[:, r]
+        if c >= budget or not free.any():
+            continue
+        for m in range(max_swaps, 0, -1):
+            added = values[:, m - 1, :budget - c] + v
+            better = (added > values[:, m, c:]) & free[:, None]
+            if not better.any():
+                continue
+            values[:, m, c:] = np.where(better, added, values[:, m, c:])
+            picks[:, m, c:] = np.where(better, picks[:, m - 1, :budget - c] * base + r, picks[:, m, c:])
+    # From exactly c to at most c
+    for c in range(1, budget):
+        better = values[:, :, c - 1] > values[:, :, c]
+        values[:, :, c] = np.where(better, values[:, :, c - 1], values[:, :, c])
+        picks[:, :, c] = np.where(better, picks[:, :, c - 1], picks[:, :, c])
+    return values, picks
+
+def _decode(code, count, base):
+    riders = []
+    for _ in range(count):
+        code, r = divmod(int(code), base)
+        riders.append(r)
+    return riders
+
+class _BuyTables:
+    """Best buys per role allocation (riders bought per group), merged from the role tables on demand.
+
+    Merging is a (max, +) convolution over cost, so it is only done for the
+    teams that ask for it.
+    """
+
+    def __init__(self, role_tables, budget, base):
+        self.role_tables = role_tables
+        self.budget = budget
+        self.base = base
+        self.merged = {}  # allocation -> (values, split cost, teams done, rest of the allocation, group)
+
+    def values(self, allocation, rows):
+        """teams x cost best values for allocation, filled in at least for the teams in rows."""
+        groups = [g for g, m in enumerate(allocation) if m]
+        if len(groups) == 1:
+            return self.role_tables[groups[0]][0][:, allocation[groups[0]]]
+        if allocation not in self.merged:
+            g = groups[-1]
+            rest = tuple(0 if i == g else m for i, m in enumerate(allocation))
+            shape = self.role_tables[g][0][:, 0].shape
+            self.merged[allocation] = (np.full(shape, -np.inf), np.zeros(shape, dtype=np.int16),
+                                       np.zeros(shape[0], dtype=bool), rest, g)
+        merged, split, done, rest, g = self.merged[allocation]
+        todo = rows[~done[rows]]
+        if len(todo):
+            left = self.values(rest, todo)[todo]
+            right = self.role_tables[g][0][todo, allocation[g]]
+            best = np.full(left.shape, -np.inf)
+            best_split = np.zeros(left.shape, dtype=np.int16)
+            # The rest of the allocation spends s and group g the remainder; only the costs at which
+            # the rest gets better are worth trying
+            steps = np.isfinite(left[:, :1]).any(axis=0).tolist() + (left[:, 1:] > left[:, :-1]).any(axis=0).tolist()
+            for s in np.flatnonzero(steps):
+                total = left[:, s:s + 1] + right[:, :self.budget - s]
+                better = total > best[:, s:]
+                best[:, s:] = np.where(better, total, best[:, s:])
+                best_split[:, s:] = np.where(better, s, best_split[:, s:])
+            merged[todo], split[todo], done[todo] = best, best_split, True
+        return merged
+
+    def riders(self, allocation, team, budget):
+        groups = [g for g, m in enumerate(allocation) if m]
+        if len(groups) == 1:
+            m = allocation[groups[0]]
+            return _decode(self.role_tables[groups[0]][1][team, m, budget], m, self.base)
+        _, split, _, rest, g = self.merged[allocation]
+        s = int(split[team, budget])
+        m = allocation[g]
+        return self.riders(rest, team, s) + _decode(self.role_tables[g][1][team, m, budget - s], m, self.base)
+
+def _allocations(transfers):
+    """Every way of spreading `transfers` riders over the role groups, as count tuples, single groups first."""
+    allocations = []
+    for picks in combinations_with_replacement(range(len(GROUPS)), transfers):
+        counts = Counter(picks)
+        allocations.append(tuple(counts.get(g, 0) for g in range(len(GROUPS))))
+    return sorted(allocations, key=lambda allocation: sum(1 for m in allocation if m))
+
+def _best_transfers(positions, groups, cost, value, withdrawn, candidates, max_swaps, budget):
+    """Best sale and purchase per team and number of transfers for a chunk of full rosters.
+
+    Returns {transfers: (gain, sold positions, bought riders) per team, None where infeasible}.
+    """
+    teams = len(positions)
+    owned = np.zeros((teams, len(cost)), dtype=bool)
+    owned[np.arange(teams)[:, None], positions] = True
+    role_tables = [_role_tables(c, cost, value, owned, max_swaps, budget) for c in candidates]
+    tables = _BuyTables(role_tables, budget, len(cost))
+
+    position_groups = groups[positions]
+    position_cost = cost[positions]
+    position_value = value[positions]
+    position_withdrawn = withdrawn[positions]
+    group_counts = (position_groups[..., None] == np.arange(len(GROUPS))).sum(axis=1)
+    team_cost = position_cost.sum(axis=1)
+    withdrawn_count = position_withdrawn.sum(axis=1)
+    rows = np.arange(teams)[:, None]
+
+    best = {}
+    for k in range(1, max_swaps + 1):
+        sales = np.array(list(combinations(range(positions.shape[1]), k)))
+        lost = position_value[:, sales].sum(axis=2)
+        spend = budget - 1 - team_cost[:, None] + position_cost[:, sales].sum(axis=2)
+        sold_groups = (position_groups[:, sales][..., None] == np.arange(len(GROUPS))).sum(axis=2)
+        need = np.maximum(GROUP_MINIMUMS - (group_counts[:, None, :] - sold_groups), 0)
+        # Withdrawn riders go first: sell as many of them as the transfers allow, and nobody else until they're gone
+        sold_withdrawn = position_withdrawn[:, sales].sum(axis=2)
+        valid = (sold_withdrawn == np.minimum(withdrawn_count, k)[:, None]) & (spend >= 0)
+        spend = np.clip(spend, 0, budget - 1)
+
+        best_gain = np.full(teams, -np.inf)
+        best_sale = np.zeros(teams, dtype=np.intp)
+        best_allocation = [None] * teams
+        for allocation in _allocations(k):
+            feasible = valid & (np.array(allocation) >= need).all(axis=2)
+            if sum(1 for m in allocation if m) > 1:
+                # Each group spending the whole budget on its own bounds what the merged table can reach
+                bound = sum(role_tables[g][0][rows, m, spend] for g, m in enumerate(allocation) if m) - lost
+                feasible &= bound > best_gain[:, None]
+            if not feasible.any():
+                continue
+            values = tables.values(allocation, np.flatnonzero(feasible.any(axis=1)))
+            gain = np.where(feasible, values[rows, spend] - lost, -np.inf)
+            sale = gain.argmax(axis=1)
+            improved = gain[np.arange(teams), sale] > best_gain
+            best_gain = np.where(improved, gain[np.arange(teams), sale], best_gain)
+            best_sale = np.where(improved, sale, best_sale)
+            for t in np.flatnonzero(improved):
+                best_allocation[t] = allocation
+
+        best[k] = [
+            None if not np.isfinite(best_gain[t]) else (
+                float(best_gain[t]), sales[best_sale[t]],
+                tables.riders(best_allocation[t], t, int(spend[t, best_sale[t]])))
+            for t in range(teams)
+        ]
+    return best
+
+def recommend_transfers(cyclists, league_teams, objective=TRANSFER_OBJECTIVE, max_swaps=TRANSFER_MAX_SWAPS,
+                        chunk=TRANSFER_CHUNK):
+    """The best 1..max_swaps transfers for every league team, keeping the config.py role and budget rules.
+
+    Riders are valued by `objective`; withdrawn riders are never bought and are
+    always sold first. An option is listed when it gains value or replaces a
+    withdrawn rider. Teams whose roster doesn't match TOTAL_CYCLISTS known
+    riders get options None. Teams are processed `chunk` at a time.
+    """
+    names = [c['name'] for c in cyclists]
+    cost = np.array([c['cost'] for c in cyclists], dtype=float)
+    if not np.all(cost == np.round(cost)):
+        print("Fractional rider costs, no transfer recommendations", file=sys.stderr)
+        return None
+    cost = cost.astype(int)
+    value = np.array([c.get(objective, 0) for c in cyclists], dtype=float)
+    groups = np.array([GROUPS.index(role_group(c['role'])) for c in cyclists], dtype=int)
+    withdrawn = np.array([c.get('isWithdrawn', False) for c in cyclists], dtype=bool)
+    budget = int(MAX_COST) + 1
+
+    indices = roster_indices([team.get('roster', []) for team in league_teams], names)
+    complete = (indices < len(names)).sum(axis=1) == TOTAL_CYCLISTS if indices.size else np.zeros(len(league_teams), bool)
+    full = np.flatnonzero(complete)
+    positions = indices[full][:, :TOTAL_CYCLISTS] if len(full) else np.empty((0, TOTAL_CYCLISTS), dtype=np.intp)
+
+    owned_per_group = (groups[positions][..., None] == np.arange(len(GROUPS))).sum(axis=1)
+    depth = (owned_per_group.max(axis=0) if len(full) else np.zeros(len(GROUPS), int)) + max_swaps
+    candidates = candidate_lists(groups, cost, value, ~withdrawn, depth)
+
+    options = {}
+    for start in range(0, len(full), chunk):
+        block = positions[start:start + chunk]
+        best = _best_transfers(block, groups, cost, value, withdrawn, candidates, max_swaps, budget)
+        for i, team_index in enumerate(full[start:start + chunk]):
+            team_positions = block[i]
+            team_options = []
+            for k in range(1, max_swaps + 1):
+                if best[k][i] is None:
+                    continue
+                gain, sold, bought = best[k][i]
+                sold_riders = team_positions[sold]
+                if gain <= 0 and not withdrawn[sold_riders].any():
+                    continue
+                team_options.append({
+                    'transfers': k,
+                    'sell': [names[r] for r in sold_riders],
+                    'buy': [names[r] for r in bought],
+                    'gain': round(gain, 1),
+                    'total_cost': int(cost[team_positions].sum() - cost[sold_riders].sum() + cost[bought].sum()),
+                })
+            options[int(team_index)] = team_options
+
+    teams = []
+    for i, team in enumerate(league_teams):
+        roster = indices[i][indices[i] < len(names)]
+        teams.append({
+            'name': team['name'],
+            'value': round(float(value[roster].sum()), 1),
+            'withdrawn': [names[r] for r in roster if withdrawn[r]],
+            'options': options.get(i),
+        })
+    return {'objective': objective, 'max_transfers': max_swaps, 'teams': teams}